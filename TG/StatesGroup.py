@@ -26,6 +26,7 @@ class HabitStates(StatesGroup):
     execution_habit = State()
     not_completed = State()
     statistics = State()
+    reminder_settings = State()  # Ввода времени и часового пояса напоминаний
 
 
 async def switch_keyboard(callback: CallbackQuery, state: FSMContext, next_state: State, keyboard_func):
@@ -0,0 +1,60 @@
+"""
+Учет активности пользователей бота для подавления рассылок неактивным.
+
+Обращения пользователей копятся в памяти и раз в `ACTIVITY_FLUSH_INTERVAL`
+секунд записываются в user_delivery_health одним запросом, поэтому обработка
+обновлений не ждет записи в БД.
+"""
+import asyncio
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy.exc import SQLAlchemyError
+
+from config import config
+from database.db import async_session
+from database.func_db import DeliveryHealthCRUD
+
+
+class ActivityRecorder:
+    """
+    Буфер Telegram ID пользователей, обращавшихся к боту, с периодической записью в БД.
+    """
+
+    def __init__(self, interval: float = 60.0):
+        self.interval = interval
+        self._pending: set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, user_id: int) -> None:
+        self._pending.add(user_id)
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        user_ids, self._pending = sorted(self._pending), set()
+        try:
+            async with async_session() as db:
+                await DeliveryHealthCRUD(db).touch(user_ids)
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to record activity of {len(user_ids)} users: {e}")
+            self._pending.update(user_ids)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+activity_recorder = ActivityRecorder(interval=config.ACTIVITY_FLUSH_INTERVAL)
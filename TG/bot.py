@@ -2,10 +2,18 @@ from aiogram import Bot, Dispatcher
 from config import config
 from aiogram.client.default import DefaultBotProperties
 from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
 from aiogram.enums import ParseMode
 
+from TG.outbound import OutboundMiddleware, create_outbound_limiter
+from TG.storage import create_fsm_storage
 
-session = AiohttpSession()
+
+# Свой сервер Bot API: локальный telegram-bot-api или заглушка для тестов рассылок
+api_server = TelegramAPIServer.from_base(config.TELEGRAM_API_SERVER) if config.TELEGRAM_API_SERVER else PRODUCTION
+session = AiohttpSession(api=api_server)
 bot = Bot(token=config.TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML), session=session)
+# Все процессы, отправляющие сообщения от имени бота, делят один лимит с приоритетами
+session.middleware(OutboundMiddleware(create_outbound_limiter(bot.id)))
 
-dp = Dispatcher()
+dp = Dispatcher(storage=create_fsm_storage())
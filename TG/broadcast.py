@@ -0,0 +1,116 @@
+"""
+Рассылка объявлений всем пользователям.
+
+Рассылку создает администратор (`POST /admin/broadcasts`), отправляет задача Celery
+`tasks.run_broadcast`. Получатели (`UserInDB.chat_id`) читаются страницами по
+user_id; следующая страница загружается, пока отправляется предыдущая. Сообщения
+уходят через `RateLimitedSender` с классом BROADCAST, поэтому общий лимит бота
+пропускает их только после ответов пользователям и напоминаний.
+
+После каждой страницы в broadcasts записываются курсор, итоги и время отправки,
+в broadcast_failures — ошибки доставки. Рассылку можно поставить на паузу и
+продолжить с курсора; после паузы или сбоя повторно отправляется не больше одной
+страницы.
+"""
+import asyncio
+import time
+from typing import Sequence
+
+from loguru import logger
+from sqlalchemy import Row
+
+from config import config
+from database.db import async_session
+from database.func_db import BroadcastCRUD
+from reminders.dispatcher import record_delivery_health
+from TG.bot import bot
+from TG.outbound import BROADCAST
+from TG.sender import OutgoingMessage, RateLimitedSender, SendReport
+
+
+def build_broadcast_sender() -> RateLimitedSender:
+    return RateLimitedSender(
+        bot,
+        rate=config.BROADCAST_RATE_LIMIT,
+        per_chat_rate=config.REMINDER_CHAT_RATE_LIMIT,
+        concurrency=config.BROADCAST_CONCURRENCY,
+        max_retries=config.REMINDER_MAX_RETRIES,
+        priority=BROADCAST,
+    )
+
+
+async def send_page(sender: RateLimitedSender, text: str, rows: Sequence[Row]) -> tuple[SendReport, float]:
+    """
+    Отправляет сообщение получателям страницы. Возвращает отчет с user_id вместо
+    chat_id и время отправки в секундах.
+    """
+    users = {row.chat_id: row.user_id for row in rows}
+    started_at = time.perf_counter()
+    sent = await sender.send_many(OutgoingMessage(row.chat_id, text) for row in rows)
+    elapsed = time.perf_counter() - started_at
+
+    report = SendReport()
+    report.sent = [users[chat_id] for chat_id in sent.sent]
+    report.failed = {users[chat_id]: error for chat_id, error in sent.failed.items()}
+    report.retried = sent.retried
+    return report, elapsed
+
+
+async def run_broadcast(broadcast_id: int) -> SendReport:
+    """
+    Отправляет рассылку с сохраненного курсора до конца или до паузы.
+
+    Если рассылку уже отправляет другой воркер (или она на паузе либо завершена),
+    ничего не делает. Если во время отправки рассылку захватил новый запуск
+    (после паузы и возобновления), этот запуск останавливается на ближайшем чекпоинте.
+    """
+    sender = build_broadcast_sender()
+    report = SendReport()
+    sending: asyncio.Task | None = None
+    sending_cursor = 0
+    seconds = 0.0
+
+    async with async_session() as session:
+        crud = BroadcastCRUD(session)
+
+        broadcast = await crud.claim(broadcast_id, stale_after=config.BROADCAST_STALE_AFTER)
+        if broadcast is None:
+            logger.info(f"Broadcast {broadcast_id} is not pending, skipping")
+            return report
+        after_user_id = broadcast.after_user_id
+        if after_user_id:
+            logger.info(f"Broadcast {broadcast_id}: resuming after user {after_user_id}")
+
+        try:
+            while True:
+                rows = await crud.get_recipients_page(after_user_id, limit=config.BROADCAST_PAGE_SIZE)
+                if sending is not None:
+                    page_report, elapsed = await sending
+                    sending = None
+                    status = await crud.checkpoint(
+                        broadcast_id, broadcast.attempt, sending_cursor, len(page_report.sent),
+                        {user_id: str(error) for user_id, error in page_report.failed.items()}, elapsed
+                    )
+                    await record_delivery_health(session, page_report)
+                    report.merge(page_report)
+                    seconds += elapsed
+                    if status != "running":
+                        # Пауза или рассылку подхватил другой запуск (status is None)
+                        logger.info(f"Broadcast {broadcast_id} stopped ({status}) after user {sending_cursor}")
+                        return report
+                if not rows:
+                    break
+
+                after_user_id = rows[-1].user_id
+                sending = asyncio.create_task(send_page(sender, broadcast.text, rows))
+                sending_cursor = after_user_id
+        finally:
+            if sending is not None:
+                sending.cancel()
+
+        await crud.finish(broadcast_id, broadcast.attempt)
+
+    rate = len(report.sent) / seconds if seconds else 0.0
+    logger.info(f"Broadcast {broadcast_id}: sent {len(report.sent)}, failed {len(report.failed)}, "
+                f"retried {report.retried}, {rate:.1f} msg/s")
+    return report
@@ -1,7 +1,12 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
 from typing import Any, List, Dict
 
-from aiogram.client.session import aiohttp
+import aiohttp
 from aiohttp import ClientResponseError, ClientConnectorError
+from jose import jwt, JWTError
 
 from config import config
 
@@ -9,12 +14,170 @@ from loguru import logger
 
 from database.db import async_session
 from database.func_db import UserCRUD
+from reminders.schedule import next_fire_at, reminder_schedule, user_member
+from TG.token_store import token_store
+
+# Токены храним, пока действителен refresh token
+TOKEN_TTL = config.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
+
+
+class ApiSession:
+    """
+    Долгоживущая HTTP-сессия к API с пулом keep-alive соединений.
+    Создается при запуске бота и закрывается при остановке.
+    """
+
+    def __init__(self):
+        self._session: aiohttp.ClientSession | None = None
+
+    async def start(self) -> None:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=config.API_POOL_LIMIT,
+                limit_per_host=config.API_POOL_LIMIT_PER_HOST,
+                keepalive_timeout=config.API_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=config.API_REQUEST_TIMEOUT),
+            )
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def get(self) -> aiohttp.ClientSession:
+        await self.start()
+        return self._session
+
+
+api_session = ApiSession()
+
+
+def token_expires_at(access_token: str | None) -> float:
+    """
+    Возвращает время истечения (`exp`, unix time) access token без проверки подписи.
+    """
+    if not access_token:
+        return 0.0
+    try:
+        return float(jwt.get_unverified_claims(access_token).get("exp", 0))
+    except (JWTError, TypeError, ValueError):
+        return 0.0
+
+
+class TokenManager:
+    """
+    Выдает действующий access token пользователя.
+
+    Токен обновляется заранее, за `refresh_margin` секунд до истечения `exp`,
+    через /refresh-token (или повторной аутентификацией, если refresh не удался).
+    Одновременные обновления для одного пользователя объединяются в один запрос.
+    """
+
+    def __init__(self, refresh_margin: int = 60, max_users: int = 10_000):
+        self.refresh_margin = refresh_margin
+        self.max_users = max_users
+        self._inflight: dict[int, asyncio.Task] = {}
+        self._credentials: OrderedDict[int, tuple[str, int]] = OrderedDict()
+
+    def remember(self, user_id: int, username: str | None, chat_id: int) -> None:
+        """
+        Запоминает данные для повторной аутентификации пользователя.
+        """
+        self._credentials[user_id] = (username, chat_id)
+        self._credentials.move_to_end(user_id)
+        while len(self._credentials) > self.max_users:
+            self._credentials.popitem(last=False)
+
+    async def get_tokens(self, user_id: int) -> dict | None:
+        tokens = await token_store.get(user_id)
+        if tokens and tokens.get("expires_at", 0) - self.refresh_margin > time.time():
+            return tokens
+        return await self.refresh(user_id)
+
+    async def refresh(self, user_id: int) -> dict | None:
+        task = self._inflight.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._refresh(user_id))
+            self._inflight[user_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    async def _refresh(self, user_id: int) -> dict | None:
+        response = await User.refresh_token_tg(user_id)
+        if not response and user_id in self._credentials:
+            username, chat_id = self._credentials[user_id]
+            response = await User.authenticate_user(user_id, username, chat_id)
+        if not response:
+            return None
+        return await token_store.get(user_id)
+
+    async def invalidate(self, user_id: int) -> None:
+        tokens = await token_store.get(user_id)
+        if tokens:
+            await token_store.set(user_id, {**tokens, "expires_at": 0}, ttl=TOKEN_TTL)
+
+
+token_manager = TokenManager(refresh_margin=config.TOKEN_REFRESH_MARGIN)
+
+
+class ConditionalCache:
+    """
+    Последние ответы API с ETag по (пользователь, URL) для условных GET-запросов.
+    Ограничен по числу записей (LRU).
+    """
+
+    def __init__(self, max_size: int = 10_000):
+        self.max_size = max_size
+        self._items: OrderedDict[tuple[int, str], tuple[str, Any]] = OrderedDict()
+
+    def get(self, user_id: int, url: str) -> tuple[str, Any] | None:
+        entry = self._items.get((user_id, url))
+        if entry is not None:
+            self._items.move_to_end((user_id, url))
+        return entry
+
+    def set(self, user_id: int, url: str, etag: str, payload: Any) -> None:
+        self._items[(user_id, url)] = (etag, payload)
+        self._items.move_to_end((user_id, url))
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+
+conditional_cache = ConditionalCache()
 
 
 class User:
-    access_token: str | None = None
-    refresh_token: str | None = None
-    token_type: str | None = None
+
+    @classmethod
+    async def _request(cls, url: str, method: str = "POST", data: dict = None, json_data: dict = None,
+                       headers: dict = None) -> tuple[int | None, dict | None, str | None]:
+        """
+        Отправляет HTTP-запрос и возвращает код ответа, тело (для ответа 200) и ETag.
+        """
+        session = await api_session.get()
+        try:
+            async with session.request(method, url, data=data, json=json_data, headers=headers) as response:
+                etag = response.headers.get("ETag")
+                if response.status == 200:
+                    return response.status, await response.json(), etag
+                elif response.status == 304:
+                    return response.status, None, etag
+                else:
+                    logger.error(f"Failed request to {url}. Status code: {response.status}")
+                    return response.status, None, None
+        except ClientConnectorError:
+            logger.error(f"Connection error: Unable to connect to {url}.")
+        except TimeoutError:
+            logger.error(f"Request to {url} timed out.")
+        except ClientResponseError as e:
+            logger.error(f"Client response error: {e.status} - {e.message}")
+        except Exception as e:
+            logger.error(f"An unexpected error occurred: {str(e)}")
+        return None, None, None
 
     @classmethod
     async def _make_request(cls, url: str, method: str = "POST", data: dict = None, json_data: dict = None,
@@ -22,70 +185,93 @@ class User:
         """
         Унифицированный метод для отправки HTTP-запросов.
         """
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.request(method, url, data=data, json=json_data, headers=headers) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        logger.error(f"Failed request to {url}. Status code: {response.status}")
-                        return None
-            except ClientConnectorError:
-                logger.error(f"Connection error: Unable to connect to {url}.")
-                return None
-            except TimeoutError:
-                logger.error(f"Request to {url} timed out.")
-                return None
-            except ClientResponseError as e:
-                logger.error(f"Client response error: {e.status} - {e.message}")
-                return None
-            except Exception as e:
-                logger.error(f"An unexpected error occurred: {str(e)}")
-                return None
+        _, payload, _ = await cls._request(url, method, data=data, json_data=json_data, headers=headers)
+        return payload
 
     @classmethod
-    def get_auth_header(cls) -> dict[str, str]:
+    async def _authorized_request(cls, user_id: int, url: str, method: str = "GET",
+                                  json_data: dict = None, conditional: bool = False) -> dict | None:
         """
-        Возвращает заголовок Authorization с токеном.
+        Запрос к API от имени пользователя.
+
+        Токен обновляется заранее менеджером токенов; повтор выполняется только
+        если API все же ответил 401 (например, токен был отозван).
+        При `conditional=True` (для GET) отправляется ETag последнего ответа, и при
+        ответе 304 возвращается сохраненное тело.
         """
-        if cls.access_token and cls.token_type:
-            return {"Authorization": f"{cls.token_type} {cls.access_token}"}
-        return {}
+        cached = conditional_cache.get(user_id, url) if conditional else None
+
+        for attempt in range(2):
+            tokens = await token_manager.get_tokens(user_id)
+            if not tokens:
+                logger.error(f"No API token for user {user_id}.")
+                return None
+
+            headers = {"Authorization": f"{tokens['token_type']} {tokens['access_token']}"}
+            if cached:
+                headers["If-None-Match"] = cached[0]
+
+            status, payload, etag = await cls._request(url, method, json_data=json_data, headers=headers)
+            if status == 401 and not attempt:
+                await token_manager.invalidate(user_id)
+                continue
+
+            if status == 304 and cached:
+                return cached[1]
+            if conditional and status == 200 and etag:
+                conditional_cache.set(user_id, url, etag, payload)
+            return payload
 
     @classmethod
-    async def create_habit_log(cls, habit_id: int, log_data: Dict[str, Any]) -> dict | None:
+    async def _save_tokens(cls, user_id: int, response: dict) -> None:
+        await token_store.set(user_id, {
+            "access_token": response.get("access_token"),
+            "refresh_token": response.get("refresh_token"),
+            "token_type": response.get("token_type") or "bearer",
+            "expires_at": token_expires_at(response.get("access_token")),
+        }, ttl=TOKEN_TTL)
+
+    @classmethod
+    async def create_habit_log(cls, user_id: int, habit_id: int, log_data: Dict[str, Any]) -> dict | None:
         """
         Отправляет запрос на создание записи о выполнении привычки.
 
+        :param user_id: Telegram ID пользователя.
         :param habit_id: ID привычки.
         :param log_data: Данные для записи о выполнении привычки (например, {'completed': True}).
         :return: Ответ сервера или None, если ошибка.
         """
 
-        headers = cls.get_auth_header()
-
         # Отправляем запрос на создание записи о выполнении привычки
-        return await cls._make_request(f"{config.URL}/habits/{habit_id}/logs",
-                                       method="POST", json_data=log_data, headers=headers)
+        return await cls._authorized_request(user_id, f"{config.URL}/habits/{habit_id}/logs",
+                                             method="POST", json_data=log_data)
 
     @classmethod
-    async def update_habit(cls, habit_id: int, habit_update: dict) -> dict | None:
+    async def create_habit_logs(cls, user_id: int, items: List[Dict[str, Any]]) -> dict | None:
+        """
+        Отмечает выполнение нескольких привычек одним запросом.
+
+        :param user_id: Telegram ID пользователя.
+        :param items: Список вида [{'habit_id': 1, 'completed': True}, ...].
+        :return: Ответ сервера ({'created': [...], 'errors': [...]}) или None, если ошибка.
+        """
+        return await cls._authorized_request(user_id, f"{config.URL}/habits/logs:batch",
+                                             method="POST", json_data={"items": items})
+
+    @classmethod
+    async def update_habit(cls, user_id: int, habit_id: int, habit_update: dict) -> dict | None:
         """
         Метод для обновления привычки.
 
+        :param user_id: Telegram ID пользователя.
         :param habit_id: Идентификатор привычки, которую нужно обновить.
         :param habit_update: Словарь с обновляемыми данными привычки.
         :return: Обновленная привычка в виде словаря, если запрос успешен, иначе None.
         """
 
-        headers = {
-            "Authorization": f"{cls.token_type} {cls.access_token}",
-            "Content-Type": "application/json"
-        }
-
         # Отправляем запрос на обновление привычки с обновленными данными в формате JSON
-        response = await cls._make_request(f"{config.URL}/habits/{habit_id}", method="PUT", json_data=habit_update,
-                                           headers=headers)
+        response = await cls._authorized_request(user_id, f"{config.URL}/habits/{habit_id}", method="PUT",
+                                                 json_data=habit_update)
 
         if response:
             logger.info(f"Habit {habit_id} successfully updated.")
@@ -95,59 +281,85 @@ class User:
             return None
 
     @classmethod
-    async def get_unlogged_habits(cls) -> dict | None:
+    async def get_unlogged_habits(cls, user_id: int) -> dict | None:
         """
         Метод для получения всех привычек текущего пользователя.
         """
 
-        headers = cls.get_auth_header()
-        response = await cls._make_request(f"{config.URL}/unlogged_habits", method="GET", headers=headers)
+        response = await cls._authorized_request(user_id, f"{config.URL}/unlogged_habits", method="GET",
+                                                 conditional=True)
+        if response:
+            return response
+        return None
+
+    @classmethod
+    async def get_habit_stats(cls, user_id: int) -> list | None:
+        """
+        Метод для получения статистики по всем привычкам текущего пользователя.
+        """
+
+        response = await cls._authorized_request(user_id, f"{config.URL}/habits/stats", method="GET")
         if response:
             return response
         return None
 
     @classmethod
-    async def get_habits(cls) -> dict | None:
+    async def get_habits(cls, user_id: int) -> dict | None:
         """
         Метод для получения всех привычек текущего пользователя.
         """
 
-        headers = cls.get_auth_header()
-        response = await cls._make_request(f"{config.URL}/habits", method="GET", headers=headers)
+        response = await cls._authorized_request(user_id, f"{config.URL}/habits", method="GET", conditional=True)
         if response:
             return response
         return None
 
     @classmethod
-    async def delete_habit(cls, habit_id: int) -> dict | None:
+    async def delete_habit(cls, user_id: int, habit_id: int) -> dict | None:
         """
         Метод для удаления привычки по идентификатору.
         """
 
-        headers = cls.get_auth_header()
-        return await cls._make_request(f"{config.URL}/habits/{habit_id}", method="DELETE", headers=headers)
+        return await cls._authorized_request(user_id, f"{config.URL}/habits/{habit_id}", method="DELETE")
 
     @classmethod
-    async def create_habit(cls, habit_data: dict) -> dict | None:
+    async def create_habit(cls, user_id: int, habit_data: dict) -> dict | None:
         """
         Метод для создания новой привычки через запрос к API.
         """
 
-        headers = {
-            "Authorization": f"{cls.token_type} {cls.access_token}",
-            "Content-Type": "application/json"
-        }
-        return await cls._make_request(f"{config.URL}/habits", method="POST", json_data=habit_data, headers=headers)
+        return await cls._authorized_request(user_id, f"{config.URL}/habits", method="POST", json_data=habit_data)
+
+    @classmethod
+    async def create_habits(cls, user_id: int, habits: List[dict]) -> dict | None:
+        """
+        Метод для создания нескольких привычек одним запросом к API.
+        """
+
+        return await cls._authorized_request(user_id, f"{config.URL}/habits:batch", method="POST",
+                                             json_data={"items": habits})
+
+    @classmethod
+    async def update_reminder_settings(cls, user_id: int, settings: dict) -> dict | None:
+        """
+        Метод для сохранения времени и часового пояса напоминаний текущего пользователя.
+
+        :param user_id: Telegram ID пользователя.
+        :param settings: Словарь вида {'reminder_time': '21:30', 'timezone': 'Europe/Moscow'}.
+        """
+
+        return await cls._authorized_request(user_id, f"{config.URL}/users/me/reminder", method="PUT",
+                                             json_data=settings)
 
     @classmethod
     async def register_user(cls, user_id: int, username: str, chat_id: int, deep_linking: str, is_premium: bool,
-                            language: str) -> str | None:
+                            language: str) -> dict | None:
         """
-        Регистрирует пользователя и возвращает токен доступа.
+        Регистрирует пользователя и возвращает ответ с токенами доступа.
         """
         async with async_session() as db:
             user_repo = UserCRUD(db)
-            user = user_repo.create(
+            user = await user_repo.create(
                 user_id=user_id,
                 username=username,
                 chat_id=chat_id,
@@ -155,43 +367,41 @@ class User:
                 is_premium=is_premium,
                 language=language
             )
+        # Без этого первое напоминание попало бы в индекс только при ночной пересборке
+        fire_at = next_fire_at(user.timezone, user.reminder_time, datetime.now(timezone.utc))
+        await reminder_schedule.schedule(user_member(user_id), fire_at)
 
-
-        if response:
-            cls.access_token = response.get("access_token")
-            cls.token_type = response.get("token_type")
-            cls.refresh_token = response.get("refresh_token")
-            return cls.access_token
-        return None
+        return await cls.authenticate_user(user_id, username, chat_id)
 
     @classmethod
-    async def authenticate_user(cls, username: str, chat_id: int) -> dict | None:
+    async def authenticate_user(cls, user_id: int, username: str, chat_id: int) -> dict | None:
         """
-        Аутентифицирует пользователя и сохраняет токены.
+        Аутентифицирует пользователя и сохраняет его токены.
         """
         data = {
             'username': username,
             'password': str(chat_id),
         }
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        token_manager.remember(user_id, username, chat_id)
         response = await cls._make_request(f"{config.URL}/token", data=data, headers=headers)
         if response:
-            cls.access_token = response.get("access_token")
-            cls.refresh_token = response.get("refresh_token")
-            cls.token_type = response.get("token_type")
+            await cls._save_tokens(user_id, response)
             return response
         return None
 
     @classmethod
-    async def refresh_token_tg(cls, refresh_token: str) -> dict | None:
+    async def refresh_token_tg(cls, user_id: int) -> dict | None:
         """
-        Обновляет токен доступа и сохраняет новый.
+        Обновляет токены пользователя по сохраненному refresh token.
         """
-        payload = {"refresh_token": refresh_token}
+        tokens = await token_store.get(user_id)
+        if not tokens or not tokens.get("refresh_token"):
+            return None
+
+        payload = {"refresh_token": tokens["refresh_token"]}
         response = await cls._make_request(f"{config.URL}/refresh-token", json_data=payload)
         if response:
-            cls.access_token = response.get("access_token")
-            cls.refresh_token = response.get("refresh_token")
+            await cls._save_tokens(user_id, response)
             return response
         return None
-
@@ -5,14 +5,15 @@ from aiogram import F, Router
 from aiogram.filters import CommandStart, StateFilter
 
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery, ForceReply
+from aiogram.types import Message, CallbackQuery, ForceReply, InlineKeyboardMarkup
 
 from loguru import logger
 
 
 from TG.StatesGroup import HabitStates, switch_keyboard
 from TG.bot import bot
-from TG.funcs_tg import User
+from TG.services import habit_service
+from TG.storage import message_store
 from TG.keyboards.InlineKeyboard import (get_habit_choice_keyboard, useful_habit_choice_keyboard,
                                          harmful_habit_choice_keyboard, health_habit_keyboard, sport_habit_keyboard,
                                          nutrition_habit_keyboard, update_habits_keyboard,
@@ -23,7 +24,8 @@ from TG.keyboards.ReplyKeyboard import get_main_menu_keyboard
 
 router = Router()
 
-user_messages = {}
+WEEKDAY_NAMES = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс")
+
 """
 Блок основного меню.
 """
@@ -40,28 +42,19 @@ async def command_start_handler(message: Message):
     args = message.text.split()[1] if len(message.text.split()) > 1 else None
     deep_linking = args if args else "unknown"  # Если параметр отсутствует, используем "unknown"
 
-    auth_response = await User.authenticate_user(username, chat_id)
+    auth_response = await habit_service.authenticate_user(user_id, username, chat_id)
     logger.debug(f"Auth response: {auth_response}")
 
     if auth_response:
-        # Сохранение токенов после успешной аутентификации
-        User.access_token = auth_response.get("access_token")
-        User.refresh_token = auth_response.get("refresh_token")
-        User.token_type = auth_response.get("token_type")
-
         await message.answer(f"Добро пожаловать обратно, {user.full_name}!",
                              reply_markup=get_main_menu_keyboard())
         logger.info(f"User {user.full_name} successfully authenticated.")
     else:
         # Если аутентификация не удалась, регистрируем нового пользователя
-        reg_response = await User.register_user(username, chat_id)
+        reg_response = await habit_service.register_user(user_id, username, chat_id, deep_linking, is_premium, language)
         logger.debug(f"Registration response: {reg_response}")
 
         if reg_response:
-            # Сохранение токенов после успешной регистрации
-            User.access_token = reg_response
-            User.refresh_token = None
-            User.token_type = "Bearer"
             await message.answer(f"Вы успешно зарегистрированы!",
                                  reply_markup=get_main_menu_keyboard())
             logger.info(f"User {user.full_name} registered with token.")
@@ -100,12 +93,10 @@ async def handle_habit_choice(message: Message, state: FSMContext):
     await message.delete()
     await state.set_state(HabitStates.statistics)
 
-    if not (habits := await User.get_habits()):
-        await User.authenticate_user(message.from_user.username, message.chat.id)
-        habits = await User.get_habits()
+    habits = await habit_service.get_habit_stats(message.from_user.id)
 
     if habits:
-        tracked_habits = [habit for habit in habits if habit.is_tracked == True]
+        tracked_habits = [habit for habit in habits if habit["is_tracked"]]
 
         if not tracked_habits:
             await message.answer("У вас нет отслеживаемых привычек.")
@@ -114,10 +105,19 @@ async def handle_habit_choice(message: Message, state: FSMContext):
         stats_message = "📊 Ваша статистика по привычкам:\n\n"
 
         for habit in tracked_habits:
+            last_completed = habit["last_completed_date"]
+            weekdays = " ".join(
+                f"{day} {count}" for day, count in zip(WEEKDAY_NAMES, habit["weekday_counts"])
+            )
             stats_message += (
-                f"📝 Привычка: {habit.name}\n"
-                f"🔁 Стрик дней: {habit.current_streak}\n"
-                f"📅 Всего выполнено: {habit.total_completed} дней\n\n"
+                f"📝 Привычка: {habit['name']}\n"
+                f"🔁 Стрик дней: {habit['current_streak']} (рекорд: {habit['longest_streak']})\n"
+                f"📅 Всего выполнено: {habit['total_completed']} дней\n"
+                f"📈 Выполнение за 7/30/90 дней: {habit['completion_rate_7']:.0%} / "
+                f"{habit['completion_rate_30']:.0%} / {habit['completion_rate_90']:.0%}\n"
+                f"🗓 Последнее выполнение: "
+                f"{date.fromisoformat(last_completed).strftime('%d.%m.%Y') if last_completed else '—'}\n"
+                f"📆 По дням недели: {weekdays}\n\n"
             )
 
         await message.answer(stats_message)
@@ -144,48 +144,28 @@ async def handle_habit_choice(message: Message, state: FSMContext):
 
 @router.callback_query(F.data == "completed", StateFilter(HabitStates.execution))
 async def handle_completed_habit(callback: CallbackQuery, state: FSMContext):
-    habits = await User.get_unlogged_habits()
+    habits = await habit_service.get_unlogged_habits(callback.from_user.id)
     await state.set_state(HabitStates.execution_habit)
-    if habits:
-        keyb = create_habits_inline_keyboard(habits)
-        await bot.send_message(
-            chat_id=callback.message.chat.id,
-            text="Выберите выполненную привычку:",
-            reply_markup=keyb
-        )
-    else:
 
-        await User.authenticate_user(callback.from_user.username, callback.message.chat.id)
-        habits = await User.get_unlogged_habits()
-        keyb = create_habits_inline_keyboard(habits)
-        await bot.send_message(
-            chat_id=callback.message.chat.id,
-            text="Выберите выполненную привычку:",
-            reply_markup=keyb
-        )
+    keyb = create_habits_inline_keyboard(habits)
+    await bot.send_message(
+        chat_id=callback.message.chat.id,
+        text="Выберите выполненную привычку:",
+        reply_markup=keyb
+    )
 
 
 @router.callback_query(F.data == "not_fulfill", StateFilter(HabitStates.execution))
 async def handle_completed_habit(callback: CallbackQuery, state: FSMContext):
-    habits = await User.get_unlogged_habits()
+    habits = await habit_service.get_unlogged_habits(callback.from_user.id)
     await state.set_state(HabitStates.not_completed)
-    if habits:
-        keyb = create_habits_inline_keyboard(habits)
-        await bot.send_message(
-            chat_id=callback.message.chat.id,
-            text="Выберите не выполненную привычку:",
-            reply_markup=keyb
-        )
-    else:
 
-        await User.authenticate_user(callback.from_user.username, callback.message.chat.id)
-        habits = await User.get_unlogged_habits()
-        keyb = create_habits_inline_keyboard(habits)
-        await bot.send_message(
-            chat_id=callback.message.chat.id,
-            text="Выберите не выполненную привычку:",
-            reply_markup=keyb
-        )
+    keyb = create_habits_inline_keyboard(habits)
+    await bot.send_message(
+        chat_id=callback.message.chat.id,
+        text="Выберите не выполненную привычку:",
+        reply_markup=keyb
+    )
 
 
 @router.callback_query(F.data.startswith("habit_"), StateFilter(HabitStates.execution_habit, HabitStates.not_completed))
@@ -204,7 +184,7 @@ async def handle_delete_habit(callback: CallbackQuery, state: FSMContext):
         )
         return
 
-    result = await User.create_habit_log(habit_id, log_data)
+    result = await habit_service.create_habit_log(callback.from_user.id, habit_id, log_data)
 
     if result:
 
@@ -218,25 +198,10 @@ async def handle_delete_habit(callback: CallbackQuery, state: FSMContext):
         await state.clear()
     else:
 
-        await User.authenticate_user(callback.from_user.username, callback.message.chat.id)
-        result = await User.create_habit_log(habit_id, log_data)
-
-        if result:
-
-            await callback.message.answer(
-                "✅ Вы успешно отметили выполнение привычки!",
-                reply_markup=None
-            )
-
-            await callback.message.delete()
-
-            await state.clear()
-        else:
-
-            await callback.message.answer(
-                "❌ Не удалось отметить выполнение привычки. Пожалуйста, попробуйте снова позже.",
-                reply_markup=None
-            )
+        await callback.message.answer(
+            "❌ Не удалось отметить выполнение привычки. Пожалуйста, попробуйте снова позже.",
+            reply_markup=None
+        )
 
 
 @router.callback_query(F.data == "back",
@@ -251,6 +216,87 @@ async def handle_back(callback: CallbackQuery, state: FSMContext):
         reply_markup=completion_marks_keyboard()
     )
 
+
+@router.callback_query(F.data == "remind_done_all")
+async def handle_reminder_done_all(callback: CallbackQuery):
+    """
+    Отметка выполнения всех привычек из сводного напоминания одним запросом.
+    """
+    items = [
+        {'habit_id': int(row[0].callback_data.split("_")[-1]), 'completed': True}
+        for row in callback.message.reply_markup.inline_keyboard
+        if row[0].callback_data != callback.data
+    ]
+
+    result = await habit_service.create_habit_logs(callback.from_user.id, items)
+    if not result:
+        await callback.answer("❌ Не удалось отметить выполнение привычек. Попробуйте позже.")
+        return
+
+    await callback.message.edit_text("✅ Все привычки на сегодня отмечены!")
+    await callback.answer(f"✅ Отмечено привычек: {len(result['created'])}")
+
+
+@router.callback_query(F.data.startswith("remind_done_"))
+async def handle_reminder_done(callback: CallbackQuery):
+    """
+    Отметка выполнения привычки прямо из сводного напоминания.
+    """
+    habit_id = int(callback.data.split("_")[-1])
+    log_data = {'completed': True}
+
+    result = await habit_service.create_habit_log(callback.from_user.id, habit_id, log_data)
+    if not result:
+        await callback.answer("❌ Не удалось отметить выполнение привычки. Попробуйте позже.")
+        return
+
+    # Убираем отмеченную привычку из клавиатуры напоминания (и «Отметить все», если осталась одна)
+    buttons = [row for row in callback.message.reply_markup.inline_keyboard
+               if row[0].callback_data != callback.data]
+    if len(buttons) <= 2:
+        buttons = [row for row in buttons if row[0].callback_data != "remind_done_all"]
+    if buttons:
+        await callback.message.edit_reply_markup(reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons))
+    else:
+        await callback.message.edit_text("✅ Все привычки на сегодня отмечены!")
+
+    await callback.answer("✅ Выполнение отмечено!")
+
+"""
+Блок настройки напоминаний.
+"""
+
+
+@router.message(lambda message: message.text == "🔔 Настройка оповещений")
+async def handle_reminder_settings(message: Message, state: FSMContext):
+    await message.delete()
+    await state.set_state(HabitStates.reminder_settings)
+
+    await message.answer(
+        "Введите время напоминания и часовой пояс, например: 21:30 Europe/Moscow",
+        reply_markup=ForceReply()
+    )
+
+
+@router.message(StateFilter(HabitStates.reminder_settings))
+async def process_reminder_settings(message: Message, state: FSMContext):
+    parts = message.text.split()
+    settings = {
+        "reminder_time": parts[0] if parts else "",
+        "timezone": parts[1] if len(parts) > 1 else "UTC"
+    }
+
+    response = await habit_service.update_reminder_settings(message.from_user.id, settings)
+
+    if response:
+        await message.answer(
+            f"🔔 Напоминания будут приходить в {settings['reminder_time']} ({settings['timezone']}).",
+            reply_markup=get_main_menu_keyboard()
+        )
+        await state.clear()
+    else:
+        await message.answer("❌ Не удалось сохранить настройки. Проверьте формат: 21:30 Europe/Moscow")
+
 """
 Блок самостоятельного создания привычки.
 """
@@ -266,11 +312,7 @@ async def handle_useful_habit(callback: CallbackQuery, state: FSMContext):
         text="Введите название привычки: Например 'Бег'",
         reply_markup=ForceReply()
     )
-    if user_id in user_messages:
-        user_messages[user_id].append(success_msg.message_id)
-
-    else:
-        user_messages[user_id] = [success_msg.message_id]
+    await message_store.add(user_id, success_msg.message_id)
 
     await state.set_state(HabitStates.waiting_for_habit_name)
 
@@ -285,11 +327,7 @@ async def process_description(message: Message, state: FSMContext):
         text="Введите описание привычки: Например 'Бегать по утрам'",
         reply_markup=ForceReply()
     )
-    if user_id in user_messages:
-        user_messages[user_id].append(success_msg.message_id)
-        user_messages[user_id].append(message.message_id)
-    else:
-        user_messages[user_id] = [success_msg.message_id]
+    await message_store.add(user_id, success_msg.message_id, message.message_id)
 
     await state.set_state(HabitStates.waiting_for_description)
 
@@ -305,11 +343,7 @@ async def process_habit_name(message: Message, state: FSMContext):
         text="Сколько дней отслеживаем привычку? (по умолчанию 21 день)",
 
     )
-    if user_id in user_messages:
-        user_messages[user_id].append(success_msg.message_id)
-        user_messages[user_id].append(message.message_id)
-    else:
-        user_messages[user_id] = [success_msg.message_id]
+    await message_store.add(user_id, success_msg.message_id, message.message_id)
 
     await state.set_state(HabitStates.waiting_for_days)
 
@@ -339,15 +373,12 @@ async def process_habit_days(message: Message, state: FSMContext):
 
     user_id = message.from_user.id
     # Пытаемся создать привычку через API
-    result = await User.create_habit(habit_data)
+    result = await habit_service.create_habit(message.from_user.id, habit_data)
     if result:
 
-        if user_id in user_messages:
-            for msg_id in user_messages[user_id]:
-                await bot.delete_message(chat_id=message.chat.id, message_id=msg_id)
-
-            # Очищаем список сообщений пользователя
-            del user_messages[user_id]
+        # Удаляем служебные сообщения диалога и очищаем их список
+        for msg_id in await message_store.pop_all(user_id):
+            await bot.delete_message(chat_id=message.chat.id, message_id=msg_id)
 
         # Отправляем сообщение об успешном создании привычки
         success_msg = await bot.send_message(
@@ -357,36 +388,9 @@ async def process_habit_days(message: Message, state: FSMContext):
         )
 
         # Сохраняем ID сообщения в список
-        if user_id in user_messages:
-            user_messages[user_id].append(success_msg.message_id)
-            user_messages[user_id].append(message.message_id)
-        else:
-            user_messages[user_id] = [success_msg.message_id]
+        await message_store.add(user_id, success_msg.message_id)
     else:
-
-        await User.authenticate_user(message.from_user.username, message.chat.id)
-        result = await User.create_habit(habit_data)
-        if result:
-
-            if user_id in user_messages:
-                for msg_id in user_messages[user_id]:
-                    await bot.delete_message(chat_id=message.chat.id, message_id=msg_id)
-
-                del user_messages[user_id]
-
-            success_msg = await bot.send_message(
-                chat_id=message.chat.id,
-                text=f"Привычка '{habit_name}' будет отслеживаться {days} дней.",
-                reply_markup=get_main_menu_keyboard()
-            )
-
-            if user_id in user_messages:
-                user_messages[user_id].append(success_msg.message_id)
-                user_messages[user_id].append(message.message_id)
-            else:
-                user_messages[user_id] = [success_msg.message_id]
-        else:
-            await bot.send_message(message.chat.id, f"Неизвестная ошибка")
+        await bot.send_message(message.chat.id, f"Неизвестная ошибка")
 
     await state.set_state(HabitStates.main_menu)
 
@@ -397,47 +401,26 @@ async def process_habit_days(message: Message, state: FSMContext):
 
 @router.callback_query(F.data == "delete", StateFilter(HabitStates.update_habits_menu))
 async def handle_update_habits(callback: CallbackQuery, state: FSMContext):
-    habits = await User.get_habits()
-    if habits:
-
-        await switch_keyboard(callback, state, HabitStates.habits_menu, lambda: create_habits_inline_keyboard(habits))
-    else:
-
-        await User.authenticate_user(callback.from_user.username, callback.message.chat.id)
-        habits = await User.get_habits()
-
-        await switch_keyboard(callback, state, HabitStates.habits_menu, lambda: create_habits_inline_keyboard(habits))
+    habits = await habit_service.get_habits(callback.from_user.id)
+    await switch_keyboard(callback, state, HabitStates.habits_menu, lambda: create_habits_inline_keyboard(habits))
 
 
 @router.callback_query(F.data == "change", StateFilter(HabitStates.update_habits_menu))
 async def handle_update_habits(callback: CallbackQuery, state: FSMContext):
-    habits = await User.get_habits()
-    if habits:
-
-        await switch_keyboard(callback, state, HabitStates.habits_change_menu, lambda: create_habits_inline_keyboard(habits))
-    else:
-
-        await User.authenticate_user(callback.from_user.username, callback.message.chat.id)
-        habits = await User.get_habits()
-
-        await switch_keyboard(callback, state, HabitStates.habits_change_menu, lambda: create_habits_inline_keyboard(habits))
+    habits = await habit_service.get_habits(callback.from_user.id)
+    await switch_keyboard(callback, state, HabitStates.habits_change_menu, lambda: create_habits_inline_keyboard(habits))
 
 
 @router.callback_query(F.data.startswith("habit_"), StateFilter(HabitStates.habits_menu))
 async def handle_delete_habit(callback: CallbackQuery, state: FSMContext):
     habit_id = int(callback.data.split("_")[-1])
 
-    result = await User.delete_habit(habit_id)
-
-    if result:
-
-        habits = await User.get_habits()
-        await switch_keyboard(callback, state, HabitStates.habits_menu, lambda: create_habits_inline_keyboard(habits))
-    else:
+    result = await habit_service.delete_habit(callback.from_user.id, habit_id)
+    if not result:
+        await callback.answer("❌ Не удалось удалить привычку. Попробуйте позже.")
 
-        await User.authenticate_user(callback.from_user.username, callback.message.chat.id)
-        habits = await User.get_habits()
-        await switch_keyboard(callback, state, HabitStates.habits_menu, lambda: create_habits_inline_keyboard(habits))
+    habits = await habit_service.get_habits(callback.from_user.id)
+    await switch_keyboard(callback, state, HabitStates.habits_menu, lambda: create_habits_inline_keyboard(habits))
 
 
 @router.callback_query(F.data.startswith("habit_"), StateFilter(HabitStates.habits_change_menu))
@@ -479,15 +462,12 @@ async def handle_new_value(message: Message, state: FSMContext):
 
     update_data = {field_to_change: new_value}
 
-    response = await User.update_habit(habit_id, update_data)
+    response = await habit_service.update_habit(message.from_user.id, habit_id, update_data)
 
     if response:
         await message.answer(f"Поле {field_to_change} успешно обновлено!")
     else:
-        await User.authenticate_user(message.from_user.username, message.chat.id)
-        response = await User.update_habit(habit_id, update_data)
-        if response:
-            await message.answer(f"Поле {field_to_change} успешно обновлено!")
+        await message.answer(f"❌ Не удалось обновить поле {field_to_change}.")
 
 
 """
@@ -502,28 +482,16 @@ async def handle_track_habits(callback: CallbackQuery, state: FSMContext):
 
 @router.callback_query(F.data == "begin", StateFilter(HabitStates.track_habit_menu))
 async def handle_begin_track_habits(callback: CallbackQuery, state: FSMContext):
-    habits = await User.get_habits()
-    if habits:
-        await switch_keyboard(callback, state, HabitStates.begin_track_habit,
-                              lambda: create_track_habits_inline_keyboard(habits, False))
-    else:
-        await User.authenticate_user(callback.from_user.username, callback.message.chat.id)
-        habits = await User.get_habits()
-        await switch_keyboard(callback, state, HabitStates.begin_track_habit,
-                              lambda: create_track_habits_inline_keyboard(habits, False))
+    habits = await habit_service.get_habits(callback.from_user.id)
+    await switch_keyboard(callback, state, HabitStates.begin_track_habit,
+                          lambda: create_track_habits_inline_keyboard(habits, False))
 
 
 @router.callback_query(F.data == "cease", StateFilter(HabitStates.track_habit_menu))
 async def handle_cease_track_habits(callback: CallbackQuery, state: FSMContext):
-    habits = await User.get_habits()
-    if habits:
-        await switch_keyboard(callback, state, HabitStates.cease_track_habit,
-                              lambda: create_track_habits_inline_keyboard(habits, True))
-    else:
-        await User.authenticate_user(callback.from_user.username, callback.message.chat.id)
-        habits = await User.get_habits()
-        await switch_keyboard(callback, state, HabitStates.cease_track_habit,
-                              lambda: create_track_habits_inline_keyboard(habits, True))
+    habits = await habit_service.get_habits(callback.from_user.id)
+    await switch_keyboard(callback, state, HabitStates.cease_track_habit,
+                          lambda: create_track_habits_inline_keyboard(habits, True))
 
 
 @router.callback_query(F.data.startswith("habit_"), StateFilter(HabitStates.begin_track_habit,
@@ -537,26 +505,16 @@ async def handle_back(callback: CallbackQuery, state: FSMContext):
             # Подготавливаем данные для обновления привычки
             update_data = {"is_tracked": True}
             # Логика обновления привычки в базе данных
-            response = await User.update_habit(habit_id, update_data)
-            if response:
-                await switch_keyboard(callback, state, HabitStates.main_menu, get_habit_choice_keyboard)
-            else:
-                await User.authenticate_user(callback.from_user.username, callback.message.chat.id)
-                response = await User.update_habit(habit_id, update_data)
-                await switch_keyboard(callback, state, HabitStates.main_menu, get_habit_choice_keyboard)
+            await habit_service.update_habit(callback.from_user.id, habit_id, update_data)
+            await switch_keyboard(callback, state, HabitStates.main_menu, get_habit_choice_keyboard)
 
         case HabitStates.cease_track_habit.state:
             habit_id = int(callback.data.split("_")[-1])  # Извлекаем ID привычки из callback_data
             # Подготавливаем данные для обновления привычки
             update_data = {"is_tracked": False}
             # Логика обновления привычки в базе данных
-            response = await User.update_habit(habit_id, update_data)
-            if response:
-                await switch_keyboard(callback, state, HabitStates.main_menu, get_habit_choice_keyboard)
-            else:
-                await User.authenticate_user(callback.from_user.username, callback.message.chat.id)
-                response = await User.update_habit(habit_id, update_data)
-                await switch_keyboard(callback, state, HabitStates.main_menu, get_habit_choice_keyboard)
+            await habit_service.update_habit(callback.from_user.id, habit_id, update_data)
+            await switch_keyboard(callback, state, HabitStates.main_menu, get_habit_choice_keyboard)
 
 
 @router.callback_query(F.data == "update_habits", StateFilter(HabitStates.main_menu))
@@ -676,8 +634,8 @@ async def handle_useful_habit(callback: CallbackQuery, state: FSMContext):
             "current_streak": 0,
             "total_completed": 0
         }
-        # Попытка создать привычку через метод User.create_habit
-        result = await User.create_habit(new_habit)
+        # Попытка создать привычку через метод habit_service.create_habit
+        result = await habit_service.create_habit(callback.from_user.id, new_habit)
 
         if result:
             # Уведомляем пользователя об успешном создании привычки
@@ -686,40 +644,14 @@ async def handle_useful_habit(callback: CallbackQuery, state: FSMContext):
                 text=f"Привычка '{new_habit['name']}' создана и будет отслеживаться {new_habit['target_days']} дней.",
                 reply_markup=get_main_menu_keyboard()  # Вернуть основное меню
             )
-            if user_id in user_messages:
-                del user_messages[user_id]
             # Сохраняем ID сообщения в список для последующего удаления
-            if user_id in user_messages:
-                user_messages[user_id].append(success_msg.message_id)
-                user_messages[user_id].append(callback.message_id)
-            else:
-                user_messages[user_id] = [success_msg.message_id]
+            await message_store.clear(user_id)
+            await message_store.add(user_id, success_msg.message_id)
         else:
-            # Если токен неактуален, обновляем его
-            await User.authenticate_user(callback.from_user.username, callback.message.chat.id)
-            # Повторяем попытку создать привычку после обновления токена
-            result = await User.create_habit(new_habit)
-            if result:
-                # Уведомляем пользователя об успешном создании привычки
-                success_msg = await bot.send_message(
-                    chat_id=callback.message.chat.id,
-                    text=f"Привычка '{new_habit['name']}' создана и будет отслеживаться {new_habit['target_days']} дней.",
-                    reply_markup=get_main_menu_keyboard()  # Вернуть основное меню
-                )
-                if user_id in user_messages:
-                    del user_messages[user_id]
-                # Сохраняем ID сообщения в список для последующего удаления
-                if user_id in user_messages:
-                    user_messages[user_id].append(success_msg.message_id)
-                    user_messages[user_id].append(callback.message_id)
-                else:
-                    user_messages[user_id] = [success_msg.message_id]
-            else:
-                # Обработка неуспешного ответа от API
-                detail = result.get('detail', 'Неизвестная ошибка') if isinstance(result,
-                                                                                  dict) else "Неверный формат ответа от сервера."
-                await bot.send_message(
-                    chat_id=callback.message.chat.id,
-                    text=f"Не удалось создать привычку: {detail}."
-                )
-
+            # Обработка неуспешного ответа от API
+            detail = result.get('detail', 'Неизвестная ошибка') if isinstance(result,
+                                                                              dict) else "Неверный формат ответа от сервера."
+            await bot.send_message(
+                chat_id=callback.message.chat.id,
+                text=f"Не удалось создать привычку: {detail}."
+            )
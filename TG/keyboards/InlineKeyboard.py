@@ -201,3 +201,21 @@ def create_habits_inline_keyboard(habits: dict) -> InlineKeyboardMarkup:
 
     return keyboard
 
+
+
+def create_reminder_digest_keyboard(habits: list[tuple[int, str]]) -> InlineKeyboardMarkup:
+    """
+    Создает инлайн-клавиатуру для сводного напоминания: по кнопке на каждую неотмеченную привычку
+    и кнопку «Отметить все», если привычек несколько.
+
+    :param habits: Список пар (id привычки, название привычки).
+    :return: Инлайн-клавиатура.
+    """
+    buttons = [
+        [InlineKeyboardButton(text=f"✅ {habit_name}", callback_data=f"remind_done_{habit_id}")]
+        for habit_id, habit_name in habits
+    ]
+    if len(habits) > 1:
+        buttons.append([InlineKeyboardButton(text="✅ Отметить все", callback_data="remind_done_all")])
+
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -6,17 +6,44 @@ from TG.bot import dp, bot
 from loguru import logger
 
 from TG.handlers_bot import router
+from TG.funcs_tg import api_session
+from TG.activity import activity_recorder
+from TG.middlewares import ActivityMiddleware, CredentialsMiddleware
+from TG.webhook import run_webhook, run_worker
 from config import config
 
 
-async def main() -> None:
-
+def setup_dispatcher() -> None:
     # Регистрация всех обработчиков
-    logger.info("Бот запущен и готов к работе.")
+    dp.include_router(router)
+    dp.update.outer_middleware(CredentialsMiddleware())
+    dp.update.outer_middleware(ActivityMiddleware())
+    # Общая HTTP-сессия к API живет столько же, сколько бот
+    dp.startup.register(api_session.start)
+    dp.shutdown.register(api_session.close)
+    dp.startup.register(activity_recorder.start)
+    dp.shutdown.register(activity_recorder.stop)
+
+
+async def main(mode: str) -> None:
+    """
+    Запускает бота в одном из режимов:
+    - polling: один процесс получает и обрабатывает обновления;
+    - webhook: прием обновлений от Telegram и запись в очередь;
+    - worker: обработка обновлений своих партиций очереди (можно запустить несколько).
+    """
+    setup_dispatcher()
+    logger.info(f"Бот запущен и готов к работе (режим {mode}).")
     try:
-        dp.include_router(router)
-        await dp.start_polling(bot)
+        if mode == "webhook":
+            await run_webhook(dp, bot)
+        elif mode == "worker":
+            await run_worker(dp, bot, config.UPDATE_WORKER_ID, config.UPDATE_WORKERS)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     finally:
+        await api_session.close()
         await bot.session.close()
         logger.info("Сессия бота закрыта.")
 
@@ -28,7 +55,12 @@ if __name__ == "__main__":
         logger.error("BOT_TOKEN не указан. Пожалуйста, установите переменную окружения BOT_TOKEN.")
         sys.exit(1)
 
+    mode = sys.argv[1] if len(sys.argv) > 1 else config.BOT_MODE
+    if mode not in ("polling", "webhook", "worker"):
+        logger.error(f"Неизвестный режим {mode}. Доступны: polling, webhook, worker.")
+        sys.exit(1)
+
     try:
-        asyncio.run(main())
+        asyncio.run(main(mode))
     except (KeyboardInterrupt, SystemExit):
         logger.info("Бот остановлен.")
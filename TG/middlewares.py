@@ -0,0 +1,44 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from TG.activity import activity_recorder
+from TG.funcs_tg import token_manager
+
+
+class CredentialsMiddleware(BaseMiddleware):
+    """
+    Запоминает username и chat_id пользователя для каждого входящего обновления,
+    чтобы менеджер токенов мог повторно аутентифицировать пользователя без /start.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        if user is not None and chat is not None:
+            token_manager.remember(user.id, user.username, chat.id)
+        return await handler(event, data)
+
+
+class ActivityMiddleware(BaseMiddleware):
+    """
+    Отмечает обращение пользователя к боту (см. TG.activity): заблокировавшие бота
+    или неактивные пользователи снова получают напоминания, как только напишут боту.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is not None:
+            activity_recorder.record(user.id)
+        return await handler(event, data)
@@ -0,0 +1,257 @@
+"""
+Очередь исходящих запросов к Telegram с классами приоритета.
+
+Все запросы бота, адресованные чату (send*, edit*, delete*, answer* и т.п.),
+проходят через middleware сессии `TG.bot.bot`:
+
+- общий лимит частоты — token bucket, который в режиме redis выполняется
+  Lua-скриптом и разделяется всеми процессами (бот, воркеры, Celery);
+- классы приоритета: ответы пользователям (INTERACTIVE) выше напоминаний
+  (REMINDER), напоминания выше рассылок (BROADCAST). Массовым классам недоступна
+  часть емкости bucket (`OUTBOUND_RESERVE`), поэтому даже при рассылке из другого
+  процесса у ответов пользователям всегда остается запас. Внутри процесса
+  ожидающие запросы получают токены строго по приоритету;
+- запросы в один чат выполняются по одному и в порядке поступления.
+
+Класс приоритета задается контекстной переменной `outbound_priority`
+(по умолчанию INTERACTIVE); `TG.sender.RateLimitedSender` выставляет массовый класс.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+
+import aioredis
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from loguru import logger
+
+from config import config
+
+INTERACTIVE = 0
+REMINDER = 1
+BROADCAST = 2
+
+outbound_priority: ContextVar[int] = ContextVar("outbound_priority", default=INTERACTIVE)
+
+# Возвращает 0, если токен выдан, иначе сколько секунд подождать (строкой: Lua обрезает дробные числа)
+ACQUIRE_SCRIPT = """
+local paused = redis.call('PTTL', KEYS[2])
+if paused > 0 then
+    return tostring(paused / 1000)
+end
+
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local wait = 0
+if tokens >= 1 + reserve then
+    tokens = tokens - 1
+else
+    wait = (1 + reserve - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 60)
+return tostring(wait)
+"""
+
+
+class OutboundLimiter:
+    """
+    Token bucket на все исходящие сообщения бота. Массовым классам доступна только
+    емкость сверх резерва: `reserve * priority` токенов остаются для более важных классов.
+    """
+
+    def __init__(self, rate: float, capacity: float, reserve: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.reserve = reserve
+
+    def _reserved(self, priority: int) -> float:
+        return min(self.capacity * self.reserve * priority, self.capacity - 1)
+
+    async def try_acquire(self, priority: int) -> float:
+        """Забирает токен и возвращает 0 или возвращает, сколько секунд ждать до следующей попытки."""
+        raise NotImplementedError
+
+    async def pause(self, seconds: float) -> None:
+        """Останавливает выдачу токенов всем процессам (после 429 от Telegram)."""
+        raise NotImplementedError
+
+
+class MemoryOutboundLimiter(OutboundLimiter):
+    """
+    Лимит в памяти процесса: для одного процесса и тестов.
+    """
+
+    def __init__(self, rate: float, capacity: float, reserve: float):
+        super().__init__(rate, capacity, reserve)
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    async def try_acquire(self, priority: int) -> float:
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        needed = 1 + self._reserved(priority)
+        if self.tokens >= needed:
+            self.tokens -= 1
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    async def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class RedisOutboundLimiter(OutboundLimiter):
+    """
+    Лимит в Redis, общий для всех процессов, отправляющих сообщения от имени бота.
+    Состояние bucket обновляется атомарно одним Lua-скриптом.
+    """
+
+    prefix = "tg:outbound:"
+
+    def __init__(self, rate: float, capacity: float, reserve: float, redis_url: str = "redis://localhost",
+                 bot_id: int = 0):
+        super().__init__(rate, capacity, reserve)
+        self.redis = aioredis.from_url(redis_url, decode_responses=True)
+        self._acquire = self.redis.register_script(ACQUIRE_SCRIPT)
+        self._keys = [f"{self.prefix}{bot_id}:bucket", f"{self.prefix}{bot_id}:paused"]
+
+    async def try_acquire(self, priority: int) -> float:
+        try:
+            return float(await self._acquire(
+                keys=self._keys, args=[self.rate, self.capacity, self._reserved(priority)]
+            ))
+        except aioredis.RedisError as e:
+            # Без Redis не блокируем бота: ограничение по 429 остается на стороне Telegram
+            logger.warning(f"Outbound limiter unavailable: {e}")
+            return 0.0
+
+    async def pause(self, seconds: float) -> None:
+        try:
+            await self.redis.set(self._keys[1], 1, px=max(int(seconds * 1000), 1))
+        except aioredis.RedisError as e:
+            logger.warning(f"Outbound limiter unavailable: {e}")
+
+
+def create_outbound_limiter(bot_id: int = 0) -> OutboundLimiter:
+    if config.OUTBOUND_LIMITER == "redis":
+        return RedisOutboundLimiter(config.OUTBOUND_RATE, config.OUTBOUND_BURST, config.OUTBOUND_RESERVE,
+                                    redis_url=config.REDIS_URL, bot_id=bot_id)
+    return MemoryOutboundLimiter(config.OUTBOUND_RATE, config.OUTBOUND_BURST, config.OUTBOUND_RESERVE)
+
+
+class OutboundQueue:
+    """
+    Очередь ожидающих токен запросов процесса: токены выдаются по приоритету,
+    внутри класса — в порядке поступления.
+    """
+
+    # Дольше не спим, чтобы вовремя заметить пришедший запрос более высокого приоритета
+    max_sleep = 0.05
+
+    def __init__(self, limiter: OutboundLimiter):
+        self.limiter = limiter
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+
+    def waiting(self) -> dict[int, int]:
+        counts: dict[int, int] = {}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                counts[priority] = counts.get(priority, 0) + 1
+        return counts
+
+    async def acquire(self, priority: int) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        await future
+
+    async def _run(self) -> None:
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            wait = await self.limiter.try_acquire(priority)
+            if wait <= 0:
+                heapq.heappop(self._waiters)
+                if not future.done():
+                    future.set_result(None)
+                continue
+            await asyncio.sleep(min(wait, self.max_sleep))
+
+
+class ChatLocks:
+    """
+    Блокировки по чатам: запросы в один чат выполняются последовательно (FIFO).
+    Блокировка удаляется, когда ее никто не держит и не ждет.
+    """
+
+    def __init__(self):
+        self._locks: dict[Any, list] = {}  # chat_id -> [lock, число ожидающих и держащих]
+
+    @asynccontextmanager
+    async def hold(self, chat_id: Any):
+        entry = self._locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[chat_id]
+
+
+class OutboundMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: лимит и приоритет для запросов, адресованных чатам.
+    Остальные запросы (getUpdates, getMe, setWebhook...) выполняются сразу.
+    """
+
+    def __init__(self, limiter: OutboundLimiter):
+        self.limiter = limiter
+        self.queue = OutboundQueue(limiter)
+        self.chat_locks = ChatLocks()
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        async with self.chat_locks.hold(chat_id):
+            await self.queue.acquire(outbound_priority.get())
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                await self.limiter.pause(e.retry_after)
+                raise
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Iterable, NamedTuple, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+from loguru import logger
+
+from TG.outbound import REMINDER, outbound_priority
+
+
+class OutgoingMessage(NamedTuple):
+    chat_id: int
+    text: str
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+
+
+class SendReport:
+    """
+    Итог отправки пачки сообщений.
+    """
+
+    def __init__(self):
+        self.sent: list[int] = []  # chat_id успешно доставленных сообщений
+        self.failed: dict[int, TelegramAPIError] = {}  # chat_id -> последняя ошибка
+        self.retried = 0  # Сколько раз сообщения переотправлялись после 429
+
+    def merge(self, other: "SendReport") -> None:
+        self.sent.extend(other.sent)
+        self.failed.update(other.failed)
+        self.retried += other.retried
+
+
+class TokenBucket:
+    """
+    Асинхронный token bucket: не более `rate` операций в секунду, всплеск до `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def pause(self, seconds: float) -> None:
+        """Останавливает выдачу токенов (например, после 429 от Telegram)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RateLimitedSender:
+    """
+    Отправка сообщений через пул ограниченной конкурентности с общим и початовым лимитом.
+
+    При ответе 429 (`retry_after`) сообщение не считается ошибкой: общий лимит
+    приостанавливается на указанное время, а сообщение переотправляется позже.
+
+    Запросы идут с классом приоритета `priority` (см. `TG.outbound`): общий лимит
+    бота пропускает их только после ответов пользователям.
+    """
+
+    def __init__(self, bot: Bot, rate: float, per_chat_rate: float, concurrency: int, max_retries: int = 3,
+                 max_tracked_chats: int = 10_000, priority: int = REMINDER):
+        self.bot = bot
+        self.priority = priority
+        self.bucket = TokenBucket(rate)
+        self.per_chat_rate = per_chat_rate
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_retries = max_retries
+        self.max_tracked_chats = max_tracked_chats
+        self._chat_buckets: OrderedDict[int, TokenBucket] = OrderedDict()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.per_chat_rate, capacity=1)
+            self._chat_buckets[chat_id] = bucket
+            if len(self._chat_buckets) > self.max_tracked_chats:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def _send(self, message: OutgoingMessage, report: SendReport) -> None:
+        attempt = 0
+        while True:
+            # Лимит чата ждем до захвата слота: иначе серия сообщений в один чат
+            # занимает слоты пула, пока остальные чаты простаивают
+            await self._chat_bucket(message.chat_id).acquire()
+            async with self.semaphore:
+                await self.bucket.acquire()
+                try:
+                    await self.bot.send_message(message.chat_id, message.text, reply_markup=message.reply_markup)
+                    report.sent.append(message.chat_id)
+                    return
+                except TelegramRetryAfter as e:
+                    error, retry_after = e, e.retry_after
+                    self.bucket.pause(retry_after)
+                except TelegramAPIError as e:
+                    logger.warning(f"Failed to send message to chat {message.chat_id}: {e}")
+                    report.failed[message.chat_id] = e
+                    return
+
+            # Слот пула освобожден: пока ждем retry_after, остальные сообщения ставятся в очередь
+            attempt += 1
+            if attempt > self.max_retries:
+                logger.warning(f"Giving up on chat {message.chat_id} after {attempt} retries")
+                report.failed[message.chat_id] = error
+                return
+            report.retried += 1
+            await asyncio.sleep(retry_after)
+
+    async def send_many(self, messages: Iterable[OutgoingMessage]) -> SendReport:
+        """
+        Отправляет пачку сообщений и ждет завершения всех отправок.
+        """
+        report = SendReport()
+        # Задачи gather копируют контекст, поэтому класс приоритета достаточно выставить здесь
+        token = outbound_priority.set(self.priority)
+        try:
+            await asyncio.gather(*(self._send(message, report) for message in messages))
+        finally:
+            outbound_priority.reset(token)
+        return report
@@ -0,0 +1,294 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+
+from api.pydantic_models import (HabitBatchResponse, HabitCreate, HabitLogBatchItem, HabitLogBatchResponse,
+                                 HabitLogResponse, HabitResponse, HabitStatsResponse, HabitUpdate, ReminderSettings)
+from config import config
+from database.db import async_session
+from database.func_db import HabitCRUD, HabitLogCRUD, HabitStatsCRUD, ReminderCRUD, UserCRUD
+from reminders.schedule import next_fire_at, reminder_schedule, reschedule_habits, user_member, user_today
+from TG.funcs_tg import User
+
+
+class HabitService:
+    """
+    Операции бота с привычками пользователя.
+
+    Все методы принимают Telegram ID пользователя и возвращают данные в том же
+    виде, что и HTTP API (словари с JSON-совместимыми значениями), или None при ошибке.
+    """
+
+    async def authenticate_user(self, user_id: int, username: str, chat_id: int) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def register_user(self, user_id: int, username: str, chat_id: int, deep_linking: str,
+                            is_premium: bool, language: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def get_habits(self, user_id: int) -> Optional[List[dict]]:
+        raise NotImplementedError
+
+    async def get_unlogged_habits(self, user_id: int) -> Optional[List[dict]]:
+        raise NotImplementedError
+
+    async def get_habit_stats(self, user_id: int) -> Optional[List[dict]]:
+        raise NotImplementedError
+
+    async def create_habit(self, user_id: int, habit_data: dict) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def update_habit(self, user_id: int, habit_id: int, habit_update: dict) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def delete_habit(self, user_id: int, habit_id: int) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def create_habit_log(self, user_id: int, habit_id: int, log_data: Dict[str, Any]) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def create_habits(self, user_id: int, habits: List[dict]) -> Optional[dict]:
+        """Создает несколько привычек; ответ: {'created': [...], 'errors': [...]}."""
+        raise NotImplementedError
+
+    async def create_habit_logs(self, user_id: int, items: List[dict]) -> Optional[dict]:
+        """Отмечает несколько привычек; ответ: {'created': [...], 'errors': [...]}."""
+        raise NotImplementedError
+
+    async def update_reminder_settings(self, user_id: int, settings: dict) -> Optional[dict]:
+        raise NotImplementedError
+
+
+class HttpHabitService(HabitService):
+    """
+    Работа через HTTP API (бот и API могут быть развернуты раздельно).
+    """
+
+    async def authenticate_user(self, user_id: int, username: str, chat_id: int) -> Optional[dict]:
+        return await User.authenticate_user(user_id, username, chat_id)
+
+    async def register_user(self, user_id: int, username: str, chat_id: int, deep_linking: str,
+                            is_premium: bool, language: str) -> Optional[dict]:
+        return await User.register_user(user_id, username, chat_id, deep_linking, is_premium, language)
+
+    async def get_habits(self, user_id: int) -> Optional[List[dict]]:
+        return await User.get_habits(user_id)
+
+    async def get_unlogged_habits(self, user_id: int) -> Optional[List[dict]]:
+        return await User.get_unlogged_habits(user_id)
+
+    async def get_habit_stats(self, user_id: int) -> Optional[List[dict]]:
+        return await User.get_habit_stats(user_id)
+
+    async def create_habit(self, user_id: int, habit_data: dict) -> Optional[dict]:
+        return await User.create_habit(user_id, habit_data)
+
+    async def update_habit(self, user_id: int, habit_id: int, habit_update: dict) -> Optional[dict]:
+        return await User.update_habit(user_id, habit_id, habit_update)
+
+    async def delete_habit(self, user_id: int, habit_id: int) -> Optional[dict]:
+        return await User.delete_habit(user_id, habit_id)
+
+    async def create_habit_log(self, user_id: int, habit_id: int, log_data: Dict[str, Any]) -> Optional[dict]:
+        return await User.create_habit_log(user_id, habit_id, log_data)
+
+    async def create_habits(self, user_id: int, habits: List[dict]) -> Optional[dict]:
+        return await User.create_habits(user_id, habits)
+
+    async def create_habit_logs(self, user_id: int, items: List[dict]) -> Optional[dict]:
+        return await User.create_habit_logs(user_id, items)
+
+    async def update_reminder_settings(self, user_id: int, settings: dict) -> Optional[dict]:
+        return await User.update_reminder_settings(user_id, settings)
+
+
+class DirectHabitService(HabitService):
+    """
+    Работа напрямую с БД через HabitCRUD/HabitLogCRUD, без HTTP, JWT и сериализации запроса.
+
+    Используется, когда бот запущен рядом с БД. Пользователь уже идентифицирован
+    Telegram, поэтому токены не нужны; принадлежность привычки проверяется по user_id.
+    """
+
+    @staticmethod
+    def _dump(model, obj) -> dict:
+        return model.model_validate(obj).model_dump(mode="json")
+
+    @staticmethod
+    def _parse(model, data: dict):
+        """Проверяет входные данные так же, как это сделал бы API; при ошибке возвращает None."""
+        try:
+            return model.model_validate(data)
+        except ValidationError as e:
+            logger.error(f"Invalid {model.__name__} data: {e}")
+            return None
+
+    @staticmethod
+    def _parse_batch(items: List[dict], model) -> tuple[list, list[dict]]:
+        """Проверяет элементы пакета по отдельности, как это делает API."""
+        valid, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, model.model_validate(item)))
+            except ValidationError as e:
+                errors.append({"index": index, "detail": e.errors(include_url=False, include_context=False)})
+        return valid, errors
+
+    async def authenticate_user(self, user_id: int, username: str, chat_id: int) -> Optional[dict]:
+        async with async_session() as db:
+            user = await UserCRUD(db).get(user_id=user_id)
+        if user is None:
+            return None
+        return {"user_id": user.user_id, "username": user.username}
+
+    async def register_user(self, user_id: int, username: str, chat_id: int, deep_linking: str,
+                            is_premium: bool, language: str) -> Optional[dict]:
+        try:
+            async with async_session() as db:
+                user = await UserCRUD(db).create(
+                    user_id=user_id,
+                    username=username,
+                    chat_id=chat_id,
+                    deep_linking=deep_linking,
+                    is_premium=is_premium,
+                    language=language
+                )
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to register user {user_id}: {e}")
+            return None
+        # Без этого первое напоминание попало бы в индекс только при ночной пересборке
+        fire_at = next_fire_at(user.timezone, user.reminder_time, datetime.now(timezone.utc))
+        await reminder_schedule.schedule(user_member(user_id), fire_at)
+        return {"user_id": user.user_id, "username": user.username}
+
+    async def get_habits(self, user_id: int) -> Optional[List[dict]]:
+        async with async_session() as db:
+            return await HabitCRUD(db).list_habits(user_id)
+
+    async def get_unlogged_habits(self, user_id: int) -> Optional[List[dict]]:
+        async with async_session() as db:
+            return await HabitCRUD(db).list_unlogged_habits(user_id, await user_today(db, user_id))
+
+    async def get_habit_stats(self, user_id: int) -> Optional[List[dict]]:
+        async with async_session() as db:
+            stats = await HabitStatsCRUD(db).get_user_stats(user_id, await user_today(db, user_id))
+        return [self._dump(HabitStatsResponse, habit_stats) for habit_stats in stats]
+
+    async def create_habit(self, user_id: int, habit_data: dict) -> Optional[dict]:
+        habit_data = self._parse(HabitCreate, habit_data)
+        if habit_data is None:
+            return None
+        try:
+            async with async_session() as db:
+                habit = await HabitCRUD(db).create_habit(user_id=user_id, **habit_data.model_dump())
+                if habit.reminder_time is not None:
+                    await reschedule_habits(db, [habit.id], datetime.now(timezone.utc))
+                return self._dump(HabitResponse, habit)
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to create habit for user {user_id}: {e}")
+            return None
+
+    async def update_habit(self, user_id: int, habit_id: int, habit_update: dict) -> Optional[dict]:
+        habit_update = self._parse(HabitUpdate, habit_update)
+        if habit_update is None:
+            return None
+        async with async_session() as db:
+            habit_crud = HabitCRUD(db)
+            habit = await habit_crud.get_habit(habit_id)
+            if habit is None or habit.user_id != user_id:
+                logger.error(f"Failed to update habit {habit_id}.")
+                return None
+
+            clear_reminder_time = "reminder_time" in habit_update.model_fields_set and habit_update.reminder_time is None
+            habit = await habit_crud.update_habit(habit_id=habit_id, clear_reminder_time=clear_reminder_time,
+                                                  **habit_update.model_dump())
+            if "reminder_time" in habit_update.model_fields_set or habit_update.is_tracked is not None:
+                await reschedule_habits(db, [habit_id], datetime.now(timezone.utc))
+
+            logger.info(f"Habit {habit_id} successfully updated.")
+            return self._dump(HabitUpdate, habit)
+
+    async def delete_habit(self, user_id: int, habit_id: int) -> Optional[dict]:
+        async with async_session() as db:
+            habit_crud = HabitCRUD(db)
+            habit = await habit_crud.get_habit(habit_id)
+            if habit is None or habit.user_id != user_id:
+                return None
+
+            await habit_crud.delete_habit(habit_id)
+            await reschedule_habits(db, [habit_id], datetime.now(timezone.utc))
+        return {"detail": "Habit deleted successfully"}
+
+    async def create_habit_log(self, user_id: int, habit_id: int, log_data: Dict[str, Any]) -> Optional[dict]:
+        async with async_session() as db:
+            new_log = await HabitLogCRUD(db).check_in(habit_id, None, log_data["completed"], user_id=user_id)
+        if new_log is None:
+            return None
+        return self._dump(HabitLogResponse, new_log)
+
+    async def create_habits(self, user_id: int, habits: List[dict]) -> Optional[dict]:
+        if len(habits) > config.BATCH_MAX_ITEMS:
+            logger.error(f"Batch is limited to {config.BATCH_MAX_ITEMS} items")
+            return None
+        valid, errors = self._parse_batch(habits, HabitCreate)
+        try:
+            async with async_session() as db:
+                created = await HabitCRUD(db).create_habits(user_id, [habit for _, habit in valid])
+                with_reminders = [habit.id for habit in created if habit.reminder_time is not None]
+                if with_reminders:
+                    await reschedule_habits(db, with_reminders, datetime.now(timezone.utc))
+                return self._dump(HabitBatchResponse, {"created": created, "errors": errors})
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to create habits for user {user_id}: {e}")
+            return None
+
+    async def create_habit_logs(self, user_id: int, items: List[dict]) -> Optional[dict]:
+        if len(items) > config.BATCH_MAX_ITEMS:
+            logger.error(f"Batch is limited to {config.BATCH_MAX_ITEMS} items")
+            return None
+        valid, errors = self._parse_batch(items, HabitLogBatchItem)
+        indexes = {}
+        for index, item in valid:
+            if item.habit_id in indexes:
+                errors.append({"index": index, "detail": "Duplicate habit_id in batch"})
+            else:
+                indexes[item.habit_id] = (index, item.completed)
+
+        async with async_session() as db:
+            created = await HabitLogCRUD(db).check_in_many(
+                user_id, await user_today(db, user_id),
+                [(habit_id, completed) for habit_id, (_, completed) in indexes.items()]
+            )
+            missing = set(indexes) - {row.habit_id for row in created}
+            owned = await HabitCRUD(db).get_owned_habit_ids(user_id, list(missing)) if missing else set()
+
+        for habit_id in missing:
+            detail = "Log for today already exists" if habit_id in owned else "Habit not found"
+            errors.append({"index": indexes[habit_id][0], "detail": detail})
+        errors.sort(key=lambda error: error["index"])
+        return self._dump(HabitLogBatchResponse, {"created": created, "errors": errors})
+
+    async def update_reminder_settings(self, user_id: int, settings: dict) -> Optional[dict]:
+        settings = self._parse(ReminderSettings, settings)
+        if settings is None:
+            return None
+        async with async_session() as db:
+            user = await ReminderCRUD(db).update_user_settings(user_id, settings.timezone, settings.reminder_time)
+            if user is None:
+                return None
+
+            fire_at = next_fire_at(user.timezone, user.reminder_time, datetime.now(timezone.utc))
+            await reminder_schedule.schedule(user_member(user_id), fire_at)
+            return self._dump(ReminderSettings, user)
+
+
+def create_habit_service() -> HabitService:
+    if config.BOT_BACKEND == "direct":
+        return DirectHabitService()
+    return HttpHabitService()
+
+
+habit_service = create_habit_service()
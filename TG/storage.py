@@ -0,0 +1,222 @@
+"""
+Хранилища состояния бота: FSM (состояние и данные диалога) и ID служебных
+сообщений, которые нужно удалить после завершения диалога.
+
+Redis-реализации общие для всех процессов бота (polling, webhook-воркеры):
+запись пользователя хранится в одном ключе с TTL, чтение и запись выполняются
+одним pipeline. Реализации в памяти нужны для тестов и ограничены по размеру
+(LRU) и времени жизни записей (TTL).
+"""
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import aioredis
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from config import config
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+class BoundedTTLCache:
+    """
+    Словарь в памяти с ограничением на число ключей (LRU) и временем жизни записей.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._items.get(key)
+        if entry is None:
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._items[key]
+            return default
+
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key, value) -> None:
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self._items.pop(key, None)
+        return value
+
+
+class MemoryFSMStorage(BaseStorage):
+    """
+    FSM в памяти процесса с LRU/TTL-вытеснением.
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl: int = 24 * 60 * 60):
+        self._records = BoundedTTLCache(max_size=max_size, ttl=ttl)
+
+    def _record(self, key: StorageKey) -> dict:
+        return self._records.get(key) or {"state": None, "data": {}}
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = self._record(key)
+        record["state"] = _state_name(state)
+        self._records.set(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._record(key)["state"]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = self._record(key)
+        record["data"] = data.copy()
+        self._records.set(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return self._record(key)["data"].copy()
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisFSMStorage(BaseStorage):
+    """
+    FSM в Redis: состояние и данные пользователя — поля `state` и `data` одного hash
+    с TTL, который продлевается при каждой записи.
+    """
+
+    def __init__(self, redis_url: str = "redis://localhost", ttl: int = 24 * 60 * 60):
+        self.redis = aioredis.from_url(redis_url, decode_responses=True)
+        self.ttl = ttl
+        self.key_builder = DefaultKeyBuilder(prefix="fsm", with_destiny=True)
+
+    async def _write(self, key: StorageKey, field: str, value: Optional[str]) -> None:
+        redis_key = self.key_builder.build(key)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if value is None:
+                pipe.hdel(redis_key, field)
+            else:
+                pipe.hset(redis_key, field, value)
+                pipe.expire(redis_key, self.ttl)
+            await pipe.execute()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._write(key, "state", _state_name(state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self.redis.hget(self.key_builder.build(key), "state")
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._write(key, "data", json.dumps(data) if data else None)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        value = await self.redis.hget(self.key_builder.build(key), "data")
+        return json.loads(value) if value else {}
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Чтение и запись данных в одной транзакции (WATCH/MULTI), чтобы обработчики
+        из разных процессов не затирали изменения друг друга.
+        """
+        redis_key = self.key_builder.build(key)
+        result: Dict[str, Any] = {}
+
+        async def merge(pipe) -> None:
+            nonlocal result
+            value = await pipe.hget(redis_key, "data")
+            result = {**(json.loads(value) if value else {}), **data}
+            pipe.multi()
+            pipe.hset(redis_key, "data", json.dumps(result))
+            pipe.expire(redis_key, self.ttl)
+
+        await self.redis.transaction(merge, redis_key)
+        return result.copy()
+
+    async def close(self) -> None:
+        await self.redis.close()
+
+
+class MessageStore:
+    """
+    ID служебных сообщений пользователя, которые удаляются после завершения диалога.
+    """
+
+    async def add(self, user_id: int, *message_ids: int) -> None:
+        raise NotImplementedError
+
+    async def pop_all(self, user_id: int) -> list[int]:
+        """Возвращает сохраненные ID и очищает список."""
+        raise NotImplementedError
+
+    async def clear(self, user_id: int) -> None:
+        raise NotImplementedError
+
+
+class MemoryMessageStore(MessageStore):
+
+    def __init__(self, max_users: int = 10_000, ttl: int = 24 * 60 * 60):
+        self._messages = BoundedTTLCache(max_size=max_users, ttl=ttl)
+
+    async def add(self, user_id: int, *message_ids: int) -> None:
+        self._messages.set(user_id, self._messages.get(user_id, []) + list(message_ids))
+
+    async def pop_all(self, user_id: int) -> list[int]:
+        return self._messages.pop(user_id, [])
+
+    async def clear(self, user_id: int) -> None:
+        self._messages.pop(user_id)
+
+
+class RedisMessageStore(MessageStore):
+    """
+    Список ID сообщений в Redis (`tg:messages:<user_id>`) с TTL.
+    """
+
+    prefix = "tg:messages:"
+
+    def __init__(self, redis_url: str = "redis://localhost", ttl: int = 24 * 60 * 60):
+        self.redis = aioredis.from_url(redis_url, decode_responses=True)
+        self.ttl = ttl
+
+    async def add(self, user_id: int, *message_ids: int) -> None:
+        key = f"{self.prefix}{user_id}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *message_ids)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def pop_all(self, user_id: int) -> list[int]:
+        key = f"{self.prefix}{user_id}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrange(key, 0, -1)
+            pipe.delete(key)
+            message_ids, _ = await pipe.execute()
+        return [int(message_id) for message_id in message_ids]
+
+    async def clear(self, user_id: int) -> None:
+        await self.redis.delete(f"{self.prefix}{user_id}")
+
+
+def create_fsm_storage() -> BaseStorage:
+    if config.BOT_STORAGE == "redis":
+        return RedisFSMStorage(redis_url=config.REDIS_URL, ttl=config.BOT_STORAGE_TTL)
+    return MemoryFSMStorage(ttl=config.BOT_STORAGE_TTL)
+
+
+def create_message_store() -> MessageStore:
+    if config.BOT_STORAGE == "redis":
+        return RedisMessageStore(redis_url=config.REDIS_URL, ttl=config.BOT_STORAGE_TTL)
+    return MemoryMessageStore(ttl=config.BOT_STORAGE_TTL)
+
+
+message_store = create_message_store()
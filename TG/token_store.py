@@ -0,0 +1,85 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import aioredis
+
+from config import config
+
+
+class TokenStore:
+    """
+    Хранилище токенов API по Telegram user_id.
+    """
+
+    async def get(self, user_id: int) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def set(self, user_id: int, tokens: dict, ttl: int) -> None:
+        raise NotImplementedError
+
+    async def delete(self, user_id: int) -> None:
+        raise NotImplementedError
+
+
+class MemoryTokenStore(TokenStore):
+    """
+    Токены в памяти процесса с TTL и ограничением на число пользователей (LRU).
+    """
+
+    def __init__(self, max_users: int = 10_000):
+        self.max_users = max_users
+        self._tokens: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+
+    async def get(self, user_id: int) -> Optional[dict]:
+        entry = self._tokens.get(user_id)
+        if entry is None:
+            return None
+
+        expires_at, tokens = entry
+        if expires_at <= time.monotonic():
+            del self._tokens[user_id]
+            return None
+
+        self._tokens.move_to_end(user_id)
+        return tokens
+
+    async def set(self, user_id: int, tokens: dict, ttl: int) -> None:
+        self._tokens[user_id] = (time.monotonic() + ttl, tokens)
+        self._tokens.move_to_end(user_id)
+        while len(self._tokens) > self.max_users:
+            self._tokens.popitem(last=False)
+
+    async def delete(self, user_id: int) -> None:
+        self._tokens.pop(user_id, None)
+
+
+class RedisTokenStore(TokenStore):
+    """
+    Токены в Redis: общие для всех процессов бота, истекают по TTL.
+    """
+
+    prefix = "tg:tokens:"
+
+    def __init__(self, redis_url: str = "redis://localhost"):
+        self.redis = aioredis.from_url(redis_url, decode_responses=True)
+
+    async def get(self, user_id: int) -> Optional[dict]:
+        value = await self.redis.get(f"{self.prefix}{user_id}")
+        return json.loads(value) if value else None
+
+    async def set(self, user_id: int, tokens: dict, ttl: int) -> None:
+        await self.redis.set(f"{self.prefix}{user_id}", json.dumps(tokens), ex=ttl)
+
+    async def delete(self, user_id: int) -> None:
+        await self.redis.delete(f"{self.prefix}{user_id}")
+
+
+def create_token_store() -> TokenStore:
+    if config.TOKEN_STORE == "redis":
+        return RedisTokenStore(redis_url=config.REDIS_URL)
+    return MemoryTokenStore()
+
+
+token_store = create_token_store()
@@ -0,0 +1,285 @@
+"""
+Webhook-режим бота с горизонтально масштабируемыми обработчиками обновлений.
+
+Webhook-приложение (aiohttp) только принимает обновления от Telegram и кладет их
+в очередь, разбитую на партиции. Партиция выбирается по chat_id согласованным
+хешированием, поэтому все обновления одного чата попадают в одну партицию.
+Каждую партицию читает ровно один воркер и обрабатывает ее записи строго по
+очереди — порядок обновлений внутри чата сохраняется. Партиции распределяются
+между воркерами тем же согласованным хешированием: при изменении числа воркеров
+переезжает только часть партиций.
+"""
+import asyncio
+import json
+from typing import AsyncIterator, Optional
+
+import aioredis
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from loguru import logger
+
+from config import config
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping, Veach): номер корзины от 0 до `buckets - 1`.
+    При увеличении числа корзин с N до N+1 переезжает только 1/(N+1) ключей.
+    """
+    key &= 0xFFFFFFFFFFFFFFFF
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def update_chat_id(update: dict) -> int:
+    """
+    Возвращает chat_id (или id пользователя, если чата нет) из «сырого» обновления Telegram.
+    """
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = event.get("from") or event.get("user")
+        if user:
+            return user["id"]
+    return 0
+
+
+def partition_for_chat(chat_id: int, partitions: int) -> int:
+    return jump_hash(chat_id, partitions)
+
+
+def worker_partitions(worker_id: int, workers: int, partitions: int) -> list[int]:
+    """
+    Партиции, которые читает воркер `worker_id` из `workers`.
+    """
+    return [p for p in range(partitions) if jump_hash(p, workers) == worker_id]
+
+
+class UpdateQueue:
+    """
+    Очередь обновлений Telegram, разбитая на партиции.
+    """
+
+    async def put(self, partition: int, update: dict) -> None:
+        raise NotImplementedError
+
+    def consume(self, partition: int) -> AsyncIterator[tuple[str, dict]]:
+        """Возвращает записи партиции по порядку: (id записи, обновление)."""
+        raise NotImplementedError
+
+    async def ack(self, partition: int, entry_id: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryUpdateQueue(UpdateQueue):
+    """
+    Очередь в памяти процесса: для тестов и запуска webhook и воркеров в одном процессе.
+    """
+
+    def __init__(self, partitions: int, maxsize: int = 10_000):
+        self._queues = [asyncio.Queue(maxsize=maxsize) for _ in range(partitions)]
+        self._counter = 0
+
+    async def put(self, partition: int, update: dict) -> None:
+        self._counter += 1
+        await self._queues[partition].put((str(self._counter), update))
+
+    async def consume(self, partition: int) -> AsyncIterator[tuple[str, dict]]:
+        queue = self._queues[partition]
+        while True:
+            yield await queue.get()
+
+    async def ack(self, partition: int, entry_id: str) -> None:
+        self._queues[partition].task_done()
+
+
+class RedisUpdateQueue(UpdateQueue):
+    """
+    Очередь на Redis Streams: одна партиция — один stream `tg:updates:<n>`.
+
+    Записи читаются через consumer group и подтверждаются (XACK) после обработки.
+    Имя консьюмера привязано к партиции, а не к воркеру, поэтому при падении воркера
+    необработанные обновления будут прочитаны снова воркером, которому достанется партиция.
+    """
+
+    prefix = "tg:updates:"
+    group = "bot-workers"
+
+    def __init__(self, redis_url: str = "redis://localhost", maxlen: int = 100_000,
+                 block_ms: int = 5000, batch: int = 100):
+        self.redis = aioredis.from_url(redis_url, decode_responses=True)
+        self.maxlen = maxlen
+        self.block_ms = block_ms
+        self.batch = batch
+
+    def _stream(self, partition: int) -> str:
+        return f"{self.prefix}{partition}"
+
+    async def put(self, partition: int, update: dict) -> None:
+        await self.redis.xadd(self._stream(partition), {"update": json.dumps(update)},
+                              maxlen=self.maxlen, approximate=True)
+
+    async def _ensure_group(self, stream: str) -> None:
+        try:
+            await self.redis.xgroup_create(stream, self.group, id="0", mkstream=True)
+        except aioredis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def consume(self, partition: int) -> AsyncIterator[tuple[str, dict]]:
+        stream = self._stream(partition)
+        consumer = f"partition-{partition}"
+        await self._ensure_group(stream)
+
+        # Сначала дочитываем записи, выданные этому консьюмеру, но не подтвержденные
+        last_id = "0"
+        while True:
+            response = await self.redis.xreadgroup(
+                self.group, consumer, {stream: last_id}, count=self.batch,
+                block=None if last_id == "0" else self.block_ms
+            )
+            entries = response[0][1] if response else []
+            if not entries and last_id == "0":
+                last_id = ">"
+                continue
+
+            for entry_id, fields in entries:
+                yield entry_id, json.loads(fields["update"])
+
+    async def ack(self, partition: int, entry_id: str) -> None:
+        await self.redis.xack(self._stream(partition), self.group, entry_id)
+
+    async def close(self) -> None:
+        await self.redis.close()
+
+
+def create_update_queue() -> UpdateQueue:
+    if config.UPDATE_QUEUE == "redis":
+        return RedisUpdateQueue(redis_url=config.REDIS_URL)
+    return MemoryUpdateQueue(partitions=config.UPDATE_PARTITIONS)
+
+
+def create_webhook_app(bot: Bot, queue: UpdateQueue) -> web.Application:
+    """
+    aiohttp-приложение, принимающее обновления Telegram и раскладывающее их по партициям.
+    """
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if config.WEBHOOK_SECRET and request.headers.get(SECRET_HEADER) != config.WEBHOOK_SECRET:
+            return web.Response(status=401)
+
+        update = await request.json()
+        partition = partition_for_chat(update_chat_id(update), config.UPDATE_PARTITIONS)
+        await queue.put(partition, update)
+        return web.Response()
+
+    async def on_startup(_: web.Application) -> None:
+        if config.WEBHOOK_URL:
+            await bot.set_webhook(f"{config.WEBHOOK_URL}{config.WEBHOOK_PATH}",
+                                  secret_token=config.WEBHOOK_SECRET)
+            logger.info(f"Webhook установлен: {config.WEBHOOK_URL}{config.WEBHOOK_PATH}")
+
+    async def on_cleanup(_: web.Application) -> None:
+        await queue.close()
+
+    app = web.Application()
+    app.router.add_post(config.WEBHOOK_PATH, handle_update)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+class UpdateWorker:
+    """
+    Обрабатывает обновления из своих партиций: по одной задаче на партицию,
+    записи внутри партиции обрабатываются последовательно.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, queue: UpdateQueue, partitions: list[int]):
+        self.dp = dp
+        self.bot = bot
+        self.queue = queue
+        self.partitions = partitions
+        self._tasks: list[asyncio.Task] = []
+
+    async def _consume(self, partition: int) -> None:
+        async for entry_id, update in self.queue.consume(partition):
+            try:
+                await self.dp.feed_raw_update(self.bot, update)
+            except Exception as e:
+                logger.exception(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+            await self.queue.ack(partition, entry_id)
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._consume(p)) for p in self.partitions]
+
+    async def run(self) -> None:
+        self.start()
+        await asyncio.gather(*self._tasks)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """
+    Запускает webhook-сервер. С очередью в памяти в этом же процессе запускаются
+    и обработчики всех партиций.
+    """
+    queue = create_update_queue()
+    app = create_webhook_app(bot, queue)
+
+    worker: Optional[UpdateWorker] = None
+    if isinstance(queue, MemoryUpdateQueue):
+        worker = UpdateWorker(dp, bot, queue, list(range(config.UPDATE_PARTITIONS)))
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, config.WEBHOOK_HOST, config.WEBHOOK_PORT).start()
+    logger.info(f"Webhook-сервер слушает {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT}")
+
+    await dp.emit_startup(bot=bot)
+    try:
+        if worker is not None:
+            await worker.run()
+        else:
+            await asyncio.Event().wait()
+    finally:
+        if worker is not None:
+            await worker.stop()
+        await dp.emit_shutdown(bot=bot)
+        await runner.cleanup()
+
+
+async def run_worker(dp: Dispatcher, bot: Bot, worker_id: int, workers: int) -> None:
+    """
+    Запускает воркер `worker_id` из `workers`, читающий свои партиции очереди.
+    """
+    partitions = worker_partitions(worker_id, workers, config.UPDATE_PARTITIONS)
+    logger.info(f"Воркер {worker_id}/{workers} обрабатывает партиции {partitions}")
+
+    queue = create_update_queue()
+    worker = UpdateWorker(dp, bot, queue, partitions)
+
+    await dp.emit_startup(bot=bot)
+    try:
+        await worker.run()
+    finally:
+        await worker.stop()
+        await dp.emit_shutdown(bot=bot)
+        await queue.close()
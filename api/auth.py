@@ -1,3 +1,7 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict
 import aioredis
@@ -6,30 +10,231 @@ from fastapi.logger import logger
 from fastapi.openapi.models import Response
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
-from passlib.context import CryptContext
 from pydantic import ValidationError
 from starlette import status
 
+from api.passwords import password_hasher
 from config import config
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
+def token_hash(token: str) -> str:
+    """Идентификатор токена для кэша и черного списка (сам токен нигде не хранится)."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenRevokedError(Exception):
+    pass
+
+
+class BloomFilter:
+    """
+    Фильтр Блума по хешам отозванных токенов.
+    Отрицательный ответ точный, положительный требует проверки в Redis.
+    """
+
+    def __init__(self, size_bits: int = 1 << 23, hashes: int = 7):
+        self.size_bits = size_bits
+        self.hashes = hashes
+        self._bits = bytearray(size_bits // 8 + 1)
+
+    def _positions(self, item: str):
+        digest = hashlib.sha256(item.encode()).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        return ((h1 + i * h2) % self.size_bits for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class TokenCache:
+    """
+    LRU-кэш проверенных токенов (хеш токена -> payload).
+    Запись живет не дольше `ttl` секунд и не дольше `exp` самого токена.
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl: int = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._items.get(key)
+        if entry is None:
+            return None
+
+        expires_at, payload = entry
+        if expires_at <= time.time():
+            del self._items[key]
+            return None
+
+        self._items.move_to_end(key)
+        return payload
+
+    def set(self, key: str, payload: dict) -> None:
+        expires_at = min(time.time() + self.ttl, float(payload.get("exp", 0)))
+        self._items[key] = (expires_at, payload)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        self._items.pop(key, None)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+token_cache = TokenCache(max_size=config.TOKEN_CACHE_SIZE, ttl=config.TOKEN_CACHE_TTL)
+
+
 class RedisBlacklist:
-    def __init__(self, redis_url: str = "redis://localhost"):
-        self.redis = aioredis.from_url(redis_url)
+    """
+    Черный список отозванных токенов.
+
+    В Redis хранятся ключи `auth:revoked:<sha256 токена>` с TTL до истечения токена.
+    Каждый воркер API держит локальный фильтр Блума по этим хешам: он заполняется
+    при запуске и обновляется по pub/sub-каналу `auth:revocations`, поэтому для
+    неотозванных токенов запрос в Redis не нужен. Пока подписка не активна,
+    проверка всегда идет в Redis; после обрыва подписка восстанавливается
+    с экспоненциальной задержкой, а фильтр строится заново.
+    """
+
+    prefix = "auth:revoked:"
+    channel = "auth:revocations"
+
+    def __init__(self, redis_url: str = "redis://localhost", bloom_bits: int = 1 << 23, bloom_hashes: int = 7,
+                 rebuild_interval: int = 60 * 60, reconnect_delay: float = 1.0, reconnect_max_delay: float = 60.0):
+        self.redis = aioredis.from_url(redis_url, decode_responses=True)
+        self.bloom_bits = bloom_bits
+        self.bloom_hashes = bloom_hashes
+        self.rebuild_interval = rebuild_interval
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.bloom = BloomFilter(bloom_bits, bloom_hashes)
+        self._synced = False
+        self._pending: Optional[set[str]] = None
+        self._rebuild_lock = asyncio.Lock()
+        self._tasks: list[asyncio.Task] = []
 
     async def add(self, token: str, expires_in: timedelta):
-        """Добавляем токен в Redis с TTL"""
-        await self.redis.setex(token, int(expires_in.total_seconds()), "revoked")
+        """Добавляем токен в Redis с TTL и оповещаем остальные воркеры"""
+        key = token_hash(token)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.setex(f"{self.prefix}{key}", int(expires_in.total_seconds()), "revoked")
+            pipe.publish(self.channel, key)
+            await pipe.execute()
+        self._on_revoked(key)
 
     async def is_blacklisted(self, token: str) -> bool:
         """Проверяем, есть ли токен в списке"""
-        return await self.redis.exists(token)
+        key = token_hash(token)
+        if self._synced and key not in self.bloom:
+            return False
+        return bool(await self.redis.exists(f"{self.prefix}{key}"))
+
+    def _on_revoked(self, key: str) -> None:
+        self.bloom.add(key)
+        if self._pending is not None:
+            self._pending.add(key)
+        token_cache.discard(key)
+
+    async def _rebuild_bloom(self) -> None:
+        """
+        Строит фильтр Блума заново по ключам в Redis. Отзывы, пришедшие во время
+        обхода ключей, добавляются в новый фильтр перед заменой.
+        """
+        async with self._rebuild_lock:
+            self._pending = set()
+            try:
+                bloom = BloomFilter(self.bloom_bits, self.bloom_hashes)
+                async for redis_key in self.redis.scan_iter(match=f"{self.prefix}*", count=1000):
+                    bloom.add(redis_key[len(self.prefix):])
+                for key in self._pending:
+                    bloom.add(key)
+                self.bloom = bloom
+            finally:
+                self._pending = None
+
+    async def _subscribe(self):
+        """
+        Подписывается на отзывы токенов и загружает текущий черный список в фильтр Блума.
+        Подписка оформляется до загрузки, поэтому отзывы во время загрузки не теряются.
+        """
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.subscribe(self.channel)
+            await self._rebuild_bloom()
+        except BaseException:
+            await pubsub.close()
+            raise
+        self._synced = True
+        return pubsub
+
+    async def _listen(self, pubsub) -> None:
+        delay = self.reconnect_delay
+        while True:
+            try:
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._on_revoked(message["data"])
+            except (aioredis.RedisError, OSError) as e:
+                logger.warning(f"Revocation subscription lost: {e}")
+            finally:
+                # Без подписки отзывы не доходят до воркера: кэшу больше нельзя доверять
+                self._synced = False
+                token_cache.clear()
+                await pubsub.close()
+
+            # Отзывы, пропущенные без подписки, попадут в фильтр при его пересборке
+            while True:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_max_delay)
+                try:
+                    pubsub = await self._subscribe()
+                    break
+                except (aioredis.RedisError, OSError) as e:
+                    logger.warning(f"Revocation subscription reconnect failed: {e}")
+            delay = self.reconnect_delay
+
+    async def _rebuild_periodically(self) -> None:
+        # Отозванные токены истекают, а из фильтра Блума удалять нельзя — периодически строим заново
+        while True:
+            await asyncio.sleep(self.rebuild_interval)
+            try:
+                await self._rebuild_bloom()
+            except Exception as e:
+                logger.error(f"Revocation Bloom filter rebuild failed: {e}")
+
+    async def start(self) -> None:
+        pubsub = await self._subscribe()
+        self._tasks.append(asyncio.create_task(self._listen(pubsub)))
+        self._tasks.append(asyncio.create_task(self._rebuild_periodically()))
+
+    @property
+    def is_synced(self) -> bool:
+        return self._synced
+
+    async def stop(self) -> None:
+        self._synced = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
 
 
 # Инициализируем RedisBlacklist
-redis_blacklist = RedisBlacklist(redis_url=config.REDIS_URL)
+redis_blacklist = RedisBlacklist(
+    redis_url=config.REDIS_URL,
+    bloom_bits=config.REVOCATION_BLOOM_BITS,
+    bloom_hashes=config.REVOCATION_BLOOM_HASHES,
+)
 
 # Типы токенов
 TOKEN_TYPE_ACCESS = "access"
@@ -37,12 +242,41 @@ TOKEN_TYPE_REFRESH = "refresh"
 
 
 class AuthService:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    # Хешировать и проверять пароли следует через api.passwords.password_hasher (вне event loop)
+    pwd_context = password_hasher.context
+
+    @classmethod
+    async def verify_token(cls, token: str) -> Dict:
+        """
+        Декодирует токен и проверяет, что он не отозван.
+
+        Проверенные токены кэшируются в памяти воркера (до `exp`, но не дольше
+        TOKEN_CACHE_TTL), поэтому повторные запросы с тем же токеном не декодируют
+        JWT и не обращаются к Redis. Отзыв токена сбрасывает кэш через pub/sub.
+
+        :raises JWTError: Токен невалиден или истек.
+        :raises TokenRevokedError: Токен отозван.
+        """
+        key = token_hash(token)
+        payload = token_cache.get(key)
+        if payload is not None:
+            return payload
+
+        payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.ALGORITHM])
+        if await redis_blacklist.is_blacklisted(token):
+            raise TokenRevokedError()
+
+        if redis_blacklist.is_synced:
+            token_cache.set(key, payload)
+            # Отзыв мог прийти между проверкой и записью в кэш
+            if key in redis_blacklist.bloom:
+                token_cache.discard(key)
+        return payload
 
     @classmethod
     async def get_current_user(cls, token: str = Depends(oauth2_scheme)) -> int:
         try:
-            payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.ALGORITHM])
+            payload = await cls.verify_token(token)
             user_id_str: str = payload.get("sub")
             token_type: str = payload.get("type")
 
@@ -53,13 +287,6 @@ class AuthService:
                     headers={"WWW-Authenticate": "Bearer"},
                 )
 
-            if await redis_blacklist.is_blacklisted(token):
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token has been revoked",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-
             try:
                 user_id = int(user_id_str)
             except (TypeError, ValueError):
@@ -70,6 +297,12 @@ class AuthService:
                 )
 
             return user_id
+        except TokenRevokedError:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
         except (JWTError, ValidationError):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -77,6 +310,16 @@ class AuthService:
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+    @classmethod
+    async def get_admin_user(cls, token: str = Depends(oauth2_scheme)) -> int:
+        """
+        Текущий пользователь, если он администратор (`ADMIN_USER_IDS`); иначе 403.
+        """
+        user_id = await cls.get_current_user(token)
+        if user_id not in config.ADMIN_USER_IDS:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+        return user_id
+
     @classmethod
     def create_access_token(cls, user_id: int, expires_delta: Optional[timedelta] = None) -> str:
         to_encode = {"sub": str(user_id)}
@@ -102,18 +345,17 @@ class AuthService:
     @classmethod
     async def decode_token(cls, token: str) -> Optional[Dict]:
         try:
-            payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.ALGORITHM])
+            payload = await cls.verify_token(token)
             token_type = payload.get("type")
 
             if token_type not in [TOKEN_TYPE_ACCESS, TOKEN_TYPE_REFRESH]:
                 logger.error("Unknown token type")
                 return None
 
-            if await redis_blacklist.is_blacklisted(token):
-                logger.warning("Token is blacklisted")
-                return None
-
             return payload
+        except TokenRevokedError:
+            logger.warning("Token is blacklisted")
+            return None
         except JWTError as e:
             logger.error(f"Token decoding failed: {str(e)}")
             return None
@@ -2,19 +2,28 @@ import sys
 from typing import List
 
 from fastapi.params import Body
+from pydantic import ValidationError
 from loguru import logger
 
-from sqlalchemy.exc import NoResultFound, SQLAlchemyError
-from starlette.responses import JSONResponse
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
 
-from database.db import AsyncSession, get_db
-from fastapi import APIRouter, Depends, HTTPException, status
+from database.db import AsyncSession, get_db, engine
+from database.pool_metrics import pool_metrics
+from database.cache import habit_list_cache
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordRequestForm
-from datetime import timedelta, datetime
+from datetime import timedelta, datetime, timezone
 from api.pydantic_models import User, HabitCreate, HabitResponse, HabitUpdate, HabitLogResponse, \
-    HabitLogCreate
-from database.func_db import UserCRUD, HabitCRUD, HabitLogCRUD
-from api.auth import AuthService, oauth2_scheme
+    HabitLogCreate, ReminderSettings, BatchRequest, BatchItemError, HabitBatchResponse, HabitLogBatchItem, \
+    HabitLogBatchResponse, HabitStatsResponse, HabitCalendarResponse, BroadcastCreate, BroadcastResponse
+from database.func_db import UserCRUD, HabitCRUD, HabitLogCRUD, HabitStatsCRUD, HabitHistoryCRUD, ReminderCRUD, \
+    BroadcastCRUD
+from reminders.schedule import reminder_schedule, reschedule_habits, next_fire_at, user_member, user_today
+from api.auth import AuthService, TOKEN_TYPE_REFRESH
+from api.passwords import password_hasher
+from celery_app import celery_app
 from config import config
 from database.models import HabitInDB
 
@@ -105,11 +114,9 @@ async def login(
         )
 
     access_token_expires = timedelta(minutes=30)
-    access_token = AuthService.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
+    access_token = AuthService.create_access_token(user.user_id, expires_delta=access_token_expires)
     refresh_token_expires = timedelta(days=config.REFRESH_TOKEN_EXPIRE_DAYS)
-    refresh_token = AuthService.create_refresh_token(data={"sub": user.username}, expires_delta=refresh_token_expires)
+    refresh_token = AuthService.create_refresh_token(user.user_id, expires_delta=refresh_token_expires)
     return {
         "access_token": access_token,
         "refresh_token": refresh_token,
@@ -123,26 +130,29 @@ async def refresh_access_token(
         db: AsyncSession = Depends(get_db)
 ):
     """
-    Обновляет access token и refresh token.
-    """
+    Обновляет access token и refresh token по действующему refresh token.
 
-    payload = AuthService.decode_refresh_token(refresh_token)
-    if payload is None:
+    **Ошибки**:
+    - 401: Токен недействителен, отозван, истек, не является refresh token или пользователь не найден.
+    """
+    payload = await AuthService.decode_token(refresh_token)
+    if payload is None or payload.get("type") != TOKEN_TYPE_REFRESH:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired refresh token")
 
-    username = payload.get("sub")
-    if username is None:
+    try:
+        user_id = int(payload.get("sub"))
+    except (TypeError, ValueError):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
 
-    user = await UserCRUD(db).get_user(username)
-    if not user:
+    user = await UserCRUD(db).get(user_id=user_id)
+    if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
 
     access_token_expires = timedelta(minutes=config.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = AuthService.create_access_token(data={"sub": username}, expires_delta=access_token_expires)
+    access_token = AuthService.create_access_token(user.user_id, expires_delta=access_token_expires)
 
     refresh_token_expires = timedelta(days=config.REFRESH_TOKEN_EXPIRE_DAYS)
-    new_refresh_token = AuthService.create_refresh_token(data={"sub": username}, expires_delta=refresh_token_expires)
+    new_refresh_token = AuthService.create_refresh_token(user.user_id, expires_delta=refresh_token_expires)
 
     return {
         "access_token": access_token,
@@ -154,19 +164,13 @@ async def refresh_access_token(
 @router.post("/habits", response_model=HabitResponse)
 async def create_habit(
     habit_data: HabitCreate,
-    token: str = Depends(oauth2_scheme),
+    user_id: int = Depends(AuthService.get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    user_crud = UserCRUD(db)
-    logger.info(f"Received token: {token}")
-
     try:
-        current_user = await user_crud.get_current_user(token)
-        logger.info(f"Current user: {current_user.id}")
-
         habit_crud = HabitCRUD(db)
         new_habit = await habit_crud.create_habit(
-            user_id=current_user.id,
+            user_id=user_id,
             name=habit_data.name,
             description=habit_data.description,
             target_days=habit_data.target_days,
@@ -175,8 +179,11 @@ async def create_habit(
             last_streak_start=habit_data.last_streak_start,
             current_streak=habit_data.current_streak,
             total_completed=habit_data.total_completed,
-            is_tracked=habit_data.is_tracked
+            is_tracked=habit_data.is_tracked,
+            reminder_time=habit_data.reminder_time
         )
+        if new_habit.reminder_time is not None:
+            await reschedule_habits(db, [new_habit.id], datetime.now(timezone.utc))
 
         return new_habit
 
@@ -201,57 +208,217 @@ async def create_habit(
         )
 
 
-@router.get("/habits/{habit_id}", response_model=HabitCreate)
-async def get_habit(
+def validate_batch(items: list[dict], model) -> tuple[list[tuple[int, object]], list[BatchItemError]]:
+    """
+    Проверяет элементы пакета за один проход: возвращает (индекс, модель) для корректных
+    элементов и ошибки для остальных.
+    """
+    if len(items) > config.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Batch is limited to {config.BATCH_MAX_ITEMS} items")
+
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, model.model_validate(item)))
+        except ValidationError as e:
+            errors.append(BatchItemError(index=index, detail=e.errors(include_url=False, include_context=False)))
+    return valid, errors
+
+
+@router.post("/habits:batch", response_model=HabitBatchResponse)
+async def create_habits_batch(
+        batch: BatchRequest,
+        user_id: int = Depends(AuthService.get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Создает несколько привычек одним запросом (не больше `BATCH_MAX_ITEMS`).
+
+    Элементы имеют формат `HabitCreate` и проверяются по отдельности: некорректные
+    попадают в `errors` с индексом, остальные создаются одним многострочным
+    INSERT ... RETURNING в одной транзакции.
+    """
+    valid, errors = validate_batch(batch.items, HabitCreate)
+
+    habit_crud = HabitCRUD(db)
+    created = await habit_crud.create_habits(user_id, [habit for _, habit in valid])
+
+    with_reminders = [habit.id for habit in created if habit.reminder_time is not None]
+    if with_reminders:
+        await reschedule_habits(db, with_reminders, datetime.now(timezone.utc))
+
+    return HabitBatchResponse(created=created, errors=errors)
+
+
+@router.post("/habits/logs:batch", response_model=HabitLogBatchResponse)
+async def create_habit_logs_batch(
+        batch: BatchRequest,
+        user_id: int = Depends(AuthService.get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Отмечает выполнение нескольких привычек за текущий день одним запросом.
+
+    Элементы: `{"habit_id": 1, "completed": true}`. Все отметки и обновления серий
+    выполняются одним SQL-запросом (CTE) в одной транзакции. Для каждого
+    невыполненного элемента в `errors` указывается причина: ошибка формата,
+    повтор habit_id в пакете, привычка не найдена или уже отмечена сегодня.
+    """
+    valid, errors = validate_batch(batch.items, HabitLogBatchItem)
+
+    items, indexes = [], {}
+    for index, item in valid:
+        if item.habit_id in indexes:
+            errors.append(BatchItemError(index=index, detail="Duplicate habit_id in batch"))
+            continue
+        indexes[item.habit_id] = index
+        items.append((item.habit_id, item.completed))
+
+    log_date = await user_today(db, user_id)
+    created = await HabitLogCRUD(db).check_in_many(user_id, log_date, items)
+
+    missing = set(indexes) - {row.habit_id for row in created}
+    if missing:
+        owned = await HabitCRUD(db).get_owned_habit_ids(user_id, list(missing))
+        for habit_id in missing:
+            detail = "Log for today already exists" if habit_id in owned else "Habit not found"
+            errors.append(BatchItemError(index=indexes[habit_id], detail=detail))
+
+    errors.sort(key=lambda error: error.index)
+    return HabitLogBatchResponse(created=created, errors=errors)
+
+
+@router.get("/habits/stats", response_model=List[HabitStatsResponse])
+async def get_habits_stats(
+        user_id: int = Depends(AuthService.get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Статистика всех привычек текущего пользователя: текущая и самая длинная серия,
+    доля выполненных дней за 7/30/90 дней, дата последнего выполнения и число
+    выполнений по дням недели. Читается из habit_stats, без обхода истории отметок.
+    """
+    return await HabitStatsCRUD(db).get_user_stats(user_id, await user_today(db, user_id))
+
+
+async def get_owned_history(db: AsyncSession, habit_id: int, user_id: int, today):
+    """
+    История выполнения привычки пользователя (битовые карты); 404, если привычка чужая или ее нет.
+    """
+    found = await HabitHistoryCRUD(db).get_history(habit_id, today)
+    if found is None or found[0] != user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Habit not found or access denied")
+    return found[1]
+
+
+@router.get("/habits/{habit_id}/calendar", response_model=HabitCalendarResponse)
+async def get_habit_calendar(
         habit_id: int,
-        token: str = Depends(oauth2_scheme),
+        year: int | None = Query(None, ge=1970, le=9999),
+        month: int | None = Query(None, ge=1, le=12),
+        user_id: int = Depends(AuthService.get_current_user),
         db: AsyncSession = Depends(get_db)
 ):
-    user_crud = UserCRUD(db)
-    logger.info(f"Received token: {token}")
+    """
+    Календарь выполнения привычки за месяц (по умолчанию — текущий) и серии.
+    Строится по битовым картам habit_history, без чтения записей habit_logs.
+    """
+    today = await user_today(db, user_id)
+    history = await get_owned_history(db, habit_id, user_id, today)
+    year, month = year or today.year, month or today.month
+
+    return HabitCalendarResponse(
+        habit_id=habit_id,
+        first_date=today.replace(year=year, month=month, day=1),
+        days=history.month_calendar(year, month),
+        current_streak=history.current_streak(),
+        longest_streak=history.longest_streak(),
+    )
 
-    current_user = await user_crud.get_current_user(token)
 
+@router.get("/habits/{habit_id}/heatmap", response_model=HabitCalendarResponse)
+async def get_habit_heatmap(
+        habit_id: int,
+        days: int = Query(365, ge=1, le=3660),
+        user_id: int = Depends(AuthService.get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Состояния последних `days` дней (включая сегодня) для тепловой карты выполнения.
+    """
+    today = await user_today(db, user_id)
+    history = await get_owned_history(db, habit_id, user_id, today)
+    first_date = today - timedelta(days=days - 1)
+
+    return HabitCalendarResponse(
+        habit_id=habit_id,
+        first_date=first_date,
+        days=history.day_states(first_date, today),
+        current_streak=history.current_streak(),
+        longest_streak=history.longest_streak(),
+    )
+
+
+@router.get("/habits/{habit_id}", response_model=HabitCreate)
+async def get_habit(
+        habit_id: int,
+        user_id: int = Depends(AuthService.get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
     habit_crud = HabitCRUD(db)
     habit = await habit_crud.get_habit(habit_id)
 
-    if habit is None or habit.user_id != current_user.id:
+    if habit is None or habit.user_id != user_id:
         raise HTTPException(status_code=404, detail="Habit not found or not accessible")
 
     return habit
 
 
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Проверяет заголовок If-None-Match (список ETag через запятую или `*`).
+    """
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
 @router.get("/habits", response_model=List[HabitResponse])
 async def get_habits(
-        token: str = Depends(oauth2_scheme),
+        request: Request,
+        user_id: int = Depends(AuthService.get_current_user),
         db: AsyncSession = Depends(get_db)
 ):
-    user_crud = UserCRUD(db)
-    logger.info(f"Received token: {token}")
-
-    current_user = await user_crud.get_current_user(token)
-    logger.info(f"Current user ID: {current_user.id}")
+    """
+    Список привычек текущего пользователя.
 
+    Ответ содержит ETag; если клиент прислал его в If-None-Match и список не менялся,
+    возвращается 304 без тела.
+    """
     habit_crud = HabitCRUD(db)
-    habits = await habit_crud.get_habits_by_user(current_user.id)
+    etag = await habit_crud.get_habits_etag(user_id)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    habits = await habit_crud.list_habits(user_id)
 
-    return habits
+    # Список уже сериализован по HabitResponse (в том числе в кэше)
+    return JSONResponse(content=habits, headers={"ETag": etag})
 
 
 @router.put("/habits/{habit_id}", response_model=HabitUpdate)
 async def update_habit(
         habit_id: int,
         habit_update: HabitUpdate,
-        token: str = Depends(oauth2_scheme),
+        user_id: int = Depends(AuthService.get_current_user),
         db: AsyncSession = Depends(get_db)
 ):
     habit_crud = HabitCRUD(db)
 
-    user_crud = UserCRUD(db)
-    current_user = await user_crud.get_current_user(token)
-
     habit = await habit_crud.get_habit(habit_id)
-    if habit is None or habit.user_id != current_user.id:
+    if habit is None or habit.user_id != user_id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Habit not found or access denied")
 
     updated_habit = await habit_crud.update_habit(
@@ -261,8 +428,13 @@ async def update_habit(
         target_days=habit_update.target_days,
         streak_days=habit_update.streak_days,
         start_date=habit_update.start_date,
-        is_tracked=habit_update.is_tracked
+        is_tracked=habit_update.is_tracked,
+        reminder_time=habit_update.reminder_time,
+        # Явный null снимает собственное время напоминания привычки
+        clear_reminder_time="reminder_time" in habit_update.model_fields_set and habit_update.reminder_time is None
     )
+    if "reminder_time" in habit_update.model_fields_set or habit_update.is_tracked is not None:
+        await reschedule_habits(db, [habit_id], datetime.now(timezone.utc))
 
     return updated_habit
 
@@ -270,39 +442,37 @@ async def update_habit(
 @router.delete("/habits/{habit_id}", response_model=None)
 async def delete_habit(
         habit_id: int,
-        token: str = Depends(oauth2_scheme),
+        user_id: int = Depends(AuthService.get_current_user),
         db: AsyncSession = Depends(get_db)
 ):
     habit_crud = HabitCRUD(db)
-    user_crud = UserCRUD(db)
-
-    try:
-        current_user = await user_crud.get_current_user(token)
 
-        await habit_crud.delete_habit(habit_id)
-        return {"detail": "Habit deleted successfully"}
-
-    except NoResultFound:
+    habit = await habit_crud.get_habit(habit_id)
+    if habit is None or habit.user_id != user_id:
         raise HTTPException(status_code=404, detail=f"Habit with id {habit_id} not found")
 
+    await habit_crud.delete_habit(habit_id)
+    await reschedule_habits(db, [habit_id], datetime.now(timezone.utc))
+    return {"detail": "Habit deleted successfully"}
+
 
 @router.post("/habits/{habit_id}/logs", response_model=HabitLogResponse)
 async def create_habit_log(
     habit_id: int,
     log_data: HabitLogCreate,
+    user_id: int = Depends(AuthService.get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     """
-       Создает запись о выполнении привычки за текущий день.
+       Создает запись о выполнении привычки текущего пользователя за текущий день
+       (по часовому поясу пользователя).
 
        - **habit_id** (int): Идентификатор привычки, для которой нужно добавить запись.
        - **completed** (bool): Флаг выполнения привычки (True — выполнено, False — не выполнено).
 
-       Процесс:
-       1. Проверяет, существует ли привычка с переданным `habit_id`.
-       2. Проверяет, есть ли уже запись за текущий день.
-       3. Если запись отсутствует, создает новую запись о выполнении привычки.
-       4. Обновляет текущую серию дней выполнения привычки:
+       Процесс (один SQL-запрос с CTE в одной транзакции):
+       1. Создает запись о выполнении за текущий день (INSERT ... ON CONFLICT DO NOTHING).
+       2. Если запись вставлена, обновляет текущую серию дней выполнения привычки:
            - Если привычка выполнена (completed=True), увеличивает серию и общее количество выполнений.
            - Если не выполнена, сбрасывает серию.
 
@@ -317,50 +487,158 @@ async def create_habit_log(
 
        Ответ:
        - **201 Created**: Успешно созданная запись.
-       - **404 Not Found**: Привычка с указанным `habit_id` не найдена.
+       - **404 Not Found**: Привычка с указанным `habit_id` не найдена или принадлежит другому пользователю.
        - **400 Bad Request**: Запись о выполнении привычки за текущий день уже существует.
        """
 
     habit_log_crud = HabitLogCRUD(db)
 
-    habit = await db.get(HabitInDB, habit_id)
-    if habit is None:
-        raise HTTPException(status_code=404, detail="Habit not found")
+    # Локальная дата пользователя вычисляется в том же запросе
+    new_log = await habit_log_crud.check_in(habit_id, None, log_data.completed, user_id=user_id)
+    if new_log is None:
+        # Запрос ничего не вставил: либо привычки нет (или она чужая), либо запись за сегодня уже есть
+        habit = await db.get(HabitInDB, habit_id)
+        if habit is None or habit.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Habit not found")
+        raise HTTPException(status_code=400, detail="Log for today already exists")
 
-    log_date = datetime.utcnow().date()
+    return new_log
 
-    existing_logs = await habit_log_crud.get_habit_logs_by_date(habit_id, log_date)
-    if existing_logs:
-        raise HTTPException(status_code=400, detail="Log for today already exists")
 
-    new_log = await habit_log_crud.create_habit_log(habit_id, log_date, log_data)
+@router.get("/unlogged_habits", response_model=List[HabitResponse])
+async def get_habits(
+        request: Request,
+        user_id: int = Depends(AuthService.get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Отслеживаемые привычки текущего пользователя, не отмеченные сегодня.
+    Поддерживает ETag / If-None-Match так же, как `GET /habits`.
+    """
+    habit_crud = HabitCRUD(db)
+    log_date = await user_today(db, user_id)
+    etag = await habit_crud.get_habits_etag(user_id, log_date=log_date)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
 
-    if log_data.completed:
-        habit.current_streak += 1
-        habit.total_completed += 1
-    else:
-        habit.current_streak = 0
+    habits = await habit_crud.list_unlogged_habits(user_id, log_date)
 
-    db.add(habit)
-    await db.commit()
+    return JSONResponse(content=habits, headers={"ETag": etag})
 
-    await db.refresh(habit)
 
-    return new_log
+@router.put("/users/me/reminder", response_model=ReminderSettings)
+async def update_reminder_settings(
+        settings: ReminderSettings,
+        user_id: int = Depends(AuthService.get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Сохраняет время ежедневного напоминания и часовой пояс пользователя.
 
+    - **reminder_time** (time): Локальное время напоминания, например `21:30`.
+    - **timezone** (str): Часовой пояс IANA, например `Europe/Moscow`.
 
-@router.get("/unlogged_habits", response_model=List[HabitResponse])
-async def get_habits(
-        token: str = Depends(oauth2_scheme),
+    Следующее напоминание сразу переносится в индекс напоминаний на новое время.
+    """
+    user = await ReminderCRUD(db).update_user_settings(user_id, settings.timezone, settings.reminder_time)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    fire_at = next_fire_at(user.timezone, user.reminder_time, datetime.now(timezone.utc))
+    await reminder_schedule.schedule(user_member(user_id), fire_at)
+
+    return user
+
+
+@router.post("/admin/broadcasts", response_model=BroadcastResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_broadcast(
+        broadcast: BroadcastCreate,
+        admin_id: int = Depends(AuthService.get_admin_user),
         db: AsyncSession = Depends(get_db)
 ):
-    user_crud = UserCRUD(db)
-    logger.info(f"Received token: {token}")
+    """
+    Создает рассылку объявления всем пользователям и ставит ее отправку в очередь Celery.
+    Только для администраторов (`ADMIN_USER_IDS`).
 
-    current_user = await user_crud.get_current_user(token)
-    logger.info(f"Current user ID: {current_user.id}")
+    - **text** (str): Текст сообщения, поддерживается HTML-разметка Telegram.
 
-    habit_crud = HabitCRUD(db)
-    habits = await habit_crud.get_unlogged_tracked_habits(current_user.id)
+    Ход рассылки — `GET /admin/broadcasts/{id}`.
+    """
+    created = await BroadcastCRUD(db).create(broadcast.text, created_by=admin_id)
+    celery_app.send_task("tasks.run_broadcast", args=[created.id])
+    logger.info(f"Broadcast {created.id} created by {admin_id} for {created.total} users")
+    return created
+
+
+@router.get("/admin/broadcasts/{broadcast_id}", response_model=BroadcastResponse)
+async def get_broadcast(
+        broadcast_id: int,
+        admin_id: int = Depends(AuthService.get_admin_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Состояние рассылки: доставлено, ошибок, курсор и скорость отправки (сообщений в секунду без пауз).
+    """
+    broadcast = await BroadcastCRUD(db).get(broadcast_id)
+    if broadcast is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Broadcast not found")
+    return broadcast
+
+
+@router.post("/admin/broadcasts/{broadcast_id}/pause", response_model=BroadcastResponse)
+async def pause_broadcast(
+        broadcast_id: int,
+        admin_id: int = Depends(AuthService.get_admin_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Ставит рассылку на паузу: отправка останавливается после текущей страницы получателей.
+    """
+    broadcast = await BroadcastCRUD(db).set_status(broadcast_id, "paused", ["pending", "running"])
+    if broadcast is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Broadcast not found or not running")
+    return broadcast
 
-    return habits
+
+@router.post("/admin/broadcasts/{broadcast_id}/resume", response_model=BroadcastResponse,
+             status_code=status.HTTP_202_ACCEPTED)
+async def resume_broadcast(
+        broadcast_id: int,
+        admin_id: int = Depends(AuthService.get_admin_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Продолжает рассылку, поставленную на паузу, с сохраненного курсора.
+    """
+    broadcast = await BroadcastCRUD(db).set_status(broadcast_id, "pending", ["paused"])
+    if broadcast is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Broadcast not found or not paused")
+    celery_app.send_task("tasks.run_broadcast", args=[broadcast_id])
+    return broadcast
+
+
+@router.get("/metrics/habit-cache")
+async def get_habit_cache_metrics(admin_id: int = Depends(AuthService.get_admin_user)):
+    """
+    Попадания в кэш списков привычек по видам списков: попадания в L1 и Redis,
+    промахи, ошибки Redis и доля попаданий.
+    """
+    return habit_list_cache.metrics.snapshot()
+
+
+@router.get("/metrics/password-hasher")
+async def get_password_hasher_metrics(admin_id: int = Depends(AuthService.get_admin_user)):
+    """
+    Очередь операций bcrypt: ожидают, выполняются, выполнено, среднее ожидание
+    и длительность (в секундах), текущая стоимость хеширования.
+    """
+    return password_hasher.metrics()
+
+
+@router.get("/metrics/db-pool")
+async def get_db_pool_metrics(admin_id: int = Depends(AuthService.get_admin_user)):
+    """
+    Состояние пула соединений с БД: выдано соединений, overflow, таймауты
+    и гистограмма времени ожидания соединения (в секундах, кумулятивная).
+    """
+    return pool_metrics.snapshot(engine.pool)
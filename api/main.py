@@ -7,16 +7,20 @@ from fastapi.routing import APIRouter
 
 from handlers import router, logger
 
-from database.db import init_db
+from api.auth import redis_blacklist
+from database.db import init_db, engine
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
 
-    init_db()
+    await init_db(engine)
+    # Подписка на отзывы токенов: без нее каждая проверка токена идет в Redis
+    await redis_blacklist.start()
 
     logger.info("Приложение успешно запущено")
     yield
+    await redis_blacklist.stop()
 
 
 app = FastAPI(title="Chat-Bot", lifespan=lifespan)
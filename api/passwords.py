@@ -0,0 +1,92 @@
+"""
+Хеширование и проверка паролей вне event loop.
+
+bcrypt занимает 100–300 мс CPU на одну операцию. Выполнение в обработчике FastAPI
+блокирует все остальные запросы воркера, поэтому операции выполняются в
+ограниченном пуле потоков (bcrypt освобождает GIL на время вычисления), а число
+одновременных операций ограничено семафором — остальные ждут в очереди.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+from config import config
+
+
+class PasswordHasher:
+    """
+    Асинхронная обертка над CryptContext с пулом потоков и метриками очереди.
+    """
+
+    def __init__(self, rounds: int = 12, workers: int = 4, concurrency: int = 4):
+        self.rounds = rounds
+        # passlib считает хеш устаревшим, только если его стоимость вне min_rounds..max_rounds
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds,
+                                    bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds)
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self.waiting = 0
+        self.in_progress = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.total_duration = 0.0
+
+    async def _run(self, func, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        queued_at = time.perf_counter()
+        acquired = False
+        self.waiting += 1
+        try:
+            async with self._semaphore:
+                acquired = True
+                self.waiting -= 1
+                started_at = time.perf_counter()
+                self.total_wait += started_at - queued_at
+                self.in_progress += 1
+                try:
+                    return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+                finally:
+                    self.in_progress -= 1
+                    self.completed += 1
+                    self.total_duration += time.perf_counter() - started_at
+        finally:
+            # Запрос отменен, пока ждал в очереди
+            if not acquired:
+                self.waiting -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self.context.verify, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> tuple[bool, Optional[str]]:
+        """
+        Проверяет пароль и, если хеш создан с другой стоимостью (rounds), возвращает новый хеш.
+        """
+        return await self._run(self.context.verify_and_update, password, hashed)
+
+    def metrics(self) -> dict:
+        return {
+            "waiting": self.waiting,
+            "in_progress": self.in_progress,
+            "completed": self.completed,
+            "concurrency": self.concurrency,
+            "rounds": self.rounds,
+            "avg_wait": self.total_wait / self.completed if self.completed else 0.0,
+            "avg_duration": self.total_duration / self.completed if self.completed else 0.0,
+        }
+
+
+password_hasher = PasswordHasher(
+    rounds=config.BCRYPT_ROUNDS,
+    workers=config.PASSWORD_HASH_WORKERS,
+    concurrency=config.PASSWORD_HASH_CONCURRENCY,
+)
@@ -1,7 +1,8 @@
-from datetime import date, datetime
+from datetime import date, datetime, time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, computed_field, field_validator
+from typing import Any, Optional
 
 
 class TunedModel(BaseModel):
@@ -34,6 +35,7 @@ class HabitCreate(TunedModel):
     current_streak: int = 0
     total_completed: int = 0
     is_tracked: Optional[bool] = None
+    reminder_time: Optional[time] = None
 
 
 class HabitResponse(TunedModel):
@@ -47,6 +49,7 @@ class HabitResponse(TunedModel):
     current_streak: int = 0
     total_completed: int = 0
     is_tracked: bool
+    reminder_time: Optional[time] = None
 
 
 class HabitUpdate(TunedModel):
@@ -56,6 +59,7 @@ class HabitUpdate(TunedModel):
     streak_days: Optional[int] = None
     start_date: Optional[date] = None
     is_tracked: Optional[bool] = None
+    reminder_time: Optional[time] = None
 
 
 class HabitLogResponse(TunedModel):
@@ -67,4 +71,90 @@ class HabitLogResponse(TunedModel):
 
 
 class HabitLogCreate(TunedModel):
-    completed: bool
\ No newline at end of file
+    completed: bool
+
+
+class HabitLogBatchItem(TunedModel):
+    habit_id: int
+    completed: bool = True
+
+
+class BatchRequest(TunedModel):
+    """
+    Пакет элементов; каждый элемент проверяется отдельно, ошибки возвращаются по индексу.
+    """
+    items: list[dict[str, Any]]
+
+
+class BatchItemError(TunedModel):
+    index: int
+    detail: Any
+
+
+class HabitBatchResponse(TunedModel):
+    created: list[HabitResponse]
+    errors: list[BatchItemError]
+
+
+class HabitLogBatchResponse(TunedModel):
+    created: list[HabitLogResponse]
+    errors: list[BatchItemError]
+
+
+class HabitStatsResponse(TunedModel):
+    habit_id: int
+    name: str
+    is_tracked: bool
+    current_streak: int = 0
+    total_completed: int = 0
+    longest_streak: int = 0
+    last_completed_date: Optional[date] = None
+    completion_rate_7: float = 0.0  # Доля дней с выполнением за последние 7 дней
+    completion_rate_30: float = 0.0
+    completion_rate_90: float = 0.0
+    weekday_counts: list[int]  # Выполнений по дням недели, начиная с понедельника
+
+
+class HabitCalendarResponse(TunedModel):
+    habit_id: int
+    first_date: date
+    days: list[Optional[bool]]  # С first_date: True — выполнено, False — не выполнено, None — нет записи
+    current_streak: int = 0
+    longest_streak: int = 0
+
+
+class ReminderSettings(TunedModel):
+    timezone: str = "UTC"
+    reminder_time: time
+
+    @field_validator("timezone")
+    @classmethod
+    def validate_timezone(cls, value: str) -> str:
+        try:
+            ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown timezone: {value}")
+        return value
+
+
+class BroadcastCreate(TunedModel):
+    text: str = Field(min_length=1, max_length=4096)  # Текст сообщения (HTML), лимит Telegram — 4096 символов
+
+
+class BroadcastResponse(TunedModel):
+    id: int
+    status: str  # pending, running, paused, finished
+    total: int  # Пользователей на момент создания
+    sent: int
+    failed: int
+    after_user_id: int  # Курсор: все пользователи до него обработаны
+    sending_seconds: float
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    @computed_field
+    @property
+    def messages_per_second(self) -> float:
+        """Скорость доставки без учета пауз."""
+        return round(self.sent / self.sending_seconds, 1) if self.sending_seconds else 0.0
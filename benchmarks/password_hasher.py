@@ -0,0 +1,72 @@
+"""
+Проверка и бенчмарк PasswordHasher: пересчет хеша при смене стоимости bcrypt и
+задержка event loop при параллельных проверках паролей. База данных не нужна:
+
+    python -m benchmarks.password_hasher
+"""
+import asyncio
+import time
+
+from api.passwords import PasswordHasher
+
+PASSWORD = "пароль-для-бенчмарка"
+OLD_ROUNDS = 10
+NEW_ROUNDS = 12
+LOGINS = 32
+
+
+def rounds_of(hashed: str) -> int:
+    """Стоимость из хеша bcrypt вида $2b$12$..."""
+    return int(hashed.split("$")[2])
+
+
+async def check_rehash() -> None:
+    """Хеш со стоимостью OLD_ROUNDS пересчитывается при входе, если настроена NEW_ROUNDS."""
+    old_hash = await PasswordHasher(rounds=OLD_ROUNDS).hash(PASSWORD)
+    hasher = PasswordHasher(rounds=NEW_ROUNDS)
+
+    verified, new_hash = await hasher.verify_and_update(PASSWORD, old_hash)
+    assert verified, "password with the old cost must verify"
+    assert new_hash is not None, f"{OLD_ROUNDS}-round hash was not rehashed with rounds={NEW_ROUNDS}"
+    assert rounds_of(new_hash) == NEW_ROUNDS, f"rehashed with cost {rounds_of(new_hash)}"
+
+    verified, newer_hash = await hasher.verify_and_update(PASSWORD, new_hash)
+    assert verified and newer_hash is None, "hash with the configured cost must not be rehashed again"
+
+    verified, _ = await hasher.verify_and_update("неверный пароль", new_hash)
+    assert not verified, "wrong password must not verify"
+    print(f"rehash: {OLD_ROUNDS} -> {NEW_ROUNDS} rounds on login, ok")
+
+
+async def measure_loop_lag() -> None:
+    """Параллельные входы: пропускная способность и максимальная задержка event loop."""
+    hasher = PasswordHasher(rounds=NEW_ROUNDS)
+    hashed = await hasher.hash(PASSWORD)
+    max_lag = 0.0
+    done = False
+
+    async def probe() -> None:
+        nonlocal max_lag
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            max_lag = max(max_lag, time.perf_counter() - started - 0.01)
+
+    probe_task = asyncio.create_task(probe())
+    started = time.perf_counter()
+    await asyncio.gather(*(hasher.verify(PASSWORD, hashed) for _ in range(LOGINS)))
+    elapsed = time.perf_counter() - started
+    done = True
+    await probe_task
+
+    print(f"{LOGINS} logins ({NEW_ROUNDS} rounds, {hasher.concurrency} concurrent): "
+          f"{LOGINS / elapsed:.1f} logins/s, max event loop lag {max_lag * 1000:.1f} ms")
+
+
+async def main() -> None:
+    await check_rehash()
+    await measure_loop_lag()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,5 +1,12 @@
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable, Coroutine, Optional
+
 from celery.app import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_shutdown, worker_shutdown
+from loguru import logger
 
 celery_app = Celery(
     "habit_reminder",
@@ -8,10 +15,87 @@ celery_app = Celery(
 )
 
 celery_app.conf.beat_schedule = {
-    "send-habit-reminders-everyday": {
-        "task": "tasks.send_habit_reminders",
-        "schedule": crontab("0", "20"),  # Выполнение каждый день в 20:00 UTC
+    "tick-habit-reminders-every-minute": {
+        "task": "tasks.tick_reminders",
+        "schedule": crontab(),  # Каждую минуту: напоминания по локальному времени пользователей
+    },
+    "rebuild-reminder-schedule-daily": {
+        "task": "tasks.rebuild_reminder_schedule",
+        "schedule": crontab("5", "0"),  # Каждый день в 00:05 UTC
     },
 }
 celery_app.conf.timezone = 'UTC'
 celery_app.conf.worker_pool = "threads"
+
+
+class AsyncRuntime:
+    """
+    Постоянный event loop процесса воркера Celery, работающий в отдельном потоке.
+
+    Задачи Celery синхронные: корутина передается в общий loop и задача ждет ее
+    результата. Все задачи процесса (пул потоков) выполняются в одном loop, поэтому
+    пул соединений БД, клиенты Redis и HTTP-сессия бота создаются один раз и
+    используются совместно, а отправки разных задач идут параллельно.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._shutdown_hooks: list[Callable[[], Awaitable[Any]]] = []
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # После fork (prefork-пул) поток родителя в дочернем процессе не существует
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="celery-asyncio", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        Выполняет корутину в loop процесса и возвращает ее результат (блокирует вызывающий поток).
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()).result(timeout)
+
+    def on_shutdown(self, hook: Callable[[], Awaitable[Any]]) -> None:
+        """
+        Регистрирует корутинную функцию, которая вызывается в loop при остановке воркера
+        (закрытие сессии бота, пула соединений и т.п.).
+        """
+        self._shutdown_hooks.append(hook)
+
+    def stop(self, timeout: float = 30) -> None:
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None or self._pid != os.getpid():
+                return
+            self._loop = self._thread = None
+
+        async def shutdown():
+            for hook in self._shutdown_hooks:
+                try:
+                    await hook()
+                except Exception as e:
+                    logger.warning(f"Async runtime shutdown hook failed: {e}")
+
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        loop.close()
+
+
+runtime = AsyncRuntime()
+
+
+def run_async(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    return runtime.run(coro, timeout)
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def stop_runtime(**_) -> None:
+    runtime.stop()
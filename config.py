@@ -1,5 +1,6 @@
 
 import os
+from typing import Optional
 
 from pydantic.v1 import BaseSettings
 
@@ -12,6 +13,88 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     URL: str
     REFRESH_TOKEN_EXPIRE_DAYS: int
+    REDIS_URL: str = "redis://localhost:6379/0"
+
+    # Проверка токенов в API
+    TOKEN_CACHE_SIZE: int = 10_000  # Сколько проверенных токенов держать в памяти воркера
+    TOKEN_CACHE_TTL: int = 300  # Максимальное время жизни записи кэша в секундах
+    REVOCATION_BLOOM_BITS: int = 1 << 23  # Размер фильтра Блума отозванных токенов (1 МБ)
+    REVOCATION_BLOOM_HASHES: int = 7
+
+    # Хеширование паролей
+    BCRYPT_ROUNDS: int = 12  # Стоимость bcrypt; при изменении хеши обновляются при входе
+    PASSWORD_HASH_WORKERS: int = 4  # Потоков для bcrypt
+    PASSWORD_HASH_CONCURRENCY: int = 4  # Одновременных операций, остальные ждут в очереди
+
+    # Пакетные запросы API
+    BATCH_MAX_ITEMS: int = 100  # Максимум элементов в /habits:batch и /habits/logs:batch
+
+    # Кэш списков привычек
+    HABIT_CACHE_TTL: int = 60 * 60  # Время жизни списка в Redis, секунд
+    HABIT_CACHE_L1_TTL: float = 0  # Время жизни в памяти процесса, секунд (0 — без L1)
+
+    # Пул соединений с БД
+    DB_ECHO: bool = False  # Логировать SQL-запросы
+    DB_POOL_SIZE: int = 10  # Постоянных соединений в пуле
+    DB_MAX_OVERFLOW: int = 20  # Дополнительных соединений сверх pool_size
+    DB_POOL_TIMEOUT: float = 30.0  # Сколько секунд ждать свободное соединение
+    DB_POOL_RECYCLE: int = 1800  # Пересоздавать соединения старше N секунд
+    DB_POOL_PRE_PING: bool = True  # Проверять соединение перед выдачей из пула
+    DB_STATEMENT_CACHE_SIZE: Optional[int] = None  # Размер кэша подготовленных запросов asyncpg
+
+    # Бэкенд бота: http — через API, direct — напрямую к БД (бот запущен рядом с БД)
+    BOT_BACKEND: str = "http"
+
+    # HTTP-клиент бота к API
+    TOKEN_STORE: str = "memory"  # Где хранить токены пользователей: memory или redis
+    TOKEN_REFRESH_MARGIN: int = 60  # За сколько секунд до истечения обновлять access token
+    API_POOL_LIMIT: int = 100  # Максимум соединений к API
+    API_POOL_LIMIT_PER_HOST: int = 50  # Максимум соединений к одному хосту
+    API_KEEPALIVE_TIMEOUT: float = 30.0  # Сколько секунд держать простаивающее соединение
+    API_REQUEST_TIMEOUT: float = 10.0  # Таймаут запроса к API в секундах
+
+    # Хранилище FSM и служебных сообщений бота: memory или redis (общее для нескольких воркеров)
+    BOT_STORAGE: str = "memory"
+    BOT_STORAGE_TTL: int = 24 * 60 * 60  # Сколько секунд хранить состояние неактивного пользователя
+
+    # Исходящие запросы к Telegram: общий лимит для бота и рассылок (memory или redis — общий для процессов)
+    OUTBOUND_LIMITER: str = "redis"
+    OUTBOUND_RATE: float = 30.0  # Сообщений в секунду на весь бот
+    OUTBOUND_BURST: float = 30.0  # Максимальный всплеск (емкость token bucket)
+    OUTBOUND_RESERVE: float = 0.3  # Доля емкости, недоступная рассылкам (резерв для ответов пользователям)
+
+    # Режим работы бота: polling, webhook (прием обновлений) или worker (обработка обновлений)
+    BOT_MODE: str = "polling"
+    TELEGRAM_API_SERVER: Optional[str] = None  # Свой сервер Bot API (локальный или заглушка), например http://localhost:8081
+    WEBHOOK_URL: Optional[str] = None  # Внешний адрес бота, например https://bot.example.com
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_SECRET: Optional[str] = None  # Проверяется в заголовке X-Telegram-Bot-Api-Secret-Token
+    UPDATE_QUEUE: str = "redis"  # Очередь обновлений: redis (Streams) или memory (в одном процессе)
+    UPDATE_PARTITIONS: int = 64  # Число партиций очереди (не меняется без сброса очереди)
+    UPDATE_WORKERS: int = 1  # Число воркеров, между которыми делятся партиции
+    UPDATE_WORKER_ID: int = 0  # Номер этого воркера, от 0 до UPDATE_WORKERS - 1
+
+    # Рассылка напоминаний
+    REMINDER_PAGE_SIZE: int = 500  # Сколько сработавших напоминаний обрабатывать за раз
+    REMINDER_CLAIM_TIMEOUT: int = 5 * 60  # Через сколько секунд необработанное напоминание сработает снова
+    REMINDER_CONCURRENCY: int = 20  # Максимум одновременных запросов к Telegram
+    REMINDER_RATE_LIMIT: float = 30.0  # Общий лимит сообщений в секунду
+    REMINDER_CHAT_RATE_LIMIT: float = 1.0  # Лимит сообщений в секунду для одного чата
+    REMINDER_MAX_RETRIES: int = 3  # Сколько раз переотправлять сообщение после 429
+    REMINDER_LEDGER_DAYS: int = 7  # Сколько дней хранить журнал доставленных напоминаний
+    REMINDER_DORMANT_DAYS: int = 30  # Не напоминать тем, кто не обращался к боту дольше этого срока
+    REMINDER_BACKOFF_BASE: int = 60 * 60  # Пауза после ошибки доставки, секунд (удваивается с каждой ошибкой)
+    REMINDER_BACKOFF_MAX: int = 7 * 24 * 60 * 60  # Максимальная пауза после ошибок доставки, секунд
+    ACTIVITY_FLUSH_INTERVAL: float = 60.0  # Как часто бот записывает активность пользователей в БД, секунд
+
+    # Рассылка объявлений всем пользователям
+    ADMIN_USER_IDS: list[int] = []  # Telegram ID администраторов (в .env — JSON-список, например [1, 2])
+    BROADCAST_PAGE_SIZE: int = 500  # Размер страницы получателей; на паузу рассылка встает после страницы
+    BROADCAST_CONCURRENCY: int = 20  # Максимум одновременных запросов к Telegram
+    BROADCAST_RATE_LIMIT: float = 25.0  # Лимит сообщений рассылки в секунду (общий лимит бота — OUTBOUND_RATE)
+    BROADCAST_STALE_AFTER: int = 10 * 60  # Через сколько секунд без чекпоинтов рассылку может подхватить другой воркер
 
     class Config:
         env_file = os.path.join(os.path.dirname(__file__), '.env')
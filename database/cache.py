@@ -0,0 +1,154 @@
+"""
+Кэш списков привычек пользователя (read-through).
+
+Ключи версионируются: у каждого пользователя есть счетчик `habits:ver:<user_id>`,
+который увеличивается при любой записи (создание, изменение, удаление привычки,
+отметка выполнения). Кэшированные списки лежат под ключами с номером версии,
+поэтому после записи старые значения просто перестают читаться и истекают по TTL.
+Ключ списка неотмеченных привычек дополнительно содержит локальную дату
+пользователя, так что после его полуночи список строится заново, а значение
+за прошедший день истекает по общему TTL.
+
+Версия и значение читаются одним Lua-скриптом (один запрос к Redis). Опциональный
+кэш в памяти процесса (L1) хранит значения несколько секунд и сбрасывается
+локально при записи; записи из других процессов он видит с задержкой до своего TTL.
+"""
+import json
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Awaitable, Callable, Optional
+
+import aioredis
+from loguru import logger
+
+from config import config
+
+ALL_HABITS = "all"
+UNLOGGED_HABITS = "unlogged"
+
+# Возвращает {версия, значение}; значение — false, если в кэше его нет
+GET_VERSIONED_SCRIPT = """
+local version = redis.call('GET', KEYS[1]) or '0'
+return {version, redis.call('GET', ARGV[1] .. version .. ARGV[2])}
+"""
+
+
+class CacheMetrics:
+    """
+    Счетчики попаданий в кэш по видам списков.
+    """
+
+    def __init__(self):
+        self._counters: dict[str, dict[str, int]] = {}
+
+    def record(self, kind: str, outcome: str) -> None:
+        counters = self._counters.setdefault(kind, {"l1_hits": 0, "hits": 0, "misses": 0, "errors": 0})
+        counters[outcome] += 1
+
+    def snapshot(self) -> dict:
+        result = {}
+        for kind, counters in self._counters.items():
+            total = sum(counters.values())
+            hits = counters["l1_hits"] + counters["hits"]
+            result[kind] = {**counters, "hit_ratio": hits / total if total else 0.0}
+        return result
+
+
+class HabitListCache:
+    """
+    Кэш списков привычек по пользователю: Redis с версионированными ключами и опциональный L1.
+    """
+
+    ver_prefix = "habits:ver:"
+    prefix = "habits:list:"
+
+    def __init__(self, redis_url: str = "redis://localhost", ttl: int = 60 * 60, l1_ttl: float = 0,
+                 l1_size: int = 10_000):
+        self.redis = aioredis.from_url(redis_url, decode_responses=True)
+        self._get_versioned = self.redis.register_script(GET_VERSIONED_SCRIPT)
+        self.ttl = ttl
+        self.l1_ttl = l1_ttl
+        self.l1_size = l1_size
+        self._l1: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self.metrics = CacheMetrics()
+
+    @staticmethod
+    def _suffix(kind: str, user_id: int, day: Optional[date]) -> tuple[str, str]:
+        """Части ключа значения до и после номера версии."""
+        return f"{kind}:{user_id}:", f":{day.isoformat()}" if day else ""
+
+    def _l1_get(self, key: tuple) -> Optional[Any]:
+        entry = self._l1.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._l1[key]
+            return None
+        return value
+
+    def _l1_set(self, key: tuple, value: Any) -> None:
+        self._l1[key] = (time.monotonic() + self.l1_ttl, value)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_size:
+            self._l1.popitem(last=False)
+
+    async def get_or_load(self, kind: str, user_id: int, loader: Callable[[], Awaitable[list]],
+                          day: Optional[date] = None) -> list:
+        """
+        Возвращает список из кэша, а при промахе вызывает `loader` и кэширует результат.
+        Если Redis недоступен, данные читаются из БД.
+        """
+        l1_key = (kind, user_id, day)
+        if self.l1_ttl:
+            value = self._l1_get(l1_key)
+            if value is not None:
+                self.metrics.record(kind, "l1_hits")
+                return value
+
+        before, after = self._suffix(kind, user_id, day)
+        try:
+            version, cached = await self._get_versioned(
+                keys=[f"{self.ver_prefix}{user_id}"], args=[f"{self.prefix}{before}", after]
+            )
+        except aioredis.RedisError as e:
+            logger.warning(f"Habit cache unavailable: {e}")
+            self.metrics.record(kind, "errors")
+            return await loader()
+
+        if cached:
+            value = json.loads(cached)
+            self.metrics.record(kind, "hits")
+        else:
+            value = await loader()
+            self.metrics.record(kind, "misses")
+            try:
+                await self.redis.set(f"{self.prefix}{before}{version}{after}", json.dumps(value),
+                                     ex=self.ttl)
+            except aioredis.RedisError as e:
+                logger.warning(f"Habit cache unavailable: {e}")
+
+        if self.l1_ttl:
+            self._l1_set(l1_key, value)
+        return value
+
+    async def invalidate(self, user_id: int) -> None:
+        """
+        Делает недействительными все кэшированные списки пользователя (новая версия ключей).
+        """
+        for key in [key for key in self._l1 if key[1] == user_id]:
+            del self._l1[key]
+
+        try:
+            # Счетчик версии не истекает: после сброса в 0 могли бы снова читаться старые значения
+            await self.redis.incr(f"{self.ver_prefix}{user_id}")
+        except aioredis.RedisError as e:
+            logger.error(f"Failed to invalidate habit cache for user {user_id}: {e}")
+
+
+habit_list_cache = HabitListCache(
+    redis_url=config.REDIS_URL,
+    ttl=config.HABIT_CACHE_TTL,
+    l1_ttl=config.HABIT_CACHE_L1_TTL,
+)
@@ -3,13 +3,43 @@ from typing import AsyncGenerator
 
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker, AsyncEngine
 from database.models import Base
+from database.migrations import apply_migrations
+from database.pool_metrics import InstrumentedAsyncPool
 from config import config
 
 
-DATABASE_URL = config.URL
+DATABASE_URL = config.URL_DB
 
 
-engine = create_async_engine(DATABASE_URL, future=True, echo=True)
+def _connect_args() -> dict:
+    if config.DB_STATEMENT_CACHE_SIZE is None:
+        return {}
+    # statement_cache_size — кэш asyncpg, prepared_statement_cache_size — кэш диалекта SQLAlchemy
+    return {
+        "statement_cache_size": config.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": config.DB_STATEMENT_CACHE_SIZE,
+    }
+
+
+engine = create_async_engine(
+    DATABASE_URL,
+    future=True,
+    echo=config.DB_ECHO,
+    poolclass=InstrumentedAsyncPool,
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
+    pool_timeout=config.DB_POOL_TIMEOUT,
+    pool_recycle=config.DB_POOL_RECYCLE,
+    pool_pre_ping=config.DB_POOL_PRE_PING,
+    connect_args=_connect_args(),
+)
+
+
+def set_sql_echo(enabled: bool) -> None:
+    """
+    Включает или выключает логирование SQL-запросов без перезапуска приложения.
+    """
+    engine.sync_engine.echo = enabled
 
 
 async_session = async_sessionmaker(
@@ -45,6 +75,7 @@ async def init_db(engine: AsyncEngine):
         try:
             async with engine.begin() as conn:
                 await conn.run_sync(Base.metadata.create_all)
+                await apply_migrations(conn)
             print("База данных успешно инициализирована.")
             return
         except Exception as e:
@@ -1,32 +1,107 @@
-from datetime import date, datetime
+import hashlib
+import hmac
+from contextlib import asynccontextmanager
+from datetime import date, datetime, time, timedelta
 from typing import Optional, Sequence, List, Any, TypeVar, Generic
 
 from fastapi import HTTPException, status
-from sqlalchemy import select, Row, RowMapping
+from sqlalchemy import (select, update, insert, delete, inspect, func, and_, or_, case, cast, literal, literal_column,
+                        values, column, Boolean, Date, Integer, LargeBinary, Text, Row, RowMapping)
+from sqlalchemy.dialects.postgresql import BIT, aggregate_order_by, array, insert as pg_insert
 from sqlalchemy.exc import IntegrityError, NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
-from database.models import UserInDB, HabitInDB, HabitLogInDB, Base
-from api.pydantic_models import User, HabitLogCreate
+from database.models import (UserInDB, HabitInDB, HabitLogInDB, HabitStatsInDB, HabitHistoryInDB, ReminderDeliveryInDB,
+                             UserDeliveryHealthInDB, BroadcastInDB, BroadcastFailureInDB, Base,
+                             RECENT_DAYS)
+from api.pydantic_models import User, HabitCreate, HabitLogCreate, HabitResponse
 from api.auth import AuthService
+from api.passwords import password_hasher
+from database.cache import habit_list_cache, ALL_HABITS, UNLOGGED_HABITS
+from database.history import HabitHistory, pack_days
 
 ModelType = TypeVar("ModelType", bound=Base)
 
+# Битовые маски habit_stats.recent_mask: пустая и с отметкой только за mask_date
+EMPTY_MASK = literal_column(f"B'{'0' * RECENT_DAYS}'", BIT(RECENT_DAYS))
+NEWEST_DAY_MASK = literal_column(f"B'1{'0' * (RECENT_DAYS - 1)}'", BIT(RECENT_DAYS))
+WEEKDAYS = range(1, 8)  # ISO-номера дней недели: 1 — понедельник, 7 — воскресенье
+
+
+def _zero_bytes(count):
+    """bytea из `count` нулевых байт."""
+    return func.decode(func.repeat("00", count), "hex", type_=LargeBinary)
+
+
+def _with_bit(data, offset, value):
+    """bytea `data`, дополненный нулевыми байтами до бита `offset`, с битом `offset`, равным `value`."""
+    missing = func.greatest(offset // 8 + 1 - func.length(data), 0)
+    return func.set_bit(data.op("||")(_zero_bytes(missing)), offset, value, type_=LargeBinary)
+
 
 class BaseCRUD(Generic[ModelType]):
+    """
+    Базовые операции с моделью.
+
+    Операции над множеством строк (`create_many`, `update_where`, `delete_where`, `upsert`)
+    выполняются одним SQL-запросом с RETURNING, без SELECT и refresh на каждую строку.
+    По умолчанию каждая операция коммитится сама; внутри `unit_of_work()` изменения
+    только отправляются в БД (flush) и коммитятся одной транзакцией при выходе из блока.
+    """
+
     def __init__(self, model: type(ModelType), db_session: AsyncSession):
         self.model = model
         self.db_session = db_session
+        self.autocommit = True
+
+    @asynccontextmanager
+    async def unit_of_work(self):
+        """
+        Откладывает commit до конца блока; при исключении транзакция откатывается.
+        Например:
+            async with crud.unit_of_work():
+                await crud.create_many(rows)
+                await crud.update_where({"is_premium": True}, user_id=1)
+        """
+        previous, self.autocommit = self.autocommit, False
+        try:
+            yield self
+            await self.db_session.commit()
+        except Exception:
+            await self.db_session.rollback()
+            raise
+        finally:
+            self.autocommit = previous
+
+    async def _commit(self) -> None:
+        if self.autocommit:
+            await self.db_session.commit()
+        else:
+            await self.db_session.flush()
+
+    def _where(self, criteria: tuple, filters: dict) -> list:
+        clauses = list(criteria) + [getattr(self.model, key) == value for key, value in filters.items()]
+        if not clauses:
+            raise ValueError("Refusing to run a bulk operation without conditions")
+        return clauses
 
     async def create(self, **kwargs) -> ModelType:
-        """Создание новой записи"""
-        instance = self.model(**kwargs)
-        self.db_session.add(instance)
-        await self.db_session.commit()
-        await self.db_session.refresh(instance)
+        """Создание новой записи (INSERT ... RETURNING, без отдельного refresh)"""
+        instance = await self.db_session.scalar(insert(self.model).values(**kwargs).returning(self.model))
+        await self._commit()
         return instance
 
+    async def create_many(self, rows: Sequence[dict]) -> Sequence[ModelType]:
+        """
+        Создает несколько записей одним многострочным INSERT ... RETURNING.
+        """
+        if not rows:
+            return []
+        result = await self.db_session.scalars(insert(self.model).returning(self.model), list(rows))
+        instances = result.all()
+        await self._commit()
+        return instances
+
     async def get(self, **kwargs) -> Optional[ModelType]:
         """
         Получает одну запись по произвольным полям.
@@ -50,21 +125,37 @@ class BaseCRUD(Generic[ModelType]):
 
     async def update(self, **kwargs) -> Optional[ModelType]:
         """
-        Обновляет запись по произвольным полям.
+        Обновляет запись по первичному ключу: поля первичного ключа задают запись,
+        остальные — новые значения.
         Например:
             await crud.update(id=1, username="new_name")
-            await crud.update(email="old@example.com", is_active=False)
+        Для обновления по другим полям используйте `update_where`.
         """
-        instance = await self.get(**kwargs)
-        if not instance:
-            return None
+        pk_names = {key.name for key in inspect(self.model).primary_key}
+        filters = {key: value for key, value in kwargs.items() if key in pk_names}
+        values_ = {key: value for key, value in kwargs.items() if key not in pk_names}
+        if len(filters) != len(pk_names):
+            raise ValueError(f"update() requires the primary key {sorted(pk_names)}; use update_where() instead")
+        if not values_:
+            return await self.get(**filters)
 
-        for key, value in kwargs.items():
-            setattr(instance, key, value)
+        updated = await self.update_where(values_, **filters)
+        return updated[0] if updated else None
 
-        await self.db_session.commit()
-        await self.db_session.refresh(instance)
-        return instance
+    async def update_where(self, values: dict, *criteria, **filters) -> Sequence[ModelType]:
+        """
+        Обновляет все записи, подходящие под условия, одним UPDATE ... RETURNING.
+        Например:
+            await crud.update_where({"is_premium": True}, UserInDB.user_id.in_(ids))
+            await crud.update_where({"language": "en"}, username="john")
+        """
+        result = await self.db_session.scalars(
+            update(self.model).where(*self._where(criteria, filters)).values(**values).returning(self.model),
+            execution_options={"synchronize_session": "fetch"}
+        )
+        instances = result.all()
+        await self._commit()
+        return instances
 
     async def delete(self, **kwargs) -> bool:
         """
@@ -73,47 +164,201 @@ class BaseCRUD(Generic[ModelType]):
             await crud.delete(id=1)
             await crud.delete(username="john")
         """
-        instance = await self.get(**kwargs)
-        if not instance:
-            return False
+        return await self.delete_where(**kwargs) > 0
 
-        await self.db_session.delete(instance)
-        await self.db_session.commit()
-        return True
+    async def delete_where(self, *criteria, **filters) -> int:
+        """
+        Удаляет все записи, подходящие под условия, одним DELETE. Возвращает число удаленных строк.
+        """
+        result = await self.db_session.execute(
+            delete(self.model).where(*self._where(criteria, filters)),
+            execution_options={"synchronize_session": "fetch"}
+        )
+        await self._commit()
+        return result.rowcount
+
+    async def upsert(self, rows: dict | Sequence[dict], index_elements: Optional[Sequence[str]] = None,
+                     update_fields: Optional[Sequence[str]] = None) -> Sequence[ModelType]:
+        """
+        Вставляет записи, а при конфликте по `index_elements` (по умолчанию — первичный ключ)
+        обновляет поля `update_fields` (по умолчанию — все переданные, кроме ключа).
+        Если обновлять нечего, конфликтующие записи пропускаются (ON CONFLICT DO NOTHING).
+        Возвращает вставленные и обновленные записи.
+        """
+        rows = [rows] if isinstance(rows, dict) else list(rows)
+        if not rows:
+            return []
+
+        if index_elements is None:
+            index_elements = [key.name for key in inspect(self.model).primary_key]
+        if update_fields is None:
+            update_fields = [key for key in rows[0] if key not in index_elements]
+
+        statement = pg_insert(self.model).values(rows)
+        if update_fields:
+            statement = statement.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={field: statement.excluded[field] for field in update_fields}
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=index_elements)
+
+        result = await self.db_session.scalars(
+            statement.returning(self.model), execution_options={"populate_existing": True}
+        )
+        instances = result.all()
+        await self._commit()
+        return instances
 
 
 class UserCRUD(BaseCRUD[UserInDB]):
     def __init__(self, db: AsyncSession):
         super().__init__(model=UserInDB, db_session=db)
 
+    async def authenticate_user(self, username: str, password: str) -> Optional[UserInDB]:
+        """
+        Проверяет пароль пользователя в пуле потоков bcrypt.
+
+        Если хеш создан с другой стоимостью (BCRYPT_ROUNDS изменился), он пересчитывается
+        и сохраняется. У пользователей без хеша паролем служит chat_id (так входит бот);
+        хеш для них создается при первом успешном входе.
+        """
+        result = await self.db_session.execute(
+            select(UserInDB).where(UserInDB.username == username).order_by(UserInDB.user_id)
+        )
+        for user in result.scalars():
+            if user.hashed_password is None:
+                if not hmac.compare_digest(password.encode(), str(user.chat_id).encode()):
+                    continue
+                new_hash = await password_hasher.hash(password)
+            else:
+                verified, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+                if not verified:
+                    continue
+
+            if new_hash is not None:
+                user.hashed_password = new_hash
+                await self.db_session.commit()
+            return user
+        return None
+
 
 class HabitCRUD:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def get_unlogged_tracked_habits(self, user_id: int) -> list[HabitInDB]:
+    @staticmethod
+    def _serialize(habits: Sequence[HabitInDB]) -> list[dict]:
+        return [HabitResponse.model_validate(habit).model_dump(mode="json") for habit in habits]
+
+    async def list_habits(self, user_id: int) -> list[dict]:
+        """
+        Привычки пользователя в виде HabitResponse-словарей, через кэш списков.
+        """
+        async def load() -> list[dict]:
+            return self._serialize(await self.get_habits_by_user(user_id))
+
+        return await habit_list_cache.get_or_load(ALL_HABITS, user_id, load)
+
+    async def list_unlogged_habits(self, user_id: int, log_date: Optional[date] = None) -> list[dict]:
+        """
+        Отслеживаемые привычки без отметки за `log_date` (локальная дата пользователя,
+        по умолчанию — дата UTC) в виде HabitResponse-словарей, через кэш списков.
+        Ключ кэша содержит дату, поэтому после полуночи список строится заново.
         """
-        Возвращает список отслеживаемых привычек, которые не были отмечены сегодня.
+        log_date = log_date or datetime.utcnow().date()
+
+        async def load() -> list[dict]:
+            return self._serialize(await self.get_unlogged_tracked_habits(user_id, log_date))
+
+        return await habit_list_cache.get_or_load(UNLOGGED_HABITS, user_id, load, day=log_date)
+
+    async def get_habits_etag(self, user_id: int, log_date: Optional[date] = None) -> str:
+        """
+        Строгий ETag списка привычек пользователя: по числу привычек и максимальному `updated_at`.
+
+        Любое изменение привычки (в том числе отметка выполнения) обновляет `updated_at`,
+        удаление меняет количество. Для списка неотмеченных привычек передается `log_date`,
+        чтобы ETag менялся при смене дня.
+        """
+        count, last_updated = (await self.db.execute(
+            select(func.count(HabitInDB.id), func.max(HabitInDB.updated_at)).where(HabitInDB.user_id == user_id)
+        )).one()
+        validator = f"{user_id}:{count}:{last_updated.isoformat() if last_updated else ''}:{log_date or ''}"
+        return f'"{hashlib.sha256(validator.encode()).hexdigest()[:32]}"'
+
+    async def get_unlogged_tracked_habits(self, user_id: int, log_date: Optional[date] = None) -> Sequence[HabitInDB]:
         """
-        today = datetime.utcnow().date()
+        Возвращает список отслеживаемых привычек, которые не были отмечены за `log_date`
+        (локальная дата пользователя, по умолчанию — дата UTC).
 
-        statement = select(HabitInDB).filter(
+        Фильтр выполняется в БД (NOT EXISTS по индексу habit_logs(habit_id, log_date)),
+        поэтому стоимость запроса не зависит от длины истории отметок.
+        """
+        today = log_date or datetime.utcnow().date()
+
+        logged_today = select(HabitLogInDB.id).where(
+            HabitLogInDB.habit_id == HabitInDB.id,
+            HabitLogInDB.log_date == today
+        ).exists()
+
+        statement = select(HabitInDB).where(
             HabitInDB.user_id == user_id,
-            HabitInDB.is_tracked == True
-        ).options(selectinload(HabitInDB.logs))
+            HabitInDB.is_tracked == True,
+            ~logged_today
+        ).order_by(HabitInDB.id)
 
         result = await self.db.execute(statement)
-        habits = result.scalars().all()
+        return result.scalars().all()
 
-        unlogged_habits = []
+    @staticmethod
+    def _unlogged_digest_statement(log_date: date, dormant_days: Optional[int] = None):
+        """
+        Запрос отслеживаемых привычек без отметки за `log_date`, сгруппированных по пользователю.
+        Каждая строка содержит `user_id`, `habit_ids` и `habit_names` (массивы в одном порядке).
 
-        for habit in habits:
+        Пользователи, которым рассылка сейчас не доставляется (бот заблокирован, пауза
+        после ошибок или нет активности дольше `dormant_days` дней), исключаются.
+        """
+        logged_today = select(HabitLogInDB.id).where(
+            HabitLogInDB.habit_id == HabitInDB.id,
+            HabitLogInDB.log_date == log_date
+        ).exists()
 
-            today_log = next((log for log in habit.logs if log.log_date == today), None)
-            if not today_log:
-                unlogged_habits.append(habit)
+        health = UserDeliveryHealthInDB
+        suppressed = [health.blocked, health.paused_until > func.now()]
+        if dormant_days is not None:
+            suppressed.append(health.last_interaction_at < func.now() - timedelta(days=dormant_days))
+        undeliverable = select(health.user_id).where(
+            health.user_id == HabitInDB.user_id,
+            or_(*suppressed)
+        ).exists()
 
-        return unlogged_habits
+        return select(
+            HabitInDB.user_id,
+            func.array_agg(aggregate_order_by(HabitInDB.id, HabitInDB.id)).label("habit_ids"),
+            func.array_agg(aggregate_order_by(HabitInDB.name, HabitInDB.id)).label("habit_names"),
+        ).where(
+            HabitInDB.is_tracked == True,
+            ~logged_today,
+            ~undeliverable
+        ).group_by(HabitInDB.user_id)
+
+    async def get_unlogged_digests(self, log_date: date, user_ids: Sequence[int], habit_ids: Sequence[int],
+                                   dormant_days: Optional[int] = None) -> Sequence[Row]:
+        """
+        Возвращает неотмеченные привычки для сработавших напоминаний, сгруппированные по пользователю:
+        привычки пользователей из `user_ids` без собственного времени напоминания
+        и привычки из `habit_ids`.
+        """
+        statement = self._unlogged_digest_statement(log_date, dormant_days).where(
+            or_(
+                and_(HabitInDB.user_id.in_(user_ids), HabitInDB.reminder_time.is_(None)),
+                HabitInDB.id.in_(habit_ids)
+            )
+        )
+        result = await self.db.execute(statement)
+        return result.all()
 
     async def create_habit(
             self,
@@ -126,7 +371,8 @@ class HabitCRUD:
             last_streak_start: Optional[date],
             current_streak: int,
             total_completed: int,
-            is_tracked: Optional[bool]
+            is_tracked: Optional[bool],
+            reminder_time: Optional[time] = None
     ) -> HabitInDB:
         new_habit = HabitInDB(
             user_id=user_id,
@@ -138,13 +384,43 @@ class HabitCRUD:
             last_streak_start=last_streak_start,
             current_streak=current_streak,
             total_completed=total_completed,
-            is_tracked=is_tracked
+            is_tracked=is_tracked,
+            reminder_time=reminder_time
         )
         self.db.add(new_habit)
         await self.db.commit()
         await self.db.refresh(new_habit)
+        await habit_list_cache.invalidate(user_id)
         return new_habit
 
+    async def create_habits(self, user_id: int, habits: Sequence[HabitCreate]) -> Sequence[HabitInDB]:
+        """
+        Создает несколько привычек пользователя одним многострочным INSERT ... RETURNING
+        в одной транзакции.
+        """
+        if not habits:
+            return []
+
+        rows = [
+            {**habit.model_dump(), "user_id": user_id,
+             "is_tracked": habit.is_tracked if habit.is_tracked is not None else True}
+            for habit in habits
+        ]
+        result = await self.db.scalars(insert(HabitInDB).returning(HabitInDB), rows)
+        new_habits = result.all()
+        await self.db.commit()
+        await habit_list_cache.invalidate(user_id)
+        return new_habits
+
+    async def get_owned_habit_ids(self, user_id: int, habit_ids: Sequence[int]) -> set[int]:
+        """
+        Возвращает те из `habit_ids`, которые принадлежат пользователю.
+        """
+        result = await self.db.scalars(
+            select(HabitInDB.id).where(HabitInDB.id.in_(habit_ids), HabitInDB.user_id == user_id)
+        )
+        return set(result.all())
+
     async def get_habit(self, habit_id: int) -> Optional[HabitInDB]:
         query = select(HabitInDB).filter(HabitInDB.id == habit_id)
         result = await self.db.execute(query)
@@ -157,7 +433,13 @@ class HabitCRUD:
 
     async def update_habit(self, habit_id: int, name: Optional[str] = None, target_days: Optional[int] = None,
                            streak_days: Optional[int] = None, start_date: Optional[str] = None,
-                           description: Optional[str] = None, is_tracked: Optional[bool] = None) -> Optional[HabitInDB]:
+                           description: Optional[str] = None, is_tracked: Optional[bool] = None,
+                           reminder_time: Optional[time] = None,
+                           clear_reminder_time: bool = False) -> Optional[HabitInDB]:
+        """
+        Обновляет переданные (не None) поля привычки. `clear_reminder_time` снимает
+        собственное время напоминания: привычка снова входит в общее напоминание пользователя.
+        """
         habit = await self.get_habit(habit_id)
         if habit is None:
             raise NoResultFound(f"Habit with id {habit_id} not found.")
@@ -168,16 +450,26 @@ class HabitCRUD:
             habit.target_days = target_days
         if streak_days is not None:
             habit.streak_days = streak_days
+        rebuild_history = start_date is not None and start_date != habit.start_date
         if start_date is not None:
             habit.start_date = start_date
         if description is not None:
             habit.description = description
         if is_tracked is not None:
             habit.is_tracked = is_tracked
+        if reminder_time is not None:
+            habit.reminder_time = reminder_time
+        elif clear_reminder_time:
+            habit.reminder_time = None
 
         self.db.add(habit)
+        if rebuild_history:
+            # Бит 0 битовой карты соответствует дате начала привычки
+            await self.db.flush()
+            await HabitHistoryCRUD(self.db).rebuild(habit_id, habit_id, commit=False)
         await self.db.commit()
         await self.db.refresh(habit)
+        await habit_list_cache.invalidate(habit.user_id)
         return habit
 
     async def delete_habit(self, habit_id: int) -> None:
@@ -187,28 +479,247 @@ class HabitCRUD:
 
         await self.db.delete(habit)
         await self.db.commit()
+        await habit_list_cache.invalidate(habit.user_id)
 
 
 class HabitLogCRUD:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def create_habit_log(self, habit_id: int, log_date: date, log_data: HabitLogCreate):
-
-        new_log = HabitLogInDB(
+    async def create_habit_log(self, habit_id: int, log_date: date,
+                               log_data: HabitLogCreate) -> Optional[HabitLogInDB]:
+        """
+        Создает запись о выполнении привычки за `log_date` одним запросом.
+        Если запись за этот день уже есть, возвращает None.
+        """
+        statement = pg_insert(HabitLogInDB).values(
             habit_id=habit_id,
             log_date=log_date,
             completed=log_data.completed
-        )
+        ).on_conflict_do_nothing(
+            index_elements=[HabitLogInDB.habit_id, HabitLogInDB.log_date]
+        ).returning(HabitLogInDB)
 
-        self.db.add(new_log)
+        result = await self.db.execute(statement)
+        new_log = result.scalars().first()
+
+        user_id = None
+        if new_log is not None:
+            # Список неотмеченных привычек изменился: обновляем updated_at привычки (ETag)
+            user_id = await self.db.scalar(
+                update(HabitInDB).where(HabitInDB.id == habit_id).values(updated_at=func.now())
+                .returning(HabitInDB.user_id)
+            )
+            logs = HabitLogInDB.__table__
+            log = select(logs).where(logs.c.id == new_log.id).subquery("log")
+            await self.db.execute(self._stats_upsert(log))
+            await self.db.execute(self._history_upsert(log))
 
         # Коммитим изменения
         await self.db.commit()
-
-        await self.db.refresh(new_log)
+        if user_id is not None:
+            await habit_list_cache.invalidate(user_id)
         return new_log
 
+    @staticmethod
+    def _stats_upsert(log):
+        """
+        Учитывает в habit_stats записи о выполнении из `log` (habit_id, log_date, completed).
+
+        Вставляется статистика одной записи; если строка статистики уже есть, она
+        объединяется с накопленной (ON CONFLICT DO UPDATE): счетчики складываются,
+        маски выравниваются по более поздней дате и объединяются, серия продолжается,
+        если предыдущее выполнение было накануне. Записи должны приходить по порядку
+        дат (отметки делаются за текущий день); после правки истории статистику
+        нужно пересчитать (`HabitStatsCRUD.rebuild`).
+        """
+        stats = HabitStatsInDB.__table__
+
+        def completed(*criteria):
+            return case((and_(log.c.completed, *criteria), 1), else_=0)
+
+        fresh = pg_insert(stats).from_select(
+            ["habit_id", "current_run", "longest_streak", "last_completed_date", "completed_days",
+             "logged_days", "mask_date", "recent_mask", "weekday_counts"],
+            select(
+                log.c.habit_id,
+                completed(),
+                completed(),
+                case((log.c.completed, log.c.log_date)),
+                completed(),
+                literal_column("1", Integer),
+                log.c.log_date,
+                case((log.c.completed, NEWEST_DAY_MASK), else_=EMPTY_MASK),
+                array([completed(func.extract("isodow", log.c.log_date) == day) for day in WEEKDAYS]),
+            ).select_from(log)
+        )
+
+        new = fresh.excluded
+        current_run = case(
+            (new.last_completed_date.is_(None), 0),
+            (stats.c.last_completed_date == new.mask_date - literal_column("1", Integer), stats.c.current_run + 1),
+            else_=1
+        )
+        mask_date = func.greatest(stats.c.mask_date, new.mask_date, type_=Date)
+
+        return fresh.on_conflict_do_update(
+            index_elements=[stats.c.habit_id],
+            set_={
+                "current_run": current_run,
+                "longest_streak": func.greatest(stats.c.longest_streak, current_run),
+                "last_completed_date": func.greatest(stats.c.last_completed_date, new.last_completed_date),
+                "completed_days": stats.c.completed_days + new.completed_days,
+                "logged_days": stats.c.logged_days + new.logged_days,
+                "mask_date": mask_date,
+                "recent_mask": stats.c.recent_mask.op(">>")(mask_date - stats.c.mask_date).op("|")(
+                    new.recent_mask.op(">>")(mask_date - new.mask_date)
+                ),
+                "weekday_counts": array([stats.c.weekday_counts[day] + new.weekday_counts[day] for day in WEEKDAYS]),
+                "updated_at": func.now(),
+            }
+        )
+
+    @staticmethod
+    def _history_upsert(log):
+        """
+        Устанавливает в битовых картах habit_history биты дней записей из `log`
+        (habit_id, log_date, completed). Записи до даты начала привычки не учитываются.
+
+        Вставляемая строка содержит только бит новой записи; если строка истории уже
+        есть, бит переносится в нее (карты при необходимости дополняются нулевыми байтами).
+        """
+        history = HabitHistoryInDB.__table__
+        habits = HabitInDB.__table__
+
+        offset = log.c.log_date - habits.c.start_date
+        empty = _zero_bytes(offset // 8 + 1)
+        fresh = pg_insert(history).from_select(
+            ["habit_id", "base_date", "last_log_date", "completed", "logged"],
+            select(
+                log.c.habit_id,
+                habits.c.start_date,
+                log.c.log_date,
+                func.set_bit(empty, offset, case((log.c.completed, 1), else_=0), type_=LargeBinary),
+                func.set_bit(empty, offset, 1, type_=LargeBinary),
+            ).join_from(log, habits, habits.c.id == log.c.habit_id).where(log.c.log_date >= habits.c.start_date)
+        )
+
+        new = fresh.excluded
+        offset = new.last_log_date - history.c.base_date
+        return fresh.on_conflict_do_update(
+            index_elements=[history.c.habit_id],
+            set_={
+                "last_log_date": func.greatest(history.c.last_log_date, new.last_log_date, type_=Date),
+                "completed": _with_bit(
+                    history.c.completed, offset, func.get_bit(new.completed, new.last_log_date - new.base_date)
+                ),
+                "logged": _with_bit(history.c.logged, offset, 1),
+                "updated_at": func.now(),
+            },
+            # Дата начала изменилась, а история еще не пересчитана (см. HabitCRUD.update_habit)
+            where=offset >= 0
+        )
+
+    @staticmethod
+    def _check_in_statement(source):
+        """
+        Запрос отметки выполнения с обновлением серии и статистики (CTE) для строк `source`
+        (habit_id, log_date, completed).
+        """
+        habits = HabitInDB.__table__
+        logs = HabitLogInDB.__table__
+
+        inserted = pg_insert(logs).from_select(
+            ["habit_id", "log_date", "completed"], source
+        ).on_conflict_do_nothing(
+            index_elements=[logs.c.habit_id, logs.c.log_date]
+        ).returning(
+            logs.c.id, logs.c.habit_id, logs.c.log_date, logs.c.completed, logs.c.created_at
+        ).cte("inserted")
+
+        updated = update(habits).where(habits.c.id == inserted.c.habit_id).values(
+            current_streak=case((inserted.c.completed, func.coalesce(habits.c.current_streak, 0) + 1), else_=0),
+            total_completed=func.coalesce(habits.c.total_completed, 0) + case((inserted.c.completed, 1), else_=0),
+            updated_at=func.now()
+        ).returning(
+            habits.c.id, habits.c.user_id, habits.c.current_streak, habits.c.total_completed
+        ).cte("updated")
+
+        # Результаты не нужны в выборке, но CTE должны попасть в запрос и выполниться
+        stats = HabitLogCRUD._stats_upsert(inserted).returning(HabitStatsInDB.__table__.c.habit_id).cte("stats")
+        history = HabitLogCRUD._history_upsert(inserted).returning(
+            HabitHistoryInDB.__table__.c.habit_id
+        ).cte("history")
+
+        return select(
+            inserted, updated.c.user_id, updated.c.current_streak, updated.c.total_completed
+        ).join_from(inserted, updated, updated.c.id == inserted.c.habit_id).add_cte(stats, history)
+
+    async def check_in(self, habit_id: int, log_date: Optional[date], completed: bool,
+                       user_id: Optional[int] = None) -> Optional[Row]:
+        """
+        Отмечает выполнение привычки за `log_date` и обновляет серию одним запросом (CTE).
+
+        Если `log_date` не задана, берется текущая дата в часовом поясе владельца
+        привычки (`users.timezone`), вычисленная в том же запросе. Если задан `user_id`,
+        отмечаются только привычки этого пользователя.
+
+        Запись создается через INSERT ... ON CONFLICT DO NOTHING, а `current_streak` и
+        `total_completed` обновляются только если запись действительно вставлена, поэтому
+        повторное нажатие не меняет счетчики. Возвращает строку с полями записи о выполнении,
+        `user_id`, `current_streak` и `total_completed` или None, если привычки нет
+        (или она чужая) или запись за этот день уже существует.
+        """
+        habits = HabitInDB.__table__
+        users = UserInDB.__table__
+        if log_date is None:
+            day = cast(func.timezone(users.c.timezone, func.now()), Date)
+        else:
+            day = literal(log_date, Date)
+
+        source = select(habits.c.id, day, literal(completed, Boolean)).join_from(
+            habits, users, users.c.user_id == habits.c.user_id
+        ).where(habits.c.id == habit_id)
+        if user_id is not None:
+            source = source.where(habits.c.user_id == user_id)
+
+        result = await self.db.execute(self._check_in_statement(source))
+        row = result.first()
+        await self.db.commit()
+        if row is not None:
+            await habit_list_cache.invalidate(row.user_id)
+        return row
+
+    async def check_in_many(self, user_id: int, log_date: date,
+                            items: Sequence[tuple[int, bool]]) -> Sequence[Row]:
+        """
+        Отмечает выполнение нескольких привычек пользователя за `log_date` одним запросом
+        в одной транзакции. `items` — пары (habit_id, completed) с уникальными habit_id.
+
+        Чужие и несуществующие привычки, а также уже отмеченные за этот день пропускаются;
+        возвращаются строки (как у `check_in`) только для созданных записей.
+        """
+        if not items:
+            return []
+
+        habits = HabitInDB.__table__
+        requested = values(
+            column("habit_id", Integer), column("completed", Boolean), name="requested"
+        ).data(list(items))
+
+        statement = self._check_in_statement(
+            select(habits.c.id, literal(log_date, Date), requested.c.completed)
+            .join_from(habits, requested, requested.c.habit_id == habits.c.id)
+            .where(habits.c.user_id == user_id)
+        )
+
+        result = await self.db.execute(statement)
+        rows = result.all()
+        await self.db.commit()
+        if rows:
+            await habit_list_cache.invalidate(user_id)
+        return rows
+
     async def get_habit_logs_by_date(self, habit_id: int, log_date: date) -> Sequence[HabitLogInDB]:
         result = await self.db.execute(
             select(HabitLogInDB).where(
@@ -224,5 +735,542 @@ class HabitLogCRUD:
         log = result.scalars().first()
         if log is None:
             raise NoResultFound(f"Habit log with id {log_id} not found.")
+        user_id = await self.db.scalar(
+            update(HabitInDB).where(HabitInDB.id == log.habit_id).values(updated_at=func.now())
+            .returning(HabitInDB.user_id)
+        )
         await self.db.delete(log)
+        await self.db.flush()
+        # Удаление меняет историю, поэтому статистика привычки пересчитывается целиком
+        await self.db.execute(HabitStatsCRUD.rebuild_statement(log.habit_id, log.habit_id))
+        await HabitHistoryCRUD(self.db).rebuild(log.habit_id, log.habit_id, commit=False)
+        await self.db.commit()
+        await habit_list_cache.invalidate(user_id)
+
+
+class HabitStatsCRUD:
+    """
+    Статистика привычек из habit_stats: чтение не зависит от длины истории,
+    пересчет из habit_logs — одним запросом на диапазон привычек.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @staticmethod
+    def rebuild_statement(first_id: int, last_id: int):
+        """
+        INSERT ... ON CONFLICT DO UPDATE, пересчитывающий статистику привычек с id
+        от `first_id` до `last_id` включительно по всем их записям о выполнении.
+        Серии считаются методом «островов»: у подряд идущих дат выполнения
+        разность даты и номера строки одинакова.
+        """
+        habits = HabitInDB.__table__
+        logs = HabitLogInDB.__table__
+        stats = HabitStatsInDB.__table__
+        in_range = logs.c.habit_id.between(first_id, last_id)
+
+        numbered = select(
+            logs.c.habit_id,
+            logs.c.log_date,
+            (logs.c.log_date - cast(
+                func.row_number().over(partition_by=logs.c.habit_id, order_by=logs.c.log_date), Integer
+            )).label("island")
+        ).where(in_range, logs.c.completed).cte("numbered")
+
+        runs = select(
+            numbered.c.habit_id,
+            func.max(numbered.c.log_date).label("run_end"),
+            func.count().label("run_length")
+        ).group_by(numbered.c.habit_id, numbered.c.island).cte("runs")
+
+        streaks = select(
+            runs.c.habit_id, func.max(runs.c.run_length).label("longest_streak")
+        ).group_by(runs.c.habit_id).cte("streaks")
+
+        totals = select(
+            logs.c.habit_id,
+            func.max(logs.c.log_date).label("mask_date"),
+            func.max(logs.c.log_date).filter(logs.c.completed).label("last_completed_date"),
+            func.count().filter(logs.c.completed).label("completed_days"),
+            func.count().label("logged_days"),
+            array([
+                cast(func.count().filter(and_(logs.c.completed, func.extract("isodow", logs.c.log_date) == day)),
+                     Integer)
+                for day in WEEKDAYS
+            ]).label("weekday_counts")
+        ).where(in_range).group_by(logs.c.habit_id).cte("totals")
+
+        days_ago = totals.c.mask_date - logs.c.log_date
+        masks = select(
+            logs.c.habit_id, func.bit_or(NEWEST_DAY_MASK.op(">>")(days_ago)).label("recent_mask")
+        ).join_from(logs, totals, totals.c.habit_id == logs.c.habit_id).where(
+            logs.c.completed, days_ago < RECENT_DAYS
+        ).group_by(logs.c.habit_id).cte("masks")
+
+        columns = ["habit_id", "current_run", "longest_streak", "last_completed_date", "completed_days",
+                   "logged_days", "mask_date", "recent_mask", "weekday_counts"]
+        statement = pg_insert(stats).from_select(
+            columns,
+            select(
+                habits.c.id,
+                # Текущая серия — остров, заканчивающийся последней записью
+                func.coalesce(runs.c.run_length, 0),
+                func.coalesce(streaks.c.longest_streak, 0),
+                totals.c.last_completed_date,
+                func.coalesce(totals.c.completed_days, 0),
+                func.coalesce(totals.c.logged_days, 0),
+                func.coalesce(totals.c.mask_date, habits.c.start_date),
+                func.coalesce(masks.c.recent_mask, EMPTY_MASK),
+                func.coalesce(totals.c.weekday_counts, array([0] * len(WEEKDAYS))),
+            ).select_from(habits)
+            .outerjoin(totals, totals.c.habit_id == habits.c.id)
+            .outerjoin(streaks, streaks.c.habit_id == habits.c.id)
+            .outerjoin(runs, and_(runs.c.habit_id == habits.c.id, runs.c.run_end == totals.c.mask_date))
+            .outerjoin(masks, masks.c.habit_id == habits.c.id)
+            .where(habits.c.id.between(first_id, last_id))
+        )
+        return statement.on_conflict_do_update(
+            index_elements=[stats.c.habit_id],
+            set_={**{name: statement.excluded[name] for name in columns[1:]}, "updated_at": func.now()}
+        )
+
+    async def rebuild(self, first_id: int, last_id: int) -> int:
+        """
+        Пересчитывает статистику привычек с id от `first_id` до `last_id` и возвращает число строк.
+        """
+        result = await self.db.execute(self.rebuild_statement(first_id, last_id))
+        await self.db.commit()
+        return result.rowcount
+
+    async def get_max_habit_id(self) -> int:
+        return await self.db.scalar(select(func.coalesce(func.max(HabitInDB.id), 0)))
+
+    @staticmethod
+    def _completion_rate(row: Row, today: date, days: int) -> float:
+        """
+        Доля дней с выполнением за последние `days` дней (включая сегодня),
+        но не раньше даты начала привычки.
+        """
+        if row.recent_mask is None:
+            return 0.0
+        # Бит i маски соответствует дню mask_date - i
+        shift = max((today - row.mask_date).days, 0)
+        completed = row.recent_mask[:max(days - shift, 0)].count("1")
+        tracked_days = min(days, max((today - row.start_date).days + 1, 1))
+        return round(min(completed / tracked_days, 1.0), 3)
+
+    @staticmethod
+    def _current_streak(row: Row, today: date) -> int:
+        """
+        Текущая серия по тем же правилам, что и рекорд (longest_streak): дни подряд
+        с выполнением, заканчивающиеся последней записью, если это сегодня или вчера
+        (сегодня еще можно отметиться). Отметка «не выполнено» за сегодня серию
+        прерывает (current_run обнуляется) — так же считает `HabitHistory.current_streak`.
+        """
+        if row.last_completed_date is None or row.last_completed_date < today - timedelta(days=1):
+            return 0
+        return row.current_run or 0
+
+    async def get_user_stats(self, user_id: int, today: date) -> list[dict]:
+        """
+        Статистика всех привычек пользователя: один запрос по первичным ключам
+        habit_stats, без чтения habit_logs. `today` — текущая дата (UTC).
+        """
+        result = await self.db.execute(
+            select(
+                HabitInDB.id,
+                HabitInDB.name,
+                HabitInDB.is_tracked,
+                HabitInDB.start_date,
+                HabitInDB.total_completed,
+                HabitStatsInDB.current_run,
+                HabitStatsInDB.longest_streak,
+                HabitStatsInDB.last_completed_date,
+                HabitStatsInDB.mask_date,
+                cast(HabitStatsInDB.recent_mask, Text).label("recent_mask"),
+                HabitStatsInDB.weekday_counts,
+            )
+            .outerjoin(HabitStatsInDB, HabitStatsInDB.habit_id == HabitInDB.id)
+            .where(HabitInDB.user_id == user_id)
+            .order_by(HabitInDB.id)
+        )
+        return [
+            {
+                "habit_id": row.id,
+                "name": row.name,
+                "is_tracked": row.is_tracked,
+                "current_streak": self._current_streak(row, today),
+                "total_completed": row.total_completed or 0,
+                "longest_streak": row.longest_streak or 0,
+                "last_completed_date": row.last_completed_date,
+                "completion_rate_7": self._completion_rate(row, today, 7),
+                "completion_rate_30": self._completion_rate(row, today, 30),
+                "completion_rate_90": self._completion_rate(row, today, RECENT_DAYS),
+                "weekday_counts": row.weekday_counts or [0] * len(WEEKDAYS),
+            }
+            for row in result.all()
+        ]
+
+
+class HabitHistoryCRUD:
+    """
+    Битовые карты истории выполнения привычек (habit_history).
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def rebuild(self, first_id: int, last_id: int, commit: bool = True) -> int:
+        """
+        Пересобирает битовые карты привычек с id от `first_id` до `last_id` из habit_logs
+        и возвращает число привычек.
+        """
+        habits = HabitInDB.__table__
+        logs = HabitLogInDB.__table__
+        history = HabitHistoryInDB.__table__
+
+        has_log = logs.c.id.is_not(None)
+        result = await self.db.execute(
+            select(
+                habits.c.id,
+                habits.c.start_date,
+                func.array_agg(logs.c.log_date - habits.c.start_date).filter(has_log).label("offsets"),
+                func.array_agg(logs.c.completed).filter(has_log).label("completed"),
+            )
+            .outerjoin(logs, and_(logs.c.habit_id == habits.c.id, logs.c.log_date >= habits.c.start_date))
+            .where(habits.c.id.between(first_id, last_id))
+            .group_by(habits.c.id)
+        )
+
+        rows = []
+        for habit_id, start_date, offsets, completed in result.all():
+            offsets, completed = offsets or [], completed or []
+            rows.append({
+                "habit_id": habit_id,
+                "base_date": start_date,
+                "last_log_date": start_date + timedelta(days=max(offsets)) if offsets else None,
+                "completed": pack_days([offset for offset, done in zip(offsets, completed) if done]),
+                "logged": pack_days(offsets),
+            })
+
+        if rows:
+            statement = pg_insert(history)
+            await self.db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[history.c.habit_id],
+                    set_={
+                        **{name: statement.excluded[name] for name in
+                           ("base_date", "last_log_date", "completed", "logged")},
+                        "updated_at": func.now(),
+                    }
+                ),
+                rows
+            )
+        if commit:
+            await self.db.commit()
+        return len(rows)
+
+    async def get_history(self, habit_id: int, today: date) -> Optional[tuple[int, HabitHistory]]:
+        """
+        Возвращает (user_id владельца, история) привычки или None, если привычки нет.
+        Читается одна строка по первичному ключу, записи habit_logs не просматриваются.
+        """
+        row = (await self.db.execute(
+            select(HabitInDB.user_id, HabitInDB.start_date, HabitHistoryInDB)
+            .outerjoin(HabitHistoryInDB, HabitHistoryInDB.habit_id == HabitInDB.id)
+            .where(HabitInDB.id == habit_id)
+        )).first()
+        if row is None:
+            return None
+
+        user_id, start_date, history = row
+        if history is None:
+            return user_id, HabitHistory(start_date, b"", b"", today)
+        return user_id, HabitHistory(history.base_date, history.completed, history.logged, today)
+
+
+class ReminderLedgerCRUD:
+    """
+    Журнал доставленных напоминаний (reminder_deliveries).
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_delivered(self, log_date: date, members: Sequence[str]) -> set[str]:
+        """
+        Возвращает те из элементов индекса `members`, напоминание по которым за `log_date` уже доставлено.
+        """
+        if not members:
+            return set()
+        result = await self.db.scalars(
+            select(ReminderDeliveryInDB.member).where(
+                ReminderDeliveryInDB.log_date == log_date,
+                ReminderDeliveryInDB.member.in_(members)
+            )
+        )
+        return set(result.all())
+
+    async def record(self, deliveries: Sequence[tuple[date, int, str]]) -> None:
+        """
+        Записывает в журнал доставленные напоминания: тройки (log_date, user_id, member).
+        """
+        if not deliveries:
+            return
+        await self.db.execute(
+            pg_insert(ReminderDeliveryInDB).on_conflict_do_nothing(),
+            [{"log_date": log_date, "user_id": user_id, "member": member}
+             for log_date, user_id, member in deliveries]
+        )
+        await self.db.commit()
+
+    async def purge(self, before: date) -> int:
+        """
+        Удаляет записи журнала за дни до `before`; возвращает число удаленных записей.
+        """
+        result = await self.db.execute(delete(ReminderDeliveryInDB).where(ReminderDeliveryInDB.log_date < before))
+        await self.db.commit()
+        return result.rowcount
+
+
+class DeliveryHealthCRUD:
+    """
+    Доступность пользователей для рассылок (user_delivery_health).
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def touch(self, user_ids: Sequence[int]) -> None:
+        """
+        Отмечает обращение пользователей к боту: обновляет время активности и снимает
+        блокировку и паузу — пользователь снова доступен.
+        """
+        if not user_ids:
+            return
+        await self.db.execute(
+            pg_insert(UserDeliveryHealthInDB).values(last_interaction_at=func.now()).on_conflict_do_update(
+                index_elements=[UserDeliveryHealthInDB.user_id],
+                set_={
+                    "last_interaction_at": func.now(),
+                    "consecutive_failures": 0,
+                    "blocked": False,
+                    "paused_until": None,
+                    "updated_at": func.now(),
+                }
+            ),
+            [{"user_id": user_id} for user_id in user_ids]
+        )
+        await self.db.commit()
+
+    async def record_deliveries(self, delivered: Sequence[int], failed: Sequence[int], blocked: Sequence[int],
+                                backoff_base: int, backoff_max: int) -> None:
+        """
+        Учитывает результаты рассылки: успешная доставка сбрасывает счетчик ошибок,
+        временная ошибка ставит паузу `backoff_base * 2^(ошибок подряд - 1)` секунд
+        (не больше `backoff_max`), блокировка бота (403) отключает рассылки до
+        следующего обращения пользователя к боту.
+        """
+        health = UserDeliveryHealthInDB
+        second = literal_column("interval '1 second'")
+        batches = []
+
+        if delivered:
+            batches.append((delivered, pg_insert(health).values(last_success_at=func.now()).on_conflict_do_update(
+                index_elements=[health.user_id],
+                set_={"last_success_at": func.now(), "consecutive_failures": 0, "paused_until": None,
+                      "updated_at": func.now()}
+            )))
+
+        if failed:
+            failures = health.consecutive_failures + 1
+            pause = func.least(backoff_base * func.power(2, failures - 1), backoff_max)
+            batches.append((failed, pg_insert(health).values(
+                consecutive_failures=1, paused_until=func.now() + backoff_base * second
+            ).on_conflict_do_update(
+                index_elements=[health.user_id],
+                set_={"consecutive_failures": failures, "paused_until": func.now() + pause * second,
+                      "updated_at": func.now()}
+            )))
+
+        if blocked:
+            batches.append((blocked, pg_insert(health).values(
+                blocked=True, consecutive_failures=1
+            ).on_conflict_do_update(
+                index_elements=[health.user_id],
+                set_={"blocked": True, "consecutive_failures": health.consecutive_failures + 1,
+                      "updated_at": func.now()}
+            )))
+
+        for user_ids, statement in batches:
+            await self.db.execute(statement, [{"user_id": user_id} for user_id in user_ids])
+        await self.db.commit()
+
+
+class BroadcastCRUD:
+    """
+    Рассылки объявлений: состояние, чекпоинты и ошибки доставки.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def create(self, text: str, created_by: Optional[int] = None) -> BroadcastInDB:
+        total = await self.db.scalar(select(func.count()).select_from(UserInDB))
+        broadcast = BroadcastInDB(text=text, created_by=created_by, total=total)
+        self.db.add(broadcast)
+        await self.db.commit()
+        await self.db.refresh(broadcast)
+        return broadcast
+
+    async def get(self, broadcast_id: int) -> Optional[BroadcastInDB]:
+        return await self.db.get(BroadcastInDB, broadcast_id)
+
+    async def set_status(self, broadcast_id: int, status: str, from_statuses: Sequence[str]) -> Optional[BroadcastInDB]:
+        """
+        Переводит рассылку в `status`, если сейчас она в одном из `from_statuses`; иначе возвращает None.
+        """
+        return await self._transition(broadcast_id, status, BroadcastInDB.status.in_(from_statuses))
+
+    async def claim(self, broadcast_id: int, stale_after: int) -> Optional[BroadcastInDB]:
+        """
+        Захватывает рассылку для отправки: ожидающую (pending) или выполняющуюся без
+        чекпоинтов дольше `stale_after` секунд (обработчик упал). Номер запуска
+        (`attempt`) увеличивается: чекпоинты прежнего обработчика больше не принимаются,
+        поэтому одну рассылку не отправляют два обработчика одновременно.
+        """
+        stale = BroadcastInDB.updated_at < func.now() - stale_after * literal_column("interval '1 second'")
+        return await self._transition(
+            broadcast_id, "running",
+            or_(BroadcastInDB.status == "pending", and_(BroadcastInDB.status == "running", stale)),
+            attempt=BroadcastInDB.attempt + 1
+        )
+
+    async def _transition(self, broadcast_id: int, status: str, condition, **values) -> Optional[BroadcastInDB]:
+        broadcast = (await self.db.scalars(
+            update(BroadcastInDB).where(BroadcastInDB.id == broadcast_id, condition)
+            .values(status=status, **values).returning(BroadcastInDB)
+        )).one_or_none()
+        await self.db.commit()
+        return broadcast
+
+    async def get_recipients_page(self, after_user_id: int = 0, limit: int = 500) -> Sequence[Row]:
+        """
+        Страница получателей (user_id, chat_id) по ключу user_id. Пользователи,
+        заблокировавшие бота, пропускаются.
+        """
+        return (await self.db.execute(
+            select(UserInDB.user_id, UserInDB.chat_id)
+            .outerjoin(UserDeliveryHealthInDB, UserDeliveryHealthInDB.user_id == UserInDB.user_id)
+            .where(UserInDB.user_id > after_user_id, UserDeliveryHealthInDB.blocked.is_not(True))
+            .order_by(UserInDB.user_id)
+            .limit(limit)
+        )).all()
+
+    async def checkpoint(self, broadcast_id: int, attempt: int, after_user_id: int, sent: int,
+                         failures: dict[int, str], seconds: float) -> Optional[str]:
+        """
+        Записывает ошибки доставки страницы и сдвигает курсор рассылки в одной
+        транзакции. Возвращает текущее состояние рассылки (например, paused, если
+        ее поставили на паузу во время отправки страницы) или None, если рассылку
+        уже захватил другой запуск.
+        """
+        if failures:
+            statement = pg_insert(BroadcastFailureInDB)
+            await self.db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[BroadcastFailureInDB.broadcast_id, BroadcastFailureInDB.user_id],
+                    set_={"error": statement.excluded.error, "created_at": func.now()}
+                ),
+                [{"broadcast_id": broadcast_id, "user_id": user_id, "error": error}
+                 for user_id, error in failures.items()]
+            )
+        status = await self.db.scalar(
+            update(BroadcastInDB).where(BroadcastInDB.id == broadcast_id, BroadcastInDB.attempt == attempt).values(
+                after_user_id=func.greatest(BroadcastInDB.after_user_id, after_user_id),
+                sent=BroadcastInDB.sent + sent,
+                failed=BroadcastInDB.failed + len(failures),
+                sending_seconds=BroadcastInDB.sending_seconds + seconds
+            ).returning(BroadcastInDB.status)
+        )
+        await self.db.commit()
+        return status
+
+    async def finish(self, broadcast_id: int, attempt: int) -> None:
+        await self.db.execute(
+            update(BroadcastInDB).where(BroadcastInDB.id == broadcast_id, BroadcastInDB.attempt == attempt,
+                                        BroadcastInDB.status == "running")
+            .values(status="finished", finished_at=func.now())
+        )
+        await self.db.commit()
+
+
+class ReminderCRUD:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_user_timezone(self, user_id: int) -> Optional[str]:
+        return await self.db.scalar(select(UserInDB.timezone).where(UserInDB.user_id == user_id))
+
+    async def get_user_settings(self, user_ids: Sequence[int]) -> Sequence[Row]:
+        """
+        Возвращает (user_id, timezone, reminder_time) для указанных пользователей.
+        """
+        result = await self.db.execute(
+            select(UserInDB.user_id, UserInDB.timezone, UserInDB.reminder_time)
+            .where(UserInDB.user_id.in_(user_ids))
+        )
+        return result.all()
+
+    async def get_habit_settings(self, habit_ids: Sequence[int]) -> Sequence[Row]:
+        """
+        Возвращает (id, user_id, timezone, reminder_time) для отслеживаемых привычек
+        с собственным временем напоминания.
+        """
+        result = await self.db.execute(
+            select(HabitInDB.id, HabitInDB.user_id, UserInDB.timezone, HabitInDB.reminder_time)
+            .join(UserInDB, UserInDB.user_id == HabitInDB.user_id)
+            .where(
+                HabitInDB.id.in_(habit_ids),
+                HabitInDB.is_tracked == True,
+                HabitInDB.reminder_time.is_not(None)
+            )
+        )
+        return result.all()
+
+    async def get_user_settings_page(self, after_user_id: int = 0, limit: int = 1000) -> Sequence[Row]:
+        result = await self.db.execute(
+            select(UserInDB.user_id, UserInDB.timezone, UserInDB.reminder_time)
+            .where(UserInDB.user_id > after_user_id)
+            .order_by(UserInDB.user_id)
+            .limit(limit)
+        )
+        return result.all()
+
+    async def get_habit_settings_page(self, after_id: int = 0, limit: int = 1000) -> Sequence[Row]:
+        result = await self.db.execute(
+            select(HabitInDB.id, UserInDB.timezone, HabitInDB.reminder_time)
+            .join(UserInDB, UserInDB.user_id == HabitInDB.user_id)
+            .where(
+                HabitInDB.id > after_id,
+                HabitInDB.is_tracked == True,
+                HabitInDB.reminder_time.is_not(None)
+            )
+            .order_by(HabitInDB.id)
+            .limit(limit)
+        )
+        return result.all()
+
+    async def update_user_settings(self, user_id: int, timezone: str, reminder_time: time) -> Optional[UserInDB]:
+        """
+        Сохраняет часовой пояс и время напоминания пользователя.
+        """
+        user = await self.db.get(UserInDB, user_id)
+        if user is None:
+            return None
+
+        user.timezone = timezone
+        user.reminder_time = reminder_time
         await self.db.commit()
+        return user
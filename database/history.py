@@ -0,0 +1,107 @@
+"""
+Компактная история выполнения привычки: битовые карты в таблице habit_history.
+
+Бит i соответствует дню `base_date + i` (base_date — дата начала привычки), биты
+внутри байта нумеруются от младшего — так же, как у `set_bit`/`get_bit` для bytea
+в PostgreSQL. Карт две: `logged` (за день есть запись) и `completed` (привычка
+выполнена). Год истории занимает 2 × 46 байт вместо 365 строк habit_logs.
+
+Серии, доли выполнения и календари считаются векторно (NumPy) по распакованным картам.
+"""
+from datetime import date, timedelta
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+def pack_days(offsets: Sequence[int]) -> bytes:
+    """
+    Упаковывает номера дней (смещения от base_date) в битовую карту.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if offsets.size == 0:
+        return b""
+    bits = np.zeros(int(offsets.max()) + 1, dtype=np.uint8)
+    bits[offsets] = 1
+    return np.packbits(bits, bitorder="little").tobytes()
+
+
+def unpack_days(data: bytes, length: int) -> np.ndarray:
+    """
+    Распаковывает битовую карту в массив bool длины `length` (недостающие дни — False).
+    """
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder="little")[:length]
+    return np.pad(bits, (0, length - bits.size)).astype(bool)
+
+
+def _runs(bits: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Начала и концы (не включая) серий подряд идущих True."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], bits.astype(np.int8), [0]))))
+    return edges[::2], edges[1::2]
+
+
+class HabitHistory:
+    """
+    История выполнения привычки с `base_date` по `today` включительно.
+    """
+
+    def __init__(self, base_date: date, completed: bytes, logged: bytes, today: date):
+        self.base_date = base_date
+        self.today = today
+        length = max((today - base_date).days + 1, 0)
+        self.completed = unpack_days(completed, length)
+        self.logged = unpack_days(logged, length)
+
+    def __len__(self) -> int:
+        return self.completed.size
+
+    def longest_streak(self) -> int:
+        starts, ends = _runs(self.completed)
+        return int((ends - starts).max()) if starts.size else 0
+
+    def current_streak(self) -> int:
+        """
+        Текущая серия: дни подряд с выполнением, заканчивающиеся сегодня или вчера,
+        если за сегодня записи еще нет (сегодня еще можно успеть отметиться). Отметка
+        «не выполнено» за сегодня серию прерывает — так же считает `HabitStatsCRUD`.
+        """
+        end = len(self)
+        if end and not self.logged[-1]:
+            end -= 1
+        starts, ends = _runs(self.completed)
+        if not starts.size or ends[-1] != end:
+            return 0
+        return int(ends[-1] - starts[-1])
+
+    def completion_rate(self, days: int) -> float:
+        """
+        Доля дней с выполнением за последние `days` дней (но не раньше base_date).
+        """
+        window = self.completed[-days:]
+        return round(float(window.mean()), 3) if window.size else 0.0
+
+    def day_states(self, first: date, last: date) -> list[Optional[bool]]:
+        """
+        Состояние каждого дня с `first` по `last`: True — выполнено, False — отмечено
+        как невыполненное, None — записи нет (в том числе вне истории).
+        """
+        length = (last - first).days + 1
+        if length <= 0:
+            return []
+
+        states = np.full(length, -1, dtype=np.int8)
+        start = (first - self.base_date).days
+        lo, hi = max(start, 0), min(start + length, len(self))
+        if lo < hi:
+            states[lo - start:hi - start] = np.where(
+                self.logged[lo:hi], self.completed[lo:hi].astype(np.int8), -1
+            )
+        return [None if state < 0 else bool(state) for state in states.tolist()]
+
+    def month_calendar(self, year: int, month: int) -> list[Optional[bool]]:
+        """
+        Состояния дней месяца (см. `day_states`), начиная с 1-го числа.
+        """
+        first = date(year, month, 1)
+        last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        return self.day_states(first, last)
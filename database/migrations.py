@@ -0,0 +1,79 @@
+"""
+Изменения схемы для уже существующих баз.
+
+`Base.metadata.create_all` создает только отсутствующие таблицы, поэтому новые
+колонки и индексы существующих таблиц добавляются здесь. Каждая инструкция
+идемпотентна и выполняется при каждом запуске `init_db`.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+MIGRATIONS: list[str] = [
+    # Telegram user_id не помещается в INTEGER. Тип меняем только у старых баз:
+    # ALTER COLUMN TYPE берет эксклюзивную блокировку и переписывает таблицу
+    """
+    DO $$
+    BEGIN
+        IF (SELECT data_type FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'habits' AND column_name = 'user_id') = 'integer'
+        THEN
+            ALTER TABLE habits ALTER COLUMN user_id TYPE BIGINT;
+        END IF;
+    END
+    $$
+    """,
+
+    # Время и часовой пояс напоминаний
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS timezone VARCHAR(64) NOT NULL DEFAULT 'UTC'",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS reminder_time TIME NOT NULL DEFAULT '20:00'",
+    "ALTER TABLE habits ADD COLUMN IF NOT EXISTS reminder_time TIME",
+
+    # Одна запись о выполнении привычки в день: перед созданием уникального индекса удаляем дубли
+    """
+    DELETE FROM habit_logs a USING habit_logs b
+    WHERE a.habit_id = b.habit_id AND a.log_date = b.log_date AND a.id > b.id
+      AND NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'uq_habit_logs_habit_id_log_date')
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_habit_logs_habit_id_log_date ON habit_logs (habit_id, log_date)",
+    "CREATE INDEX IF NOT EXISTS ix_habits_user_id_is_tracked ON habits (user_id, is_tracked)",
+
+    # Хеш пароля для входа в API
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS hashed_password VARCHAR",
+
+    # Начальная активность пользователей для подавления рассылок неактивным: регистрация
+    # или последняя отметка привычки (выполняется, только пока таблица пуста)
+    """
+    INSERT INTO user_delivery_health (user_id, last_interaction_at)
+    SELECT u.user_id, GREATEST(u.created_at, (
+        SELECT max(l.created_at) FROM habit_logs l JOIN habits h ON h.id = l.habit_id WHERE h.user_id = u.user_id
+    ))
+    FROM users u
+    WHERE NOT EXISTS (SELECT 1 FROM user_delivery_health)
+    """,
+
+    # Журнал напоминаний ведется по элементам индекса напоминаний; ночные прогоны с чекпоинтами удалены
+    "ALTER TABLE reminder_deliveries ADD COLUMN IF NOT EXISTS member VARCHAR(64) NOT NULL DEFAULT ''",
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM information_schema.key_column_usage
+                       WHERE table_schema = current_schema() AND table_name = 'reminder_deliveries'
+                         AND constraint_name = 'reminder_deliveries_pkey' AND column_name = 'member')
+        THEN
+            ALTER TABLE reminder_deliveries DROP CONSTRAINT reminder_deliveries_pkey,
+                ADD PRIMARY KEY (log_date, user_id, member);
+        END IF;
+    END
+    $$
+    """,
+    "DROP TABLE IF EXISTS reminder_runs",
+]
+
+
+async def apply_migrations(conn: AsyncConnection) -> None:
+    """
+    Применяет все миграции в рамках переданного соединения (транзакции).
+    """
+    for statement in MIGRATIONS:
+        await conn.execute(text(statement))
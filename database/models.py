@@ -1,3 +1,5 @@
+from datetime import time
+
 from sqlalchemy import (
     Column,
     Integer,
@@ -5,14 +7,17 @@ from sqlalchemy import (
     DateTime,
     Text,
     String,
-    UniqueConstraint, TIMESTAMP, Date, Boolean, BigInteger,
+    UniqueConstraint, TIMESTAMP, Date, Boolean, BigInteger, Time, Index, LargeBinary, Float,
 )
+from sqlalchemy.dialects.postgresql import ARRAY, BIT
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 
 Base = declarative_base()
 
+RECENT_DAYS = 90  # Сколько последних дней хранит битовая маска выполнения в habit_stats
+
 
 class UserInDB(Base):
     __tablename__ = "users"
@@ -20,19 +25,26 @@ class UserInDB(Base):
     user_id = Column(BigInteger, primary_key=True, index=True)  # Уникальный ID пользователя
     chat_id = Column(BigInteger, unique=True, nullable=False)  # ID чата Telegram
     username = Column(String, nullable=False)  # Имя пользователя
+    hashed_password = Column(String, nullable=True)  # bcrypt-хеш пароля для входа в API
     deep_linking = Column(String, nullable=True, default="unknown")
     is_premium = Column(Boolean, nullable=True, default=False)
     language = Column(String(10), nullable=True, default="ru")
     created_at = Column(TIMESTAMP, server_default=func.now())  # Дата создания записи пользователя
+    timezone = Column(String(64), nullable=False, default="UTC", server_default="UTC")  # Часовой пояс (IANA)
+    reminder_time = Column(Time, nullable=False, default=time(20, 0),
+                           server_default="20:00")  # Локальное время ежедневного напоминания
 
     habits = relationship("HabitInDB", back_populates="user")  # Связь с привычками
 
 
 class HabitInDB(Base):
     __tablename__ = "habits"
+    __table_args__ = (
+        Index("ix_habits_user_id_is_tracked", "user_id", "is_tracked"),  # Выборка отслеживаемых привычек пользователя
+    )
 
     id = Column(Integer, primary_key=True, index=True)  # Уникальный идентификатор привычки
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)  # Ссылка на пользователя
+    user_id = Column(BigInteger, ForeignKey('users.user_id'), nullable=False)  # Ссылка на пользователя
     name = Column(String, nullable=False)  # Название привычки
     description = Column(String, nullable=True)  # Описание привычки
     target_days = Column(Integer, nullable=False, default=21)  # Количество дней для прививания привычки
@@ -45,6 +57,7 @@ class HabitInDB(Base):
     updated_at = Column(TIMESTAMP, server_default=func.now(),
                         onupdate=func.now())  # Дата последнего обновления записи привычки
     is_tracked = Column(Boolean, nullable=False, default=True)  # Новая колонка: отслеживается привычка или нет
+    reminder_time = Column(Time, nullable=True)  # Собственное время напоминания (иначе время пользователя)
 
     user = relationship("UserInDB", back_populates="habits")  # Связь с пользователем
     logs = relationship("HabitLogInDB", back_populates="habit")  # Связь с записями о выполнении привычек
@@ -52,6 +65,9 @@ class HabitInDB(Base):
 
 class HabitLogInDB(Base):
     __tablename__ = "habit_logs"
+    __table_args__ = (
+        Index("uq_habit_logs_habit_id_log_date", "habit_id", "log_date", unique=True),  # Одна запись в день
+    )
 
     id = Column(Integer, primary_key=True, index=True)  # Уникальный идентификатор записи о выполнении привычки
     habit_id = Column(Integer, ForeignKey('habits.id'), nullable=False)  # Ссылка на привычку
@@ -60,3 +76,104 @@ class HabitLogInDB(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())  # Дата создания записи
 
     habit = relationship("HabitInDB", back_populates="logs")  # Связь с привычкой
+
+
+class HabitStatsInDB(Base):
+    """
+    Статистика привычки, которая обновляется при каждой записи о выполнении
+    (в той же транзакции) и пересчитывается из habit_logs командой
+    `python -m database.rebuild_habit_stats`.
+    """
+    __tablename__ = "habit_stats"
+
+    habit_id = Column(Integer, ForeignKey('habits.id', ondelete="CASCADE"), primary_key=True)  # Ссылка на привычку
+    current_run = Column(Integer, nullable=False, default=0,
+                         server_default="0")  # Дней подряд с выполнением, заканчивая последней записью
+    longest_streak = Column(Integer, nullable=False, default=0, server_default="0")  # Самая длинная серия дней
+    last_completed_date = Column(Date)  # Дата последнего выполнения
+    completed_days = Column(Integer, nullable=False, default=0, server_default="0")  # Дней с выполнением
+    logged_days = Column(Integer, nullable=False, default=0, server_default="0")  # Дней с записью о выполнении
+    mask_date = Column(Date, nullable=False)  # День, которому соответствует первый бит recent_mask
+    recent_mask = Column(BIT(RECENT_DAYS), nullable=False)  # Бит i — выполнена ли привычка за mask_date - i дней
+    weekday_counts = Column(ARRAY(Integer), nullable=False)  # Число выполнений по дням недели (пн–вс)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())  # Дата последнего пересчета
+
+
+class HabitHistoryInDB(Base):
+    """
+    История выполнения привычки в виде битовых карт (см. database/history.py).
+    Обновляется вместе с habit_logs в той же транзакции.
+    """
+    __tablename__ = "habit_history"
+
+    habit_id = Column(Integer, ForeignKey('habits.id', ondelete="CASCADE"), primary_key=True)  # Ссылка на привычку
+    base_date = Column(Date, nullable=False)  # День, которому соответствует бит 0 (дата начала привычки)
+    last_log_date = Column(Date)  # Дата последней учтенной записи
+    completed = Column(LargeBinary, nullable=False)  # Бит i — привычка выполнена за base_date + i
+    logged = Column(LargeBinary, nullable=False)  # Бит i — за base_date + i есть запись о выполнении
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())  # Дата последнего обновления
+
+
+class ReminderDeliveryInDB(Base):
+    """
+    Журнал доставленных напоминаний: одна строка на сработавший элемент индекса
+    напоминаний (`user:<user_id>` или `habit:<habit_id>`) за локальный день пользователя.
+    Повторная обработка того же срабатывания (после сбоя воркера) пропускает элементы из журнала.
+    """
+    __tablename__ = "reminder_deliveries"
+
+    log_date = Column(Date, primary_key=True)  # Локальный день пользователя, за который отправлено напоминание
+    user_id = Column(BigInteger, primary_key=True)  # Получатель
+    member = Column(String(64), primary_key=True)  # Элемент индекса напоминаний
+    sent_at = Column(TIMESTAMP, server_default=func.now())  # Время записи в журнал
+
+
+class UserDeliveryHealthInDB(Base):
+    """
+    Доступность пользователя для рассылок: последняя активность в боте и результаты доставки.
+    Пользователи без строки считаются доступными.
+    """
+    __tablename__ = "user_delivery_health"
+
+    user_id = Column(BigInteger, primary_key=True)  # Telegram ID пользователя
+    last_interaction_at = Column(TIMESTAMP)  # Последнее обращение пользователя к боту
+    last_success_at = Column(TIMESTAMP)  # Последняя успешная доставка рассылки
+    consecutive_failures = Column(Integer, nullable=False, default=0, server_default="0")  # Ошибок доставки подряд
+    blocked = Column(Boolean, nullable=False, default=False,
+                     server_default="false")  # Бот заблокирован или аккаунт удален (403)
+    paused_until = Column(TIMESTAMP)  # До этого времени рассылки пользователю не отправляются
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())  # Дата последнего обновления
+
+
+class BroadcastInDB(Base):
+    """
+    Рассылка объявления всем пользователям: текст, состояние и курсор по user_id (keyset),
+    с которого рассылка продолжается после паузы или сбоя.
+    """
+    __tablename__ = "broadcasts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    text = Column(Text, nullable=False)  # Текст сообщения (HTML)
+    status = Column(String(16), nullable=False, default="pending")  # pending, running, paused, finished
+    created_by = Column(BigInteger, nullable=True)  # Администратор, создавший рассылку
+    total = Column(Integer, nullable=False, default=0)  # Пользователей на момент создания
+    after_user_id = Column(BigInteger, nullable=False, default=0)  # Все пользователи до него обработаны
+    sent = Column(Integer, nullable=False, default=0)  # Доставлено сообщений
+    failed = Column(Integer, nullable=False, default=0)  # Ошибок доставки
+    sending_seconds = Column(Float, nullable=False, default=0)  # Время отправки без пауз (для скорости)
+    attempt = Column(Integer, nullable=False, default=0)  # Номер запуска; чекпоинты старых запусков не принимаются
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())  # Последний чекпоинт
+    finished_at = Column(TIMESTAMP, nullable=True)
+
+
+class BroadcastFailureInDB(Base):
+    """
+    Пользователь, которому не удалось доставить рассылку, и последняя ошибка.
+    """
+    __tablename__ = "broadcast_failures"
+
+    broadcast_id = Column(Integer, ForeignKey("broadcasts.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    error = Column(Text, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now())
@@ -0,0 +1,70 @@
+import math
+import time
+from typing import Any
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+
+class PoolMetrics:
+    """
+    Метрики пула соединений: время ожидания соединения (гистограмма) и число таймаутов.
+    Текущая загрузка пула (выдано, overflow) берется из самого пула в `snapshot`.
+    """
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+    def __init__(self):
+        self.wait_buckets = [0] * len(self.BUCKETS)
+        self.wait_sum = 0.0
+        self.wait_count = 0
+        self.timeouts = 0
+
+    def observe_wait(self, seconds: float) -> None:
+        self.wait_sum += seconds
+        self.wait_count += 1
+        for i, bound in enumerate(self.BUCKETS):
+            if seconds <= bound:
+                self.wait_buckets[i] += 1
+                break
+
+    def snapshot(self, pool: Pool) -> dict[str, Any]:
+        """
+        Возвращает текущее состояние пула и накопленную гистограмму ожидания (кумулятивную).
+        """
+        cumulative, total = {}, 0
+        for bound, count in zip(self.BUCKETS, self.wait_buckets):
+            total += count
+            cumulative["+Inf" if math.isinf(bound) else str(bound)] = total
+
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "timeouts": self.timeouts,
+            "wait_seconds": {
+                "count": self.wait_count,
+                "sum": self.wait_sum,
+                "buckets": cumulative,
+            },
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """
+    Пул, замеряющий время ожидания свободного соединения.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.observe_wait(time.perf_counter() - started)
@@ -0,0 +1,46 @@
+"""
+Пересчет таблиц habit_stats и habit_history (битовые карты) из habit_logs.
+
+Нужен после первого развертывания (для привычек с историей) и после ручной
+правки записей о выполнении. Привычки обрабатываются диапазонами id, каждый
+диапазон — в отдельных транзакциях:
+
+    python -m database.rebuild_habit_stats [размер диапазона]
+"""
+import asyncio
+import sys
+import time
+
+from loguru import logger
+
+from database.db import async_session, engine, init_db
+from database.func_db import HabitHistoryCRUD, HabitStatsCRUD
+
+
+async def rebuild_all(batch_size: int = 10_000) -> int:
+    """
+    Пересчитывает статистику всех привычек и возвращает число обновленных строк.
+    """
+    async with async_session() as db:
+        max_id = await HabitStatsCRUD(db).get_max_habit_id()
+
+    total = 0
+    for first_id in range(1, max_id + 1, batch_size):
+        last_id = min(first_id + batch_size - 1, max_id)
+        async with async_session() as db:
+            total += await HabitStatsCRUD(db).rebuild(first_id, last_id)
+            await HabitHistoryCRUD(db).rebuild(first_id, last_id)
+        logger.info(f"habit_stats, habit_history: пересчитаны привычки {first_id}–{last_id}")
+    return total
+
+
+async def main(batch_size: int) -> None:
+    await init_db(engine)
+    started_at = time.perf_counter()
+    total = await rebuild_all(batch_size)
+    logger.info(f"habit_stats, habit_history: пересчитано {total} привычек за {time.perf_counter() - started_at:.1f} с")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000))
@@ -0,0 +1,174 @@
+from datetime import date, datetime, timedelta
+
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError
+from loguru import logger
+
+from config import config
+from database.db import async_session
+from database.func_db import DeliveryHealthCRUD, HabitCRUD, ReminderCRUD, ReminderLedgerCRUD
+from reminders.schedule import (HABIT_MEMBER, USER_MEMBER, habit_member, local_date, next_fire_at, parse_member,
+                                reminder_schedule, user_member)
+from TG.bot import bot
+from TG.keyboards.InlineKeyboard import create_reminder_digest_keyboard
+from TG.sender import OutgoingMessage, RateLimitedSender, SendReport
+
+
+def build_sender() -> RateLimitedSender:
+    return RateLimitedSender(
+        bot,
+        rate=config.REMINDER_RATE_LIMIT,
+        per_chat_rate=config.REMINDER_CHAT_RATE_LIMIT,
+        concurrency=config.REMINDER_CONCURRENCY,
+        max_retries=config.REMINDER_MAX_RETRIES,
+    )
+
+
+def is_unreachable(error: TelegramAPIError) -> bool:
+    """
+    Ошибка означает, что пользователь не получит сообщений, пока сам не напишет боту:
+    бот заблокирован, аккаунт удален или чат не найден.
+    """
+    return isinstance(error, TelegramForbiddenError) or (
+        isinstance(error, TelegramBadRequest) and "chat not found" in str(error).lower()
+    )
+
+
+async def record_delivery_health(session, report: SendReport) -> None:
+    """
+    Сохраняет результаты отправки в user_delivery_health (паузы и блокировки).
+    """
+    blocked = [chat_id for chat_id, error in report.failed.items() if is_unreachable(error)]
+    failed = [chat_id for chat_id, error in report.failed.items() if not is_unreachable(error)]
+    await DeliveryHealthCRUD(session).record_deliveries(
+        report.sent, failed, blocked,
+        backoff_base=config.REMINDER_BACKOFF_BASE, backoff_max=config.REMINDER_BACKOFF_MAX
+    )
+
+
+def render_digest(user_id: int, habit_ids: list[int], habit_names: list[str]) -> OutgoingMessage:
+    """
+    Формирует одно сводное напоминание со всеми неотмеченными привычками пользователя.
+    """
+    lines = "\n".join(f"• {name}" for name in habit_names)
+    text = f"⏰ Не забудьте отметить привычки за сегодня:\n\n{lines}"
+    keyboard = create_reminder_digest_keyboard(list(zip(habit_ids, habit_names)))
+    return OutgoingMessage(user_id, text, keyboard)
+
+
+async def purge_ledger(today: date) -> int:
+    """
+    Удаляет журнал доставленных напоминаний старше `REMINDER_LEDGER_DAYS` дней.
+    """
+    async with async_session() as session:
+        return await ReminderLedgerCRUD(session).purge(today - timedelta(days=config.REMINDER_LEDGER_DAYS))
+
+
+async def dispatch_due(now: datetime) -> SendReport:
+    """
+    Рассылает напоминания, время которых наступило к `now`, и планирует следующие.
+
+    Сработавшие элементы индекса забираются с таймаутом (`REMINDER_CLAIM_TIMEOUT`) и
+    переносятся на следующее срабатывание только после отправки и записи в журнал
+    reminder_deliveries (по локальной дате пользователя). Если воркер упал, элементы
+    срабатывают снова, а уже доставленные по журналу пропускаются. Элементы пользователей,
+    которым отправить не удалось (кроме заблокировавших бота), тоже остаются с таймаутом
+    и обрабатываются повторно.
+    """
+    sender = build_sender()
+    report = SendReport()
+    timeout = timedelta(seconds=config.REMINDER_CLAIM_TIMEOUT)
+
+    async with async_session() as session:
+        habit_crud = HabitCRUD(session)
+        reminder_crud = ReminderCRUD(session)
+        ledger = ReminderLedgerCRUD(session)
+
+        while members := await reminder_schedule.claim_due(now, timeout, limit=config.REMINDER_PAGE_SIZE):
+            user_ids, habit_ids = [], []
+            for member in members:
+                kind, member_id = parse_member(member)
+                if kind == USER_MEMBER:
+                    user_ids.append(member_id)
+                elif kind == HABIT_MEMBER:
+                    habit_ids.append(member_id)
+
+            # Следующее срабатывание считаем от следующей минуты, чтобы не сработать повторно.
+            # Отметки хранятся по локальной дате пользователя: «сегодня» у сработавших
+            # напоминаний может быть разным (к востоку от UTC уже наступило завтра)
+            after = now + timedelta(minutes=1)
+            due: dict[str, tuple[int, date, datetime]] = {}
+            for row in await reminder_crud.get_user_settings(user_ids):
+                due[user_member(row.user_id)] = (
+                    row.user_id, local_date(row.timezone, now), next_fire_at(row.timezone, row.reminder_time, after)
+                )
+            for row in await reminder_crud.get_habit_settings(habit_ids):
+                due[habit_member(row.id)] = (
+                    row.user_id, local_date(row.timezone, now), next_fire_at(row.timezone, row.reminder_time, after)
+                )
+            # Удаленные пользователи и привычки без собственного времени напоминания
+            await reminder_schedule.remove_many(set(members) - due.keys())
+
+            by_date: dict[date, list[str]] = {}
+            for member, (_, log_date, _) in due.items():
+                by_date.setdefault(log_date, []).append(member)
+
+            # Уже доставленные по журналу (повторная обработка после сбоя) не отправляются
+            rows, pending = [], {}
+            for log_date, date_members in by_date.items():
+                delivered = await ledger.get_delivered(log_date, date_members)
+                date_user_ids, date_habit_ids = [], []
+                for member in date_members:
+                    if member in delivered:
+                        continue
+                    pending.setdefault(due[member][0], []).append(member)
+                    kind, member_id = parse_member(member)
+                    (date_user_ids if kind == USER_MEMBER else date_habit_ids).append(member_id)
+                rows.extend(await habit_crud.get_unlogged_digests(log_date, date_user_ids, date_habit_ids,
+                                                                  dormant_days=config.REMINDER_DORMANT_DAYS))
+
+            page_report = await sender.send_many(
+                render_digest(row.user_id, row.habit_ids, row.habit_names) for row in rows
+            )
+            await ledger.record([
+                (due[member][1], user_id, member) for user_id in page_report.sent for member in pending[user_id]
+            ])
+            await record_delivery_health(session, page_report)
+            report.merge(page_report)
+
+            retry = {user_id for user_id, error in page_report.failed.items() if not is_unreachable(error)}
+            await reminder_schedule.schedule_many(
+                (member, fire_at) for member, (user_id, _, fire_at) in due.items() if user_id not in retry
+            )
+
+    logger.info(f"Due reminders at {now:%H:%M}: sent {len(report.sent)}, failed {len(report.failed)}, "
+                f"retried {report.retried}")
+    return report
+
+
+async def rebuild_schedule(now: datetime) -> int:
+    """
+    Заполняет индекс напоминаний по настройкам всех пользователей и привычек.
+    Операция идемпотентна: повторный запуск выставляет те же времена срабатывания.
+    """
+    scheduled = 0
+
+    async with async_session() as session:
+        reminder_crud = ReminderCRUD(session)
+
+        after_user_id = 0
+        while rows := await reminder_crud.get_user_settings_page(after_user_id, limit=config.REMINDER_PAGE_SIZE):
+            after_user_id = rows[-1].user_id
+            await reminder_schedule.schedule_many(
+                (user_member(row.user_id), next_fire_at(row.timezone, row.reminder_time, now)) for row in rows
+            )
+            scheduled += len(rows)
+
+        after_id = 0
+        while rows := await reminder_crud.get_habit_settings_page(after_id, limit=config.REMINDER_PAGE_SIZE):
+            after_id = rows[-1].id
+            await reminder_schedule.schedule_many(
+                (habit_member(row.id), next_fire_at(row.timezone, row.reminder_time, now)) for row in rows
+            )
+            scheduled += len(rows)
+
+    return scheduled
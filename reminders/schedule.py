@@ -0,0 +1,133 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import aioredis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import config
+from database.func_db import ReminderCRUD
+
+# Атомарно забирает напоминания со временем срабатывания <= ARGV[1]: они остаются в индексе
+# со временем ARGV[3] и сработают снова, если воркер не перенесет их на следующее время
+CLAIM_DUE_SCRIPT = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, item in ipairs(items) do
+    redis.call('ZADD', KEYS[1], ARGV[3], item)
+end
+return items
+"""
+
+USER_MEMBER = "user"
+HABIT_MEMBER = "habit"
+
+
+def get_zone(tz_name: Optional[str]) -> ZoneInfo:
+    """
+    Возвращает часовой пояс по имени IANA, для неизвестных имен — UTC.
+    """
+    try:
+        return ZoneInfo(tz_name or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("UTC")
+
+
+def next_fire_at(tz_name: Optional[str], reminder_time: time, now: datetime) -> datetime:
+    """
+    Вычисляет ближайший момент (строго после `now`, в UTC), когда в часовом поясе
+    пользователя наступит `reminder_time`.
+    """
+    zone = get_zone(tz_name)
+    local_now = now.astimezone(zone)
+    candidate = datetime.combine(local_now.date(), reminder_time, tzinfo=zone)
+    if candidate <= local_now:
+        candidate = datetime.combine(local_now.date() + timedelta(days=1), reminder_time, tzinfo=zone)
+    return candidate.astimezone(timezone.utc)
+
+
+def local_date(tz_name: Optional[str], now: datetime) -> date:
+    """
+    Дата в часовом поясе пользователя в момент `now`.
+
+    Отметки выполнения (`habit_logs.log_date`) хранятся по локальной дате пользователя,
+    поэтому «сегодня» для отметок, списков неотмеченных привычек и напоминаний
+    вычисляется этой функцией.
+    """
+    return now.astimezone(get_zone(tz_name)).date()
+
+
+async def user_today(session: AsyncSession, user_id: int, now: Optional[datetime] = None) -> date:
+    """Локальная дата пользователя (для неизвестного пользователя — дата UTC)."""
+    tz_name = await ReminderCRUD(session).get_user_timezone(user_id)
+    return local_date(tz_name, now or datetime.now(timezone.utc))
+
+
+def user_member(user_id: int) -> str:
+    return f"{USER_MEMBER}:{user_id}"
+
+
+def habit_member(habit_id: int) -> str:
+    return f"{HABIT_MEMBER}:{habit_id}"
+
+
+def parse_member(member: str) -> tuple[str, int]:
+    """Разбирает элемент индекса на вид (`user` или `habit`) и идентификатор."""
+    kind, _, member_id = member.partition(":")
+    return kind, int(member_id)
+
+
+class ReminderSchedule:
+    """
+    Индекс предстоящих напоминаний в Redis (sorted set, score — время срабатывания в UTC).
+
+    Элементы индекса: `user:<user_id>` — сводное напоминание пользователю в его время,
+    `habit:<habit_id>` — напоминание о привычке с собственным временем.
+    """
+
+    key = "reminders:schedule"
+
+    def __init__(self, redis_url: str = "redis://localhost"):
+        self.redis = aioredis.from_url(redis_url, decode_responses=True)
+        self._claim_due = self.redis.register_script(CLAIM_DUE_SCRIPT)
+
+    async def schedule(self, member: str, fire_at: datetime) -> None:
+        """Добавляет (или переносит) напоминание на время `fire_at`."""
+        await self.redis.zadd(self.key, {member: fire_at.timestamp()})
+
+    async def schedule_many(self, items: Iterable[tuple[str, datetime]]) -> None:
+        mapping = {member: fire_at.timestamp() for member, fire_at in items}
+        if mapping:
+            await self.redis.zadd(self.key, mapping)
+
+    async def remove(self, member: str) -> None:
+        await self.redis.zrem(self.key, member)
+
+    async def remove_many(self, members: Iterable[str]) -> None:
+        members = list(members)
+        if members:
+            await self.redis.zrem(self.key, *members)
+
+    async def claim_due(self, now: datetime, timeout: timedelta, limit: int = 1000) -> list[str]:
+        """
+        Забирает до `limit` напоминаний, время которых уже наступило, и переносит их на
+        `now + timeout`. Обработчик должен перенести каждое на следующее срабатывание
+        (или удалить); если воркер упал, напоминания сработают снова через `timeout`.
+        """
+        return await self._claim_due(keys=[self.key], args=[now.timestamp(), limit, (now + timeout).timestamp()])
+
+
+reminder_schedule = ReminderSchedule(redis_url=config.REDIS_URL)
+
+
+async def reschedule_habits(session: AsyncSession, habit_ids: Iterable[int], now: datetime) -> None:
+    """
+    Обновляет индекс для привычек после изменения: привычки с собственным временем
+    напоминания планируются заново, остальные удаляются из индекса.
+    """
+    habit_ids = list(habit_ids)
+    rows = await ReminderCRUD(session).get_habit_settings(habit_ids)
+    await reminder_schedule.schedule_many(
+        (habit_member(row.id), next_fire_at(row.timezone, row.reminder_time, now)) for row in rows
+    )
+    for habit_id in set(habit_ids) - {row.id for row in rows}:
+        await reminder_schedule.remove(habit_member(habit_id))
@@ -1,28 +1,41 @@
-from celery_app import celery_app
-from database.db import get_db
-from database.models import HabitInDB, HabitLogInDB
-from sqlalchemy import select
-from datetime import datetime
+from datetime import datetime, timezone
+
+from celery_app import celery_app, run_async, runtime
+from database.db import engine
+from reminders.dispatcher import dispatch_due, purge_ledger, rebuild_schedule
 from TG.bot import bot
+from TG.broadcast import run_broadcast as send_broadcast
+
+# Общие для всех задач процесса ресурсы закрываются один раз, при остановке воркера
+runtime.on_shutdown(bot.session.close)
+runtime.on_shutdown(engine.dispose)
 
 
 @celery_app.task
-async def send_habit_reminders():
+def tick_reminders():
+    """
+    Ежеминутная задача: рассылает только те напоминания, время которых наступило.
+    """
+    report = run_async(dispatch_due(datetime.now(timezone.utc)))
+    return {"sent": len(report.sent), "failed": len(report.failed), "retried": report.retried}
 
-    today = datetime.utcnow().date()
 
-    async with get_db() as session:
+@celery_app.task
+def rebuild_reminder_schedule():
+    """
+    Пересобирает индекс напоминаний по настройкам пользователей и привычек
+    и удаляет устаревшие записи журнала доставленных напоминаний.
+    """
+    now = datetime.now(timezone.utc)
+    run_async(purge_ledger(now.date()))
+    return run_async(rebuild_schedule(now))
 
-        result = await session.execute(
-            select(HabitInDB)
-            .where(HabitInDB.is_tracked == True)
-            .where(~session.query(HabitLogInDB)
-                .filter(HabitLogInDB.habit_id == HabitInDB.id, HabitLogInDB.log_date == today).exists())
-        )
-        habits = result.scalars().all()
 
-        for habit in habits:
-            await bot.send_message(
-                habit.user_id,  # Отправляем сообщение пользователю с этим ID
-                f"⏰ Не забудьте отметить привычку '{habit.name}' за сегодня!"
-            )
\ No newline at end of file
+@celery_app.task
+def run_broadcast(broadcast_id: int):
+    """
+    Отправляет рассылку объявления с сохраненного курсора до конца или до паузы.
+    Ставится в очередь API при создании и возобновлении рассылки.
+    """
+    report = run_async(send_broadcast(broadcast_id))
+    return {"sent": len(report.sent), "failed": len(report.failed), "retried": report.retried}